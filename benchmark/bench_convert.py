@@ -0,0 +1,41 @@
+""" Benchmark conversion of IPM weather json to dataframe
+
+Compare the historical zip path with weatherdata.convert.weather_frame on the
+bundled weather_data_standard_example.json, scaled up in time.
+
+    python benchmark/bench_convert.py
+"""
+import timeit
+
+import pandas
+
+from weatherdata.convert import weather_frame
+from weatherdata.data import ipm_getdata_request
+
+
+def scaled_response(repeat):
+    response = ipm_getdata_request()
+    location = dict(response['locationWeatherData'][0])
+    location['data'] = location['data'] * repeat
+    response['locationWeatherData'] = [location]
+    return response
+
+
+def zip_frame(response):
+    data = {str(var): vals for var, vals in zip(response['weatherParameters'], zip(*response['locationWeatherData'][0]['data']))}
+    return pandas.DataFrame(data)
+
+
+def run(repeats=(1, 10, 100, 1000), number=5):
+    results = []
+    for repeat in repeats:
+        response = scaled_response(repeat)
+        n = len(response['locationWeatherData'][0]['data'])
+        t_zip = min(timeit.repeat(lambda: zip_frame(response), number=number, repeat=3)) / number
+        t_numpy = min(timeit.repeat(lambda: weather_frame(response), number=number, repeat=3)) / number
+        results.append({'rows': n, 'zip (s)': t_zip, 'numpy (s)': t_numpy, 'speedup': t_zip / t_numpy})
+    return pandas.DataFrame(results)
+
+
+if __name__ == '__main__':
+    print(run().to_string(index=False))
@@ -0,0 +1,55 @@
+""" Benchmark of mini models on a season of hourly weather
+
+Compare the scalar Pedro & Gillespie leaf wetness (fsolve for each time step)
+with the batched Newton solver, for accuracy and speed.
+
+    python benchmark/bench_mini_models.py
+"""
+import time
+
+import numpy
+import pandas
+from scipy.optimize import fsolve
+
+from weatherdata.mini_models import (leaf_wetness_pedro_gillepsie, leaf_wetness_pedro_gillepsie_batch,
+                                     _calculate_balance, _calculate_hc, _calculate_hw, _calculate_psat)
+
+
+def season(n=4000, seed=0):
+    rng = numpy.random.RandomState(seed)
+    return dict(rain_intensity=rng.choice([0., 1.], n, p=[0.9, 0.1]),
+                temperature_air=rng.uniform(-5, 30, n),
+                wind_speed=rng.uniform(0, 8, n),
+                relative_humidity=rng.uniform(40, 100, n),
+                net_radiation=rng.uniform(-100, 800, n))
+
+
+def scalar_leaf_temperature(temperature_air, wind_speed, relative_humidity, net_radiation, **kwds):
+    hc = _calculate_hc(wind_speed)
+    hw = _calculate_hw(hc)
+    esa = _calculate_psat(temperature_air)
+    e = esa * relative_humidity / 100.
+    return fsolve(_calculate_balance, temperature_air, args=(temperature_air, net_radiation, hc, hw, esa, e))[0]
+
+
+def run(n=4000):
+    weather = season(n)
+    rows = [{k: v[i] for k, v in weather.items()} for i in range(n)]
+
+    t = time.perf_counter()
+    wet_scalar = numpy.array([leaf_wetness_pedro_gillepsie(**row) for row in rows])
+    t_scalar = time.perf_counter() - t
+    temperature_scalar = numpy.array([scalar_leaf_temperature(**row) for row in rows])
+
+    t = time.perf_counter()
+    temperature_leaf, wet = leaf_wetness_pedro_gillepsie_batch(**weather)
+    t_batch = time.perf_counter() - t
+
+    return pandas.DataFrame([{'time steps': n, 'scalar (s)': t_scalar, 'batch (s)': t_batch,
+                              'speedup': t_scalar / t_batch,
+                              'max |dT leaf| (C)': numpy.abs(temperature_leaf - temperature_scalar).max(),
+                              'wetness agreement': (wet == wet_scalar).mean()}])
+
+
+if __name__ == '__main__':
+    print(run().to_string(index=False))
@@ -0,0 +1,52 @@
+""" Benchmark loading of echap-style meteo files with global_weather.Weather
+
+Compare the row by row date parsing (one datetime per row with parse, as the
+former date_parser=parse) with the vectorized loader, on a synthetic 10-year
+hourly file.
+
+    python benchmark/bench_weather.py
+"""
+import os
+import tempfile
+import time
+
+import pandas
+
+from weatherdata.data import write_meteo_example
+from weatherdata.global_weather import Weather, parse
+
+
+def rowwise_load(path, sep=';'):
+    data = pandas.read_csv(path, sep=sep, usecols=['An', 'Jour', 'hhmm', 'PAR', 'Tair', 'HR', 'Vent', 'Pluie'])
+    datetime = [parse(*row) for row in zip(data['An'], data['Jour'], data['hhmm'])]
+    data = data.drop(columns=['An', 'Jour', 'hhmm'])
+    data.insert(0, 'datetime', pandas.DatetimeIndex(datetime))
+    data.index = data.datetime
+    return data
+
+
+def best_of(f, repeat=3):
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        result = f()
+        times.append(time.perf_counter() - t)
+    return min(times), result
+
+
+def run(years=10):
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
+    try:
+        n = len(write_meteo_example(path, years))
+        t_rowwise, expected = best_of(lambda: rowwise_load(path))
+        t_vectorized, weather = best_of(lambda: Weather(path))
+        assert (weather.data.index == expected.index).all()
+    finally:
+        os.remove(path)
+    return pandas.DataFrame([{'rows': n, 'row by row (s)': t_rowwise, 'vectorized (s)': t_vectorized,
+                              'speedup': t_rowwise / t_vectorized}])
+
+
+if __name__ == '__main__':
+    print(run().to_string(index=False))
@@ -0,0 +1,196 @@
+""" Local stand-in for the IPM weather services, for benchmarks
+
+FakeIPM answers the same calls as the IPM client used by weatherdata, from the
+bundled data/*.json fixtures: the weather data example is tiled to cover any
+requested period, and the station list of each resource can be extended to any
+number of synthetic stations. Each call waits for a configurable latency (plus
+a transfer time proportional to the number of values), so that concurrency and
+chunking can be measured without network.
+
+FakeIPMServer serves a FakeIPM over HTTP on localhost (json, gzip encoded when
+asked, keep-alive), so that end-to-end benchmarks go through IPMTransport as in
+production: requests, decompression, json decoding or streaming.
+
+    >>> server = FakeIPMServer(FakeIPM(latency=0.05, stations=300))
+    >>> ws = http_weather_source(server)
+    >>> ws.data(parameters=[1002, 3002], station_id=101104, timeStart='2015-01-01', timeEnd='2019-12-31')
+    >>> server.close()
+
+A FakeIPM can also be called in-process, to measure the client side alone:
+
+    >>> ws = weather_source(FakeIPM())
+"""
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas
+
+from weatherdata.catalogue import WeatherResourceCatalogue
+from weatherdata.data import ipm_get_weatherdatasource, ipm_getdata_request
+from weatherdata.ipm import WeatherDataSource
+from weatherdata.transport import IPMTransport
+
+HISTORICAL = 'Finnish Meteorological Institute measured data'
+FORECAST = 'Met Norway Locationforecast'
+
+
+class FakeIPM(object):
+    """ In-process fake of the IPM weather services """
+
+    def __init__(self, latency=0., values_per_second=None, stations=None):
+        """
+        Parameters:
+        -----------
+            latency: (float) time (s) waited by each call
+            values_per_second: (float) optional transfer rate, adding a delay proportional to the response size
+            stations: (int) optional number of stations of each resource (synthetic stations are added)
+        """
+        self.latency = latency
+        self.values_per_second = values_per_second
+        self.stations = stations
+        self.calls = 0
+        self._lock = threading.Lock()
+        fixture = ipm_getdata_request()
+        self._rows = fixture['locationWeatherData'][0]['data']
+        self._location = {k: v for k, v in fixture['locationWeatherData'][0].items() if k != 'data'}
+        self._tiles = dict()
+
+    def _wait(self, nvalues=0):
+        with self._lock:
+            self.calls += 1
+        delay = self.latency
+        if self.values_per_second:
+            delay += nvalues / float(self.values_per_second)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _data(self, nrows, nparams):
+        """ nrows rows of nparams values, tiled from the fixture """
+        with self._lock:
+            tile = self._tiles.get(nparams)
+            if tile is None or len(tile) < nrows:
+                width = len(self._rows[0])
+                rows = [[row[i % width] for i in range(nparams)] for row in self._rows]
+                tile = rows * (nrows // len(rows) + 1)
+                self._tiles[nparams] = tile
+        return tile[:nrows]
+
+    def _response(self, time_start, time_end, interval, parameters):
+        nrows = int((pandas.Timestamp(time_end) - pandas.Timestamp(time_start)).total_seconds() // interval) + 1
+        location = dict(self._location, data=self._data(nrows, len(parameters)))
+        return {'timeStart': time_start, 'timeEnd': time_end, 'interval': interval,
+                'weatherParameters': list(parameters), 'locationWeatherData': [location]}
+
+    def get_weatherdatasource(self):
+        resources = ipm_get_weatherdatasource()
+        if self.stations is None:
+            return resources
+        for item in resources:
+            geojson = item['spatial'].get('geoJSON')
+            if not geojson:
+                continue
+            geojson = json.loads(geojson) if isinstance(geojson, str) else geojson
+            features = geojson.get('features', [])
+            if not features:
+                continue
+            for i in range(len(features), self.stations):
+                feature = json.loads(json.dumps(features[i % len(features)]))
+                lon, lat = feature['geometry']['coordinates'][:2]
+                feature['geometry']['coordinates'] = [lon + 0.01 * i, lat + 0.005 * i]
+                feature['properties']['id'] = str(900000 + i)
+                feature['properties']['name'] = 'synthetic station ' + str(i)
+                features.append(feature)
+            geojson['features'] = features[:self.stations]
+            item['spatial']['geoJSON'] = json.dumps(geojson)
+        return resources
+
+    def get_weatheradapter(self, endpoint, credentials, weatherStationId, timeStart, timeEnd, interval, parameters):
+        response = self._response(timeStart, timeEnd, interval, parameters)
+        self._wait(len(response['locationWeatherData'][0]['data']) * len(parameters))
+        return response
+
+    def get_weatheradapter_forecast(self, endpoint, altitude, latitude, longitude):
+        start = pandas.Timestamp.now(tz='UTC').floor('h')
+        end = start + pandas.Timedelta(days=9)
+        response = self._response(start.strftime('%Y-%m-%dT%H:%M:%SZ'), end.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                                  3600, [1001, 3001, 2001, 4002])
+        response['locationWeatherData'][0].update(latitude=latitude, longitude=longitude, altitude=altitude)
+        self._wait(len(response['locationWeatherData'][0]['data']) * 4)
+        return response
+
+
+def weather_source(ipm, name=HISTORICAL, store=None):
+    """ A WeatherDataSource served by ipm (a FakeIPM) """
+    ws = WeatherDataSource(name, catalogue=WeatherResourceCatalogue(ipm=ipm), store=store)
+    ws.ipm = ipm
+    return ws
+
+
+IPM_URL = 'https://ipmdecisions.nibio.no/'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        ipm = self.server.ipm
+        if url.path.endswith('/rest/weatherdatasource'):
+            # endpoints of the resources point to this server
+            data = json.loads(json.dumps(ipm.get_weatherdatasource()).replace(IPM_URL, self.server.url))
+        elif 'latitude' in query:
+            data = ipm.get_weatheradapter_forecast(url.path, query.get('altitude'), float(query['latitude']),
+                                                   float(query['longitude']))
+        else:
+            data = ipm.get_weatheradapter(url.path, None, query['weatherStationId'], query['timeStart'],
+                                          query['timeEnd'], int(query['interval']),
+                                          [int(p) for p in query['parameters'].split(',')])
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body, compresslevel=6)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeIPMServer(object):
+    """ A FakeIPM served over HTTP on localhost, in a background thread """
+
+    def __init__(self, ipm):
+        self.ipm = ipm
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.ipm = ipm
+        self.url = 'http://127.0.0.1:%d/' % self._httpd.server_address[1]
+        self._httpd.url = self.url
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def http_weather_source(server, name=HISTORICAL, store=None, pool_size=16):
+    """ A WeatherDataSource calling server (a FakeIPMServer) through an IPMTransport """
+    client = IPMTransport(url=server.url, backoff=0, pool_size=pool_size)
+    ws = WeatherDataSource(name, catalogue=WeatherResourceCatalogue(ipm=client), store=store)
+    ws.ipm = client
+    return ws
@@ -0,0 +1,184 @@
+""" Benchmark suite of weatherdata, against a local stand-in IPM service
+
+Measures end-to-end WeatherDataSource.data() latency through IPMTransport (HTTP,
+gzip, json decoding or streaming), against fake_ipm.FakeIPMServer on localhost
+with a configurable latency, the client side alone (in-process fake_ipm.FakeIPM),
+json to dataframe conversion, Weather csv loading, split_weather stepping and
+mini models throughput.
+
+Each run is appended to a history file (one json record per line, with the git
+commit and library versions) and compared with the median of the last records
+with the same settings: cases that are slower by more than the tolerance are
+reported as regressions, and the exit status is 1.
+
+    python benchmark/run_benchmarks.py
+    python benchmark/run_benchmarks.py --quick --latency 0.02 --history bench_history.jsonl
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy
+import pandas
+
+from weatherdata.convert import weather_frame
+from weatherdata.data import write_meteo_example
+from weatherdata.global_weather import Weather
+from weatherdata.mini_models import leaf_wetness_pedro_gillepsie_batch, leaf_wetness_rapilly
+
+from bench_convert import scaled_response
+from bench_mini_models import season
+from bench_weather import best_of
+from fake_ipm import FakeIPM, FakeIPMServer, http_weather_source, weather_source
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+
+def bench_data(latency, years, stations):
+    """ end-to-end WeatherDataSource.data() and stations_data(), over HTTP through IPMTransport """
+    results = []
+    start, end = '%d-01-01' % (2020 - years), '2019-12-31T23:00'
+    parameters = [1002, 3002, 2001, 4002]
+    with FakeIPMServer(FakeIPM(latency=latency)) as server:
+        ws = http_weather_source(server)
+        for chunk in (None, '90D'):
+            for stream in (False, True):
+                t, df = best_of(lambda: ws.data(parameters=parameters, station_id=101104, timeStart=start,
+                                                timeEnd=end, chunk=chunk, stream=stream), repeat=3)
+                results.append({'case': 'data %dy chunk=%s stream=%s' % (years, chunk, stream), 'seconds': t,
+                                'rows': len(df)})
+    with FakeIPMServer(FakeIPM(latency=latency, stations=stations)) as server:
+        ws = http_weather_source(server)
+        ids = list(ws.station_ids()['id'])[:stations]
+        t, df = best_of(lambda: ws.stations_data(ids, parameters=[1002, 3002], timeStart='2019-01-01',
+                                                 timeEnd='2019-12-31T23:00'), repeat=1)
+        results.append({'case': 'stations_data %d stations 1y' % len(ids), 'seconds': t, 'rows': len(df)})
+    # client side only: in-process service, no latency
+    ws = weather_source(FakeIPM())
+    t, df = best_of(lambda: ws.data(parameters=parameters, station_id=101104, timeStart=start, timeEnd=end),
+                    repeat=3)
+    results.append({'case': 'data %dy in-process' % years, 'seconds': t, 'rows': len(df)})
+    return results
+
+
+def bench_convert(years):
+    fixture_rows = len(scaled_response(1)['locationWeatherData'][0]['data'])
+    response = scaled_response(int(years * 365.25 * 24) // fixture_rows)
+    rows = len(response['locationWeatherData'][0]['data'])
+    t, _ = best_of(lambda: weather_frame(response), repeat=5)
+    return [{'case': 'weather_frame %dy' % years, 'seconds': t, 'rows': rows}]
+
+
+def bench_weather(years):
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, 'meteo.csv')
+        rows = len(write_meteo_example(path, years))
+        t_load, weather = best_of(lambda: Weather(path))
+        Weather(path, cache=True)
+        t_cache, _ = best_of(lambda: Weather(path, cache=True))
+        t_deb = weather.data.index[0]
+        n_steps = len(weather.data) // 24
+        t_split, _ = best_of(lambda: sum(len(w) for w in weather.split_weather(24, t_deb, n_steps)))
+    finally:
+        shutil.rmtree(tmp)
+    return [{'case': 'Weather csv %dy' % years, 'seconds': t_load, 'rows': rows},
+            {'case': 'Weather cache %dy' % years, 'seconds': t_cache, 'rows': rows},
+            {'case': 'split_weather 24h %dy' % years, 'seconds': t_split, 'rows': rows}]
+
+
+def bench_mini_models(n):
+    weather = season(n)
+    # photosynthetic photon flux density, as the PAR column of meteo files
+    ppfd = numpy.random.RandomState(1).uniform(0, 2000, n)
+    t_pg, _ = best_of(lambda: leaf_wetness_pedro_gillepsie_batch(**weather))
+    t_rap, _ = best_of(lambda: leaf_wetness_rapilly(weather['rain_intensity'], weather['relative_humidity'], ppfd))
+    return [{'case': 'pedro_gillepsie batch', 'seconds': t_pg, 'rows': n},
+            {'case': 'rapilly', 'seconds': t_rap, 'rows': n}]
+
+
+def run(latency=0.05, years=5, stations=200, mini_models=100000):
+    results = []
+    results += bench_data(latency, years, stations)
+    results += bench_convert(years)
+    results += bench_weather(years)
+    results += bench_mini_models(mini_models)
+    df = pandas.DataFrame(results)
+    df['rows/s'] = df['rows'] / df['seconds']
+    return df
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=here,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def record(df, settings):
+    return {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': git_commit(),
+            'python': platform.python_version(), 'numpy': numpy.__version__, 'pandas': pandas.__version__,
+            'settings': settings, 'results': {row['case']: row['seconds'] for _, row in df.iterrows()}}
+
+
+def read_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(current, previous, tolerance=0.3):
+    """ ratio of timings to the median of previous records, and regressed cases """
+    if not previous:
+        return None, []
+    reference = pandas.DataFrame([r['results'] for r in previous]).median()
+    ratios = pandas.Series(current['results']) / reference
+    ratios = ratios.dropna().rename('ratio to median of %d runs' % len(previous))
+    regressions = list(ratios.index[ratios > 1 + tolerance])
+    return ratios, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.05, help='latency of the local IPM service (s)')
+    parser.add_argument('--years', type=int, default=5, help='length of the periods (years)')
+    parser.add_argument('--stations', type=int, default=200, help='number of stations for stations_data')
+    parser.add_argument('--quick', action='store_true', help='small sizes, for a smoke run')
+    parser.add_argument('--history', default=os.path.join(here, 'history.jsonl'),
+                        help='history file (benchmark/history.jsonl is not versioned)')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='relative slow down reported as regression')
+    parser.add_argument('--window', type=int, default=5, help='number of previous runs compared with')
+    parser.add_argument('--no-record', action='store_true', help='do not append this run to the history')
+    args = parser.parse_args(argv)
+
+    settings = {'latency': args.latency, 'years': args.years, 'stations': args.stations, 'mini_models': 100000}
+    if args.quick:
+        settings.update(years=1, stations=20, mini_models=10000)
+    df = run(**settings)
+    print(df.to_string(index=False))
+
+    current = record(df, settings)
+    previous = [r for r in read_history(args.history) if r['settings'] == settings]
+    ratios, regressions = compare(current, previous[-args.window:], args.tolerance)
+    if ratios is not None:
+        print()
+        print(ratios.to_string())
+    if not args.no_record:
+        with open(args.history, 'a') as f:
+            f.write(json.dumps(current) + '\n')
+    if regressions:
+        print('\nregressions (> %d%% slower): %s' % (100 * args.tolerance, ', '.join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,23 +8,46 @@
 #
 # ==============================================================================
 
+# Submodules, and names of ipm available at package level, are imported on
+# first access (PEP 562), so that `import weatherdata` does not import pandas.
+import importlib
 
-import pkg_resources
-__version__ = "0.1.0"
-try:
-    version = pkg_resources.require("weatherdata")[0].version
-    __version__ = version
-except:
-    version = __version__
-
-from . import ipm
-from .ipm import *
+_default_version = "0.1.0"
 
+_ipm_names = ('WeatherDataSource', 'WeatherDataHub', 'to_timestamp', 'format_time', 'split_period',
+              'response_to_frame', 'stitch')
 
+__all__ = list(_ipm_names)
 
+_submodules = ('aggregate', 'catalogue', 'container', 'convert', 'data', 'derived', 'forecast', 'forecast_cache',
+               'global_weather', 'instrument', 'ipm', 'mini_models', 'quality', 'singleflight', 'stations', 'store',
+               'transport', 'weather_data', 'wrapper')
 
 
+def _get_version():
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+    except ImportError:
+        return _default_version
+    try:
+        return version("weatherdata")
+    except PackageNotFoundError:
+        return _default_version
 
 
+def __getattr__(name):
+    if name in ('__version__', 'version'):
+        value = _get_version()
+        globals().update(__version__=value, version=value)
+        return value
+    if name in _submodules:
+        return importlib.import_module('.' + name, __name__)
+    if name in _ipm_names:
+        value = getattr(importlib.import_module('.ipm', __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
 
+def __dir__():
+    return sorted(set(globals()) | set(_ipm_names) | set(_submodules) | {'__version__', 'version'})
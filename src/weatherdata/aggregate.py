@@ -0,0 +1,110 @@
+# -*- python -*-
+# -*- coding:utf-8 -*-
+#
+#       Copyright 2020 INRAE-CIRAD
+#       Distributed under the Cecill-C License.
+#       See https://cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+# ==============================================================================
+"""Aggregation of weather data over time (eg hourly to daily), driven by parameter semantics"""
+
+import numpy
+import pandas
+
+from weatherdata.container import parameter_meta
+
+REDUCERS = ('mean', 'min', 'max', 'sum', 'circmean')
+
+
+def parameter_reducer(parameter):
+    """ Reducer ('mean', 'min', 'max', 'sum' or 'circmean') to aggregate an IPM parameter over time,
+    derived from its name in ipm_weatherparameter.json
+
+    Parameters:
+    -----------
+        parameter: IPM parameter id (int or str) or parameter name
+    """
+    meta = parameter_meta()
+    try:
+        name = meta[int(parameter)]['name']
+    except (KeyError, ValueError):
+        names = {item['name']: item for item in meta.values()}
+        if parameter not in names:
+            return 'mean'
+        name = parameter
+    name = name.lower()
+    if name.startswith('minimum') or name.startswith('min '):
+        return 'min'
+    if name.startswith('maximum') or name.startswith('max '):
+        return 'max'
+    if name.startswith('precipitation') or name.startswith('leaf wetness'):
+        return 'sum'
+    if 'direction' in name:
+        return 'circmean'
+    return 'mean'
+
+
+def aggregate(df, freq='D', timezone=None, reducers=None):
+    """
+    Aggregate weather data over periods (eg hourly to daily), each parameter with its own reducer
+
+    All columns are reduced with one grouping of the time axis.
+
+    Parameters:
+    -----------
+        df: a dataframe of weather data indexed by time, or by (station, time) as returned by
+            WeatherDataSource.stations_data, with IPM parameter ids (or names) as columns
+        freq: (str) length of periods, eg 'D' (default) or '6h'
+        timezone: time zone of period boundaries (eg 'Europe/Oslo'), default to time zone of df.
+                  Naive time index are assumed to be in UTC if timezone is given.
+        reducers: dict of column: reducer overriding the reducers derived from parameter meta
+
+    Returns:
+    --------
+        a dataframe indexed by period start, or by (station, period start), with the same columns
+    """
+    reducers = dict() if reducers is None else reducers
+    how = {c: reducers.get(c, parameter_reducer(c)) for c in df.columns}
+    for c, r in how.items():
+        if r not in REDUCERS:
+            raise ValueError('unknown reducer for ' + str(c) + ': ' + str(r))
+
+    if isinstance(df.index, pandas.MultiIndex):
+        level = df.index.names.index('time') if 'time' in df.index.names else df.index.nlevels - 1
+        time = df.index.get_level_values(level)
+        keys = [df.index.get_level_values(i) for i in range(df.index.nlevels) if i != level]
+    else:
+        time = df.index
+        keys = []
+
+    if timezone is not None:
+        time = time.tz_convert(timezone) if time.tz is not None else time.tz_localize('UTC').tz_convert(timezone)
+    period = time.normalize() if freq == 'D' else time.floor(freq)
+    period.name = 'time' if keys else df.index.name
+
+    # directions are averaged as unit vectors
+    circular = [c for c in df.columns if how[c] == 'circmean']
+    data = df
+    if circular:
+        radians = numpy.radians(df[circular].values)
+        data = pandas.concat([df.drop(columns=circular),
+                              pandas.DataFrame(numpy.sin(radians), index=df.index, columns=['sin ' + str(c) for c in circular]),
+                              pandas.DataFrame(numpy.cos(radians), index=df.index, columns=['cos ' + str(c) for c in circular])],
+                             axis=1)
+    grouped = data.groupby(keys + [period], sort=True)
+
+    parts = []
+    for reducer in ('mean', 'min', 'max', 'sum'):
+        columns = [c for c in df.columns if how[c] == reducer]
+        if not columns:
+            continue
+        if reducer == 'sum':
+            parts.append(grouped[columns].sum(min_count=1))
+        else:
+            parts.append(getattr(grouped[columns], reducer)())
+    if circular:
+        sin = grouped[['sin ' + str(c) for c in circular]].mean()
+        cos = grouped[['cos ' + str(c) for c in circular]].mean()
+        parts.append(pandas.DataFrame(numpy.degrees(numpy.arctan2(sin.values, cos.values)) % 360,
+                                      index=sin.index, columns=circular))
+    return pandas.concat(parts, axis=1)[list(df.columns)]
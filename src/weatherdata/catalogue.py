@@ -0,0 +1,277 @@
+# -*- python -*-
+# -*- coding:utf-8 -*-
+#
+#       Copyright 2020 INRAE-CIRAD
+#       Distributed under the Cecill-C License.
+#       See https://cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+# ==============================================================================
+"""Process-wide catalogue of the weather resources available on IPM services"""
+
+import json
+import os
+import threading
+import time
+
+import pandas
+
+from weatherdata import instrument
+from weatherdata.data import ipm_get_weatherdatasource
+from weatherdata.stations import StationIndex
+
+
+class WeatherResourceCatalogue(object):
+    '''
+    Keep the list of IPM weather resources in memory, so that metadata lookups
+    (description, endpoint, parameters, stations) do not query the IPM service.
+
+    The resource list is fetched once and reused for `ttl` seconds. If `path` is
+    given, the list is persisted there and reused by later processes as long as
+    it is not older than `ttl`. When the service can not be reached, the
+    catalogue falls back to the file at `path`, then to the snapshot bundled
+    with the package (data/ipm_weatherdatasource.json).
+
+    ..doctest::
+        >>> cat = get_catalogue()
+        >>> cat.names()
+        >>> cat.endpoint('Finnish Meteorological Institute measured data')
+        >>> cat.stations('Finnish Meteorological Institute measured data')
+    '''
+    # seconds before the service is called again, after it could not be reached
+    retry_delay = 60
+
+    def __init__(self, ipm=None, ttl=3600, path=None):
+        '''
+        Parameters:
+        -----------
+            ipm: client with a get_weatherdatasource method (default to the shared transport.IPMTransport)
+            ttl: (float) number of seconds before the resource list is fetched again.
+                 None means never.
+            path: (str) optional json file used to persist the resource list
+        '''
+        self.ipm = ipm
+        self.ttl = ttl
+        self.path = path
+        self.source = None
+        self._fetched = None
+        self._retry_at = None
+        self._resources = None
+        self._by_name = {}
+        self._stations = {}
+        self._indexes = {}
+        self._lock = threading.RLock()
+
+    # ---------------------------------------------------------------- loading
+    def _client(self):
+        if self.ipm is None:
+            from weatherdata.transport import get_transport
+            return get_transport()
+        return self.ipm
+
+    def _set(self, resources, source, fetched=None):
+        by_name = {}
+        for item in resources:
+            spatial = item.get('spatial') or {}
+            geojson = spatial.get('geoJSON')
+            if isinstance(geojson, str):
+                spatial['geoJSON'] = json.loads(geojson)
+            by_name[item['name']] = item
+        self._resources = list(resources)
+        self._by_name = by_name
+        self._stations = {}
+        self._indexes = {}
+        self._fetched = time.time() if fetched is None else fetched
+        self._retry_at = None
+        self.source = source
+
+    def _read(self, path):
+        with open(path) as f:
+            cached = json.load(f)
+        return cached['resources'], cached['fetched']
+
+    def expired(self):
+        """True if the resource list has to be (re)fetched"""
+        if self._resources is None:
+            return True
+        if self.ttl is None:
+            return False
+        if self._retry_at is not None and time.time() < self._retry_at:
+            return False
+        return time.time() - self._fetched > self.ttl
+
+    def refresh(self):
+        """
+        Fetch the resource list from the IPM service
+
+        Falls back to the persisted file, then to the bundled snapshot, if the
+        service can not be reached. The service is then not called again before
+        retry_delay seconds (or ttl, with the bundled snapshot).
+        """
+        with self._lock:
+            try:
+                resources = self._client().get_weatherdatasource()
+            except Exception:
+                if self.path is not None and os.path.exists(self.path):
+                    resources, fetched = self._read(self.path)
+                    self._set(resources, 'disk', fetched)
+                    # keep the persisted fetch time, for save
+                    self._retry_at = time.time() + self.retry_delay
+                else:
+                    self._set(ipm_get_weatherdatasource(), 'bundled')
+                return
+            self._set(resources, 'ipm')
+            if self.path is not None:
+                self.save()
+
+    def _ensure(self):
+        if self.expired():
+            instrument.count('catalogue.misses')
+            with self._lock:
+                if self._resources is None and self.path is not None and os.path.exists(self.path):
+                    resources, fetched = self._read(self.path)
+                    self._set(resources, 'disk', fetched)
+                if self.expired():
+                    self.refresh()
+        else:
+            instrument.count('catalogue.hits')
+        return self._by_name
+
+    def invalidate(self):
+        """Forget the resource list, next lookup will fetch it again"""
+        with self._lock:
+            self._resources = None
+            self._by_name = {}
+            self._stations = {}
+            self._indexes = {}
+
+    def save(self, path=None):
+        """
+        Persist the resource list in a json file
+
+        Parameters:
+        -----------
+            path: (str) destination file (default to catalogue path)
+        """
+        path = self.path if path is None else path
+        self._ensure()
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'fetched': self._fetched, 'resources': self._resources}, f)
+        os.replace(tmp, path)
+
+    # ---------------------------------------------------------------- lookups
+    def resources(self):
+        """list of resources, as returned by IPM weatherdatasource service"""
+        self._ensure()
+        return self._resources
+
+    def names(self):
+        """list of resource names"""
+        return list(self._ensure())
+
+    def descriptions(self):
+        """dictionnary with name and description of available resources"""
+        return {name: item['description'] for name, item in self._ensure().items()}
+
+    def resource(self, name):
+        """
+        Parameters:
+        -----------
+            name: name of weatherdatasource
+
+        Returns:
+        --------
+            the resource description (dict) as returned by IPM service
+        """
+        by_name = self._ensure()
+        if name not in by_name:
+            raise ValueError('unknown source: ' + name)
+        return by_name[name]
+
+    def endpoint(self, name):
+        """endpoint (str) of the resource"""
+        return self.resource(name)['endpoint']
+
+    def endpoints(self, forecast=False):
+        """
+        dictionnary of resource names and endpoints, restricted to forecast
+        resources if forecast is True
+        """
+        return {name: item['endpoint'] for name, item in self._ensure().items()
+                if not forecast or self.is_forecast(name)}
+
+    def is_forecast(self, name):
+        """True if the resource provides forecasts"""
+        temporal = self.resource(name).get('temporal') or {}
+        return bool(temporal.get('forecast'))
+
+    def parameters(self, name):
+        """dictionnary containing common and optional parameters of the resource"""
+        return self.resource(name)['parameters']
+
+    def stations(self, name):
+        """
+        Get a dataframe with station id and coordinate
+
+        Parameters:
+        -----------
+            name: name of weatherdatasource
+
+        Returns:
+        --------
+            a dataframe containing name, id and coordinate of station available for weather resource
+        """
+        item = self.resource(name)
+        with self._lock:
+            if name not in self._stations:
+                geojson = item['spatial'].get('geoJSON') or {}
+                features = geojson.get('features', [])
+                df = pandas.DataFrame({
+                    'name': [f['properties']['name'] for f in features],
+                    'id': [f['properties']['id'] for f in features],
+                    'coordinates': [f['geometry']['coordinates'] for f in features]},
+                    columns=['name', 'id', 'coordinates'])
+                self._stations[name] = df
+        return self._stations[name]
+
+    def station_index(self, name):
+        """
+        Parameters:
+        -----------
+            name: name of weatherdatasource
+
+        Returns:
+        --------
+            a StationIndex over the stations of the resource, built once
+        """
+        stations = self.stations(name)
+        with self._lock:
+            if name not in self._indexes:
+                self._indexes[name] = StationIndex(stations)
+        return self._indexes[name]
+
+
+_catalogue = None
+_catalogue_lock = threading.Lock()
+
+
+def get_catalogue():
+    """The catalogue shared by all weather data sources of the process"""
+    global _catalogue
+    if _catalogue is None:
+        with _catalogue_lock:
+            if _catalogue is None:
+                _catalogue = WeatherResourceCatalogue()
+    return _catalogue
+
+
+def set_catalogue(catalogue):
+    """
+    Replace the shared catalogue, eg to change its ttl or persistence file
+
+        >>> set_catalogue(WeatherResourceCatalogue(ttl=24 * 3600, path='ipm_resources.json'))
+    """
+    global _catalogue
+    with _catalogue_lock:
+        _catalogue = catalogue
+    return catalogue
@@ -0,0 +1,175 @@
+# -*- python -*-
+# -*- coding:utf-8 -*-
+#
+#       Copyright 2020 INRAE-CIRAD
+#       Distributed under the Cecill-C License.
+#       See https://cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+# ==============================================================================
+"""Compact container for weather data of one location"""
+
+import numpy
+import pandas
+
+from weatherdata.convert import weather_values, locations
+from weatherdata.data import ipm_get_weatherparameter
+
+_parameter_meta = None
+
+
+def parameter_meta():
+    """ Description (name, unit) of IPM weather parameters, indexed by parameter id
+    """
+    global _parameter_meta
+    if _parameter_meta is None:
+        _parameter_meta = {item['id']: item for item in ipm_get_weatherparameter()}
+    return _parameter_meta
+
+
+def _positions_to_slice(positions):
+    """ a slice equivalent to positions if they are consecutive, else positions """
+    if len(positions) > 0 and list(positions) == list(range(positions[0], positions[0] + len(positions))):
+        return slice(positions[0], positions[0] + len(positions))
+    return positions
+
+
+def _locate(time, t, side):
+    """ position of date t in time axis """
+    t = pandas.Timestamp(t)
+    if t.tzinfo is None and time.tz is not None:
+        t = t.tz_localize(time.tz)
+    return time.searchsorted(t, side)
+
+
+class WeatherTable(object):
+    '''
+    Weather data of one location: a shared time axis and one contiguous typed
+    array per parameter, with units and location meta.
+
+    Values are stored in a single (parameters, time steps) array, so that
+    selecting one parameter, consecutive parameters or a period returns views
+    (no copy). Selecting scattered parameters copies them.
+
+    ..doctest::
+        >>> table = WeatherTable.from_response(response, dtype='float32')
+        >>> table[1001]
+        >>> table.sel(parameters=[1001, 3001], start='2020-03-07', end='2020-03-08').to_frame(label='name')
+        >>> table.units
+    '''
+
+    def __init__(self, values, time, parameters, location=None, units=None):
+        '''
+        Parameters:
+        -----------
+            values: 2-D array of shape (parameters, time steps)
+            time: a pandas.DatetimeIndex of time steps
+            parameters: list of IPM parameter ids (int)
+            location: dict with latitude, longitude and altitude
+            units: dict of parameter units, default to units of ipm_weatherparameter.json
+        '''
+        values = numpy.asarray(values)
+        parameters = [int(p) for p in parameters]
+        if values.shape != (len(parameters), len(time)):
+            raise ValueError('values should be of shape (parameters, time steps)')
+        self.values = values
+        self.time = time
+        self.parameters = parameters
+        self.location = dict(location or {})
+        if units is None:
+            meta = parameter_meta()
+            units = {p: meta[p]['unit'] if p in meta else None for p in parameters}
+        self.units = {p: units.get(p) for p in parameters}
+        self._positions = {p: i for i, p in enumerate(parameters)}
+
+    @classmethod
+    def from_response(cls, response, index=None, location=0, dtype=float):
+        """
+        Build a table from a weather data (json) response
+
+        Parameters:
+        -----------
+            response: weather data (json) as returned by IPM weather adapters
+            index: a pandas.DatetimeIndex of time steps, default built from timeStart and interval
+            location: (int) index of the location in locationWeatherData
+            dtype: type of stored values (eg float32 to halve memory)
+        """
+        values = weather_values(response, location)
+        if index is None:
+            index = pandas.date_range(pandas.Timestamp(response['timeStart']), periods=len(values),
+                                      freq=pandas.Timedelta(seconds=response.get('interval', 3600)))
+        return cls(numpy.ascontiguousarray(values.T, dtype=dtype), index,
+                   response['weatherParameters'], locations(response)[location])
+
+    @classmethod
+    def from_frame(cls, df, location=None, dtype=float):
+        """
+        Build a table from a dataframe indexed by time, with parameter ids as columns
+        """
+        return cls(numpy.ascontiguousarray(df.values.T, dtype=dtype), df.index,
+                   [int(c) for c in df.columns], location)
+
+    def __len__(self):
+        return len(self.time)
+
+    def __contains__(self, parameter):
+        return int(parameter) in self._positions
+
+    def __getitem__(self, parameter):
+        """ values of a parameter (a view) """
+        return self.values[self._positions[int(parameter)]]
+
+    @property
+    def dtype(self):
+        return self.values.dtype
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    def names(self):
+        """ dict of parameter names """
+        meta = parameter_meta()
+        return {p: meta[p]['name'] if p in meta else str(p) for p in self.parameters}
+
+    def sel(self, parameters=None, start=None, end=None):
+        """
+        Select parameters and a period
+
+        Parameters:
+        -----------
+            parameters: list of parameter ids (default all)
+            start, end: dates (end included), default to the whole period
+
+        Returns:
+        --------
+            a WeatherTable sharing its values with this one, when parameters are consecutive
+        """
+        first = 0 if start is None else _locate(self.time, start, 'left')
+        last = len(self.time) if end is None else _locate(self.time, end, 'right')
+        if parameters is None:
+            rows = slice(None)
+            parameters = self.parameters
+        else:
+            parameters = [int(p) for p in parameters]
+            rows = _positions_to_slice([self._positions[p] for p in parameters])
+        return WeatherTable(self.values[rows, first:last], self.time[first:last], parameters,
+                            self.location, self.units)
+
+    def astype(self, dtype):
+        """ a copy of the table with values of type dtype """
+        return WeatherTable(self.values.astype(dtype), self.time, self.parameters, self.location, self.units)
+
+    def to_frame(self, label='id'):
+        """
+        Convert to a dataframe indexed by time
+
+        Parameters:
+        -----------
+            label: 'id' (columns are parameter ids as str, as WeatherDataSource.data) or 'name'
+        """
+        if label == 'name':
+            names = self.names()
+            columns = [names[p] for p in self.parameters]
+        else:
+            columns = [str(p) for p in self.parameters]
+        return pandas.DataFrame(self.values.T, index=self.time, columns=columns, copy=False)
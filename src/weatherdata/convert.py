@@ -0,0 +1,234 @@
+# -*- python -*-
+# -*- coding:utf-8 -*-
+#
+#       Copyright 2020 INRAE-CIRAD
+#       Distributed under the Cecill-C License.
+#       See https://cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+# ==============================================================================
+"""Conversion of IPM weather data (json) to arrays and dataframes"""
+
+import codecs
+import json
+from datetime import datetime
+from itertools import chain
+
+import numpy
+import pandas
+
+
+def weather_values(response, location=0):
+    """ Values of a weather data response as a 2-D float array
+
+    Parameters:
+    -----------
+        response: weather data (json) as returned by IPM weather adapters
+        location: (int) index of the location in locationWeatherData
+
+    Returns:
+    --------
+        an array of shape (time steps, parameters), missing values (null) are NaN
+    """
+    rows = response['locationWeatherData'][location]['data']
+    nvars = len(response['weatherParameters'])
+    if isinstance(rows, numpy.ndarray):
+        # already converted, eg by load_weather
+        return rows.astype(float, copy=False).reshape(len(rows), nvars)
+    if all(n == nvars for n in map(len, rows)):
+        try:
+            values = numpy.fromiter(chain.from_iterable(rows), dtype=float, count=len(rows) * nvars)
+            return values.reshape(len(rows), nvars)
+        except TypeError:
+            # null values: None are converted to NaN by numpy.array when dtype is float
+            return numpy.array(rows, dtype=float).reshape(len(rows), nvars)
+    # rows of unequal length
+    values = numpy.full((len(rows), nvars), numpy.nan)
+    for i, row in enumerate(rows):
+        row = row[:nvars]
+        values[i, :len(row)] = [numpy.nan if v is None else v for v in row]
+    return values
+
+
+def locations(response):
+    """ Coordinates of the locations of a weather data response
+
+    Returns:
+    --------
+        a list of dict with latitude, longitude and altitude of each location
+    """
+    return [{k: loc.get(k) for k in ('latitude', 'longitude', 'altitude')}
+            for loc in response['locationWeatherData']]
+
+
+def weather_frame(response, index=None, location=None):
+    """ Wrap the values of a weather data response in a dataframe
+
+    Parameters:
+    -----------
+        response: weather data (json) as returned by IPM weather adapters
+        index: optional index of the time steps (eg a pandas.DatetimeIndex)
+        location: (int) index of the location in locationWeatherData.
+                  If None, all locations are returned.
+
+    Returns:
+    --------
+        a dataframe with one float column per parameter (parameter ids as str).
+        For a single location, the values are not copied and the dataframe is indexed by time steps.
+        For several locations, the dataframe is indexed by (latitude, longitude, altitude, time).
+    """
+    columns = [str(var) for var in response['weatherParameters']]
+    nloc = len(response['locationWeatherData'])
+    if location is not None or nloc == 1:
+        values = weather_values(response, 0 if location is None else location)
+        return pandas.DataFrame(values, index=index, columns=columns, copy=False)
+
+    blocks = [weather_values(response, i) for i in range(nloc)]
+    sizes = [len(b) for b in blocks]
+    if index is None:
+        index = pandas.RangeIndex(max(sizes))
+    steps = numpy.concatenate([numpy.arange(n) for n in sizes])
+    coords = locations(response)
+    levels = [numpy.repeat(numpy.array([c[k] for c in coords], dtype=float), sizes)
+              for k in ('latitude', 'longitude', 'altitude')]
+    mi = pandas.MultiIndex.from_arrays(levels + [index[steps]],
+                                       names=['latitude', 'longitude', 'altitude', 'time'])
+    return pandas.DataFrame(numpy.concatenate(blocks), index=mi, columns=columns, copy=False)
+
+
+class _StreamReader(object):
+    """ Minimal pull parser over a text stream, decoding one json value at a time """
+
+    def __init__(self, fp, chunk_size=65536):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+
+    def _fill(self):
+        chunk = self.fp.read(self.chunk_size)
+        if isinstance(chunk, bytes):
+            chunk = self.utf8.decode(chunk, final=not chunk)
+        if not chunk:
+            self.eof = True
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+
+    def peek(self):
+        """ next non blank character """
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\n\r':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                raise ValueError('unexpected end of json stream')
+            self._fill()
+
+    def expect(self, chars):
+        c = self.peek()
+        if c not in chars:
+            raise ValueError('unexpected character in json stream: ' + c)
+        self.pos += 1
+        return c
+
+    def value(self):
+        """ decode the next json value """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # a value at the end of the buffer may be truncated (eg numbers)
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def items(self):
+        """ iterate over the keys of an object, leaving the reader on the value """
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+    def elements(self):
+        """ iterate over the elements of an array, leaving the reader on each element """
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self.expect(',]') == ']':
+                return
+
+
+def _expected_rows(header):
+    try:
+        start, end = [datetime.fromisoformat(header[k].replace('Z', '+00:00')) for k in ('timeStart', 'timeEnd')]
+        return int((end - start).total_seconds() // header['interval']) + 1
+    except (KeyError, TypeError, ValueError):
+        return 1024
+
+
+def _read_rows(reader, nvars, size):
+    values = numpy.empty((max(size, 1), nvars))
+    n = 0
+    for _ in reader.elements():
+        row = reader.value()
+        if n == len(values):
+            values.resize((2 * n, nvars), refcheck=False)
+        if len(row) == nvars:
+            values[n] = row
+        else:
+            values[n] = numpy.nan
+            values[n, :min(len(row), nvars)] = row[:nvars]
+        n += 1
+    values.resize((n, nvars), refcheck=False)
+    return values
+
+
+def load_weather(fp, chunk_size=65536):
+    """ Load a weather data (json) response from a file object, reading data rows one at a time
+
+    Rows are written in a preallocated float array (sized from timeStart, timeEnd and interval
+    when they come before the data), so that peak memory stays close to the size of the values.
+
+    Parameters:
+    -----------
+        fp: a file object (text or binary) opened on the json response
+        chunk_size: number of characters read at a time
+
+    Returns:
+    --------
+        the response (dict), where the data of each location is a 2-D float array
+        (time steps, parameters), with NaN for missing values
+    """
+    reader = _StreamReader(fp, chunk_size)
+    response = dict()
+    for key in reader.items():
+        if key != 'locationWeatherData':
+            response[key] = reader.value()
+            continue
+        nvars = len(response.get('weatherParameters', ()))
+        response[key] = []
+        for _ in reader.elements():
+            location = dict()
+            for k in reader.items():
+                if k == 'data' and nvars > 0:
+                    location[k] = _read_rows(reader, nvars, _expected_rows(response))
+                else:
+                    location[k] = reader.value()
+            response[key].append(location)
+    return response
@@ -0,0 +1,70 @@
+import os
+import json
+
+datadir = os.path.dirname(__file__)
+
+
+def ipm_weather_data_standard():
+    """A path to a file containing the result of getdata webservice"""
+    return os.path.join(datadir, 'weather_data_standard_example.json')
+    
+def ipm_getdata_request(stream=False, **kwds):
+    """simulate a webservice query returning data
+
+    If stream is True, the response is parsed incrementally and data are returned as float arrays
+    """
+    path = ipm_weather_data_standard()
+    with open(path) as f:
+        if stream:
+            from weatherdata.convert import load_weather
+            data = load_weather(f)
+        else:
+            data = json.load(f)
+    return data
+
+
+def ipm_weatherdatasource():
+    """A path to a snapshot of the result of weatherdatasource webservice"""
+    return os.path.join(datadir, 'ipm_weatherdatasource.json')
+
+
+def ipm_get_weatherdatasource():
+    """Load the bundled snapshot of IPM weather resources"""
+    path = ipm_weatherdatasource()
+    with open(path) as f:
+        data = json.load(f)
+    return data
+
+
+def ipm_get_weatherparameter():
+    path = os.path.join(datadir, 'ipm_weatherparameter.json')
+    with open(path) as f:
+        data = json.load(f)
+    return data
+
+
+
+
+def write_meteo_example(path, years=1):
+    """Write a synthetic hourly meteo file in the echap format read by global_weather.Weather
+
+    Parameters:
+    -----------
+        path: destination csv file
+        years: (float) length of the period, starting on 2000-01-01 (365 days per year)
+
+    Returns:
+    --------
+        the time steps (pandas.DatetimeIndex) of the file
+    """
+    import numpy
+    import pandas
+    time = pandas.date_range('2000-01-01', periods=int(years * 365 * 24), freq='h')
+    n = len(time)
+    rng = numpy.random.RandomState(0)
+    df = pandas.DataFrame({'An': time.year, 'Jour': time.dayofyear, 'hhmm': time.hour * 100,
+                           'PAR': rng.uniform(0, 2000, n).round(1), 'Tair': rng.uniform(-5, 30, n).round(1),
+                           'HR': rng.uniform(30, 100, n).round(1), 'Vent': rng.uniform(0, 10, n).round(1),
+                           'Pluie': rng.exponential(0.2, n).round(1)})
+    df.to_csv(path, sep=';', index=False)
+    return time
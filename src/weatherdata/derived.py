@@ -0,0 +1,168 @@
+# -*- python -*-
+# -*- coding:utf-8 -*-
+#
+#       Copyright 2020 INRAE-CIRAD
+#       Distributed under the Cecill-C License.
+#       See https://cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+# ==============================================================================
+"""Registry of variables derived from weather data, computed lazily"""
+
+from collections import namedtuple
+
+import numpy
+import pandas
+
+from weatherdata.mini_models import leaf_wetness_rapilly
+
+DerivedVariable = namedtuple('DerivedVariable', ['name', 'depends', 'function', 'unit'])
+
+_registry = dict()
+
+
+def register(name, depends, unit=None):
+    """ Decorator registering a function computing the derived variable name
+    from the variables listed in depends (passed as keyword arguments)
+
+        >>> @register('temperature_air_kelvin', ['temperature_air'], unit='K')
+        ... def kelvin(temperature_air):
+        ...     return temperature_air + 273.15
+    """
+    def decorator(function):
+        _registry[name] = DerivedVariable(name, list(depends), function, unit)
+        return function
+    return decorator
+
+
+def derived_variables():
+    """ dict of registered derived variables """
+    return dict(_registry)
+
+
+@register('global_radiation', ['PPFD'], unit='W.m-2')
+def global_radiation(PPFD):
+    """ Convert the PAR (ppfd in micromol.m-2.sec-1) in global radiation (J.m-2.s-1, ie W/m2)
+    1 WattsPAR.m-2 = 4.6 ppfd, 1 Wglobal = 0.48 WattsPAR)
+    """
+    return (PPFD * 1. / 4.6) / 0.48
+
+
+@register('saturated_vapor_pressure', ['temperature_air'], unit='kPa')
+def saturated_vapor_pressure(temperature_air):
+    """ Saturating water vapor pressure (kPa) at temperature T (Celcius) with Tetens formula
+    """
+    return 0.6108 * numpy.exp(17.27 * temperature_air / (237.3 + temperature_air))
+
+
+@register('vapor_pressure', ['relative_humidity', 'saturated_vapor_pressure'], unit='kPa')
+def vapor_pressure(relative_humidity, saturated_vapor_pressure):
+    """ Water vapor pressure (kPa) from relative humidity (%)
+    """
+    return relative_humidity / 100. * saturated_vapor_pressure
+
+
+@register('vapor_pressure_deficit', ['saturated_vapor_pressure', 'vapor_pressure'], unit='kPa')
+def vapor_pressure_deficit(saturated_vapor_pressure, vapor_pressure):
+    """ Vapor pressure deficit (kPa)
+    """
+    return saturated_vapor_pressure - vapor_pressure
+
+
+@register('dew_point', ['vapor_pressure'], unit='Celcius')
+def dew_point(vapor_pressure):
+    """ Dew point temperature (Celcius), inverse of Tetens formula
+    """
+    x = numpy.log(vapor_pressure / 0.6108)
+    return 237.3 * x / (17.27 - x)
+
+
+@register('temperature_air_leaf', ['temperature_air', 'PPFD'], unit='Celcius')
+def temperature_air_leaf(temperature_air, PPFD):
+    """ Estimation of air temperature near the leaf (see mini_models.temp_par)
+    """
+    return temperature_air + (PPFD / 300)
+
+
+@register('leaf_wetness', ['rain', 'relative_humidity', 'PPFD'])
+def leaf_wetness(rain, relative_humidity, PPFD):
+    """ Leaf wetness (Rapilly et Jolivet, 1976), see mini_models.leaf_wetness_rapilly
+    """
+    return leaf_wetness_rapilly(rain, relative_humidity, PPFD)
+
+
+class WeatherVariables(object):
+    '''
+    Access to the columns of a weather dataframe and to registered derived
+    variables, computed on first access and cached.
+
+    A cached variable is computed again when one of the columns it depends on
+    (directly or not) is replaced in the dataframe, or when the dataframe
+    itself is replaced. Call invalidate() after modifying values in place.
+
+    ..doctest::
+        >>> variables = WeatherVariables(weather.data)
+        >>> variables['vapor_pressure_deficit']
+        >>> variables.get(['temperature_air', 'dew_point', 'leaf_wetness'])
+    '''
+
+    def __init__(self, data, registry=None):
+        '''
+        Parameters:
+        -----------
+            data: a dataframe of weather data (eg Weather.data)
+            registry: dict of DerivedVariable (default to registered variables)
+        '''
+        self.data = data
+        self.registry = _registry if registry is None else registry
+        self._cache = dict()
+
+    def _token(self, name):
+        """ identifies the current state of the columns name depends on """
+        if name in self.data.columns:
+            values = self.data[name].values
+            return (id(self.data), values.__array_interface__['data'][0], len(values))
+        if name not in self.registry:
+            raise KeyError(name)
+        return tuple(self._token(dep) for dep in self.registry[name].depends)
+
+    def __contains__(self, name):
+        return name in self.data.columns or name in self.registry
+
+    def __getitem__(self, name):
+        if name in self.data.columns:
+            return self.data[name]
+        token = self._token(name)
+        cached = self._cache.get(name)
+        if cached is not None and cached[0] == token:
+            return cached[1]
+        variable = self.registry[name]
+        values = variable.function(**{dep: self[dep] for dep in variable.depends})
+        if isinstance(values, pandas.Series):
+            values = values.rename(name)
+        else:
+            values = pandas.Series(values, index=self.data.index, name=name)
+        self._cache[name] = (token, values)
+        return values
+
+    def get(self, names):
+        """ dataframe of the variables listed in names """
+        return pandas.concat([self[name] for name in names], axis=1)
+
+    def available(self):
+        """ names of columns and derived variables that can be computed from them """
+        names = list(self.data.columns)
+        for name in self.registry:
+            try:
+                self._token(name)
+            except KeyError:
+                continue
+            if name not in names:
+                names.append(name)
+        return names
+
+    def invalidate(self, name=None):
+        """ forget cached variables (all, or only name) """
+        if name is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(name, None)
@@ -0,0 +1,156 @@
+# -*- python -*-
+# -*- coding:utf-8 -*-
+#
+#       Copyright 2020 INRAE-CIRAD
+#       Distributed under the Cecill-C License.
+#       See https://cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+# ==============================================================================
+"""Concurrent (asyncio) forecasts at many locations"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+import pandas
+
+from weatherdata.convert import weather_values
+
+
+def _points(coordinates):
+    """ list of (latitude, longitude, altitude) of coordinates """
+    if isinstance(coordinates, pandas.DataFrame):
+        latitude = coordinates['latitude'].values
+        longitude = coordinates['longitude'].values
+        altitude = coordinates['altitude'].values if 'altitude' in coordinates.columns else None
+    else:
+        coordinates = numpy.asarray(coordinates, dtype=float)
+        if coordinates.ndim == 1:
+            coordinates = coordinates[None, :]
+        latitude, longitude = coordinates[:, 0], coordinates[:, 1]
+        altitude = coordinates[:, 2] if coordinates.shape[1] > 2 else None
+    if altitude is None:
+        altitude = [None] * len(latitude)
+    return [(float(lat), float(lon), None if alt is None or numpy.isnan(alt) else float(alt))
+            for lat, lon, alt in zip(latitude, longitude, altitude)]
+
+
+async def iter_forecasts(source, coordinates, concurrency=16, retries=2, return_exceptions=False):
+    """
+    Query the forecasts of a forecast resource at many locations, concurrently,
+    yielding them as they arrive
+
+    Requests are sent from a pool of concurrency threads (with the client of source, eg
+    the shared transport), at most concurrency at a time. The connection pool of the
+    transport (IPMTransport.pool_size) should not be smaller than concurrency.
+
+    Parameters:
+    -----------
+        source: a WeatherDataSource of a forecast resource (eg 'Met Norway Locationforecast')
+        coordinates: array of (latitude, longitude) or (latitude, longitude, altitude) rows,
+                     or a dataframe with latitude, longitude (and altitude) columns
+        concurrency: (int) maximum number of requests sent at the same time
+        retries: (int) number of times a failed request is sent again
+        return_exceptions: if True, the exception of a failed location is yielded in place of
+                           its response, else it is raised
+
+    Yields:
+    -------
+        (position of the location in coordinates, json response) tuples, in completion order
+
+    ..doctest::
+        >>> async for i, response in iter_forecasts(ws, [[67.28, 14.37, 70], [60.2, 24.9, 10]]):
+        ...     print(i, response['timeStart'])
+    """
+    points = _points(coordinates)
+    endpoint = source.endpoint()
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    executor = ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(points))))
+
+    async def fetch(i, point):
+        async with semaphore:
+            try:
+                response = await loop.run_in_executor(executor, source._get_forecast, endpoint, point, retries)
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                response = e
+        return i, response
+
+    tasks = [asyncio.ensure_future(fetch(i, point)) for i, point in enumerate(points)]
+    try:
+        for done in asyncio.as_completed(tasks):
+            yield await done
+    finally:
+        for task in tasks:
+            task.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def forecast_frame(responses, coordinates=None):
+    """
+    Assemble single location forecast responses in one dataframe
+
+    Parameters:
+    -----------
+        responses: list of json responses (None or exceptions are skipped)
+        coordinates: optional coordinates of the requests, as in iter_forecasts
+                     (default to the coordinates given by the responses)
+
+    Returns:
+    --------
+        a dataframe indexed by (latitude, longitude, altitude, time), as convert.weather_frame
+        for several locations, with one column per parameter (parameter ids as str)
+    """
+    points = None if coordinates is None else _points(coordinates)
+    blocks, times, coords, columns = [], [], [], None
+    for i, response in enumerate(responses):
+        if response is None or isinstance(response, Exception):
+            continue
+        values = weather_values(response, 0)
+        if columns is None:
+            columns = [str(p) for p in response['weatherParameters']]
+        start = pandas.Timestamp(response['timeStart'])
+        start = start.tz_localize('UTC') if start.tzinfo is None else start.tz_convert('UTC')
+        step = pandas.Timedelta(seconds=response.get('interval', 3600))
+        blocks.append(values)
+        times.append(pandas.date_range(start, periods=len(values), freq=step))
+        if points is None:
+            loc = response['locationWeatherData'][0]
+            point = (loc.get('latitude'), loc.get('longitude'), loc.get('altitude'))
+        else:
+            point = points[i]
+        coords.append(numpy.array([numpy.nan if c is None else c for c in point], dtype=float))
+    names = ['latitude', 'longitude', 'altitude', 'time']
+    if not blocks:
+        index = pandas.MultiIndex.from_arrays([[], [], [], pandas.DatetimeIndex([], tz='UTC')], names=names)
+        return pandas.DataFrame(index=index, columns=columns or [], dtype=float)
+    sizes = [len(b) for b in blocks]
+    coords = numpy.repeat(numpy.array(coords), sizes, axis=0)
+    index = pandas.MultiIndex.from_arrays([coords[:, 0], coords[:, 1], coords[:, 2], times[0].append(times[1:])],
+                                          names=names)
+    return pandas.DataFrame(numpy.concatenate(blocks), index=index, columns=columns, copy=False)
+
+
+async def get_forecasts(source, coordinates, concurrency=16, retries=2, return_exceptions=False):
+    """
+    Query the forecasts of a forecast resource at many locations, concurrently (see iter_forecasts)
+
+    Returns:
+    --------
+        a dataframe indexed by (latitude, longitude, altitude, time) of requested coordinates
+        (see forecast_frame). With return_exceptions, failed locations are missing.
+    """
+    points = _points(coordinates)
+    responses = [None] * len(points)
+    async for i, response in iter_forecasts(source, points, concurrency, retries, return_exceptions):
+        responses[i] = response
+    return forecast_frame(responses, points)
+
+
+def forecasts(source, coordinates, concurrency=16, retries=2, return_exceptions=False):
+    """
+    Blocking version of get_forecasts, for code not running an event loop
+    """
+    return asyncio.run(get_forecasts(source, coordinates, concurrency, retries, return_exceptions))
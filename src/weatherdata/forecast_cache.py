@@ -0,0 +1,219 @@
+# -*- python -*-
+# -*- coding:utf-8 -*-
+#
+#       Copyright 2020 INRAE-CIRAD
+#       Distributed under the Cecill-C License.
+#       See https://cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+# ==============================================================================
+"""In-memory cache of forecasts, refreshed incrementally"""
+
+import threading
+from collections import namedtuple
+
+import numpy
+import pandas
+
+from weatherdata import instrument
+from weatherdata.convert import weather_values
+
+
+class ForecastDelta(namedtuple('ForecastDelta', ['key', 'issued', 'changed', 'added', 'removed'])):
+    """
+    Changes brought by a forecast to the cached series of a location
+
+    key: (endpoint, latitude, longitude, altitude) of the location
+    issued: start (UTC) of the forecast
+    changed: time steps already cached whose values changed
+    added: time steps that were not cached
+    removed: time steps dropped because they are no longer forecasted
+    """
+    __slots__ = ()
+
+    def __bool__(self):
+        return len(self.changed) > 0 or len(self.added) > 0 or len(self.removed) > 0
+
+    def times(self):
+        """ all the time steps affected by the forecast (changed, added or removed), sorted """
+        return self.changed.append([self.added, self.removed]).sort_values()
+
+    def window(self):
+        """ (first, last) affected time steps, or None if nothing changed """
+        times = self.times()
+        if len(times) == 0:
+            return None
+        return times[0], times[-1]
+
+
+class _Series(object):
+    """ regular time series of a location, stored in a growable (time steps, parameters) array """
+
+    def __init__(self, start, interval, parameters, values):
+        self.start = start
+        self.interval = interval
+        self.parameters = list(parameters)
+        self.values = values
+        self.n = len(values)
+
+    def time(self, first=0, last=None):
+        last = self.n if last is None else last
+        return pandas.date_range(self.start + first * self.interval, periods=max(last - first, 0),
+                                 freq=self.interval)
+
+    def reserve(self, n):
+        if n > len(self.values):
+            values = numpy.full((max(n, 2 * len(self.values)), len(self.parameters)), numpy.nan)
+            values[:self.n] = self.values[:self.n]
+            self.values = values
+
+    def add_parameters(self, parameters):
+        new = [p for p in parameters if p not in self.parameters]
+        if new:
+            self.values = numpy.hstack([self.values, numpy.full((len(self.values), len(new)), numpy.nan)])
+            self.parameters += new
+
+    def drop_before(self, t):
+        k = int(min(max((t - self.start) // self.interval, 0), self.n))
+        if k > 0:
+            self.values = self.values[k:]
+            self.start += k * self.interval
+            self.n -= k
+
+
+class ForecastCache(object):
+    '''
+    Last forecast of each (endpoint, location), merged with the previous ones
+
+    On update, only the time steps that are new or whose values changed are
+    written in the stored arrays, and the time steps before the start of the
+    new forecast are kept as history (the latest forecast of each past hour).
+    Time steps after the end of the new forecast are dropped. Each update
+    returns a ForecastDelta, so that models can recompute only the affected
+    window.
+
+    ..doctest::
+        >>> cache = ForecastCache(history='30D')
+        >>> ws = WeatherDataSource('Met Norway Locationforecast', forecast_cache=cache)
+        >>> delta = ws.update_forecast(latitude=67.2828, longitude=14.3711, altitude=70)
+        >>> delta.window()
+        >>> cache.frame(delta.key, *delta.window())
+    '''
+
+    def __init__(self, history=None, rtol=0., atol=1e-9):
+        '''
+        Parameters:
+        -----------
+            history: (str or pandas.Timedelta) length of history kept before the start of
+                     the last forecast (default all)
+            rtol, atol: tolerances under which a value is not considered changed
+        '''
+        self.history = None if history is None else pandas.Timedelta(history)
+        self.rtol = rtol
+        self.atol = atol
+        self._series = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def key(endpoint, latitude, longitude, altitude=None):
+        """ key of a location (coordinates are rounded to about 10 m) """
+        return (endpoint, round(float(latitude), 4), round(float(longitude), 4),
+                None if altitude is None else round(float(altitude), 1))
+
+    def keys(self):
+        with self._lock:
+            return list(self._series)
+
+    def __contains__(self, key):
+        return key in self._series
+
+    def update(self, key, response):
+        """
+        Merge a forecast response into the cached series of key
+
+        The response should hold one location (ValueError is raised otherwise)
+
+        Returns:
+        --------
+            a ForecastDelta
+        """
+        nloc = len(response['locationWeatherData'])
+        if nloc != 1:
+            raise ValueError('a forecast of one location is expected, the response holds %d' % nloc)
+        start = pandas.Timestamp(response['timeStart'])
+        start = start.tz_localize('UTC') if start.tzinfo is None else start.tz_convert('UTC')
+        interval = pandas.Timedelta(seconds=response.get('interval', 3600))
+        parameters = [int(p) for p in response['weatherParameters']]
+        values = weather_values(response, 0)
+        nrows = len(values)
+
+        with self._lock, instrument.timer('forecast_cache.update'):
+            series = self._series.get(key)
+            if series is not None:
+                offset = (start - series.start) / interval
+                if series.interval != interval or offset < 0 or offset != int(offset):
+                    # not on the cached time grid: start again
+                    series = None
+            if series is None:
+                series = _Series(start, interval, parameters, numpy.array(values, dtype=float))
+                self._series[key] = series
+                empty = pandas.DatetimeIndex([], tz='UTC')
+                instrument.count('forecast_cache.added', nrows)
+                return ForecastDelta(key, start, empty, series.time(), empty)
+
+            series.add_parameters(parameters)
+            columns = [series.parameters.index(p) for p in parameters]
+            offset = int(offset)
+            end = offset + nrows
+
+            # overlap with the cached forecast
+            k = max(min(series.n, end) - offset, 0)
+            old = series.values[offset:offset + k][:, columns]
+            same = numpy.isclose(old, values[:k], rtol=self.rtol, atol=self.atol, equal_nan=True).all(axis=1)
+            changed = numpy.nonzero(~same)[0]
+            if len(changed) > 0:
+                rows = offset + changed
+                series.values[rows[:, None], columns] = values[changed]
+            # time steps after the cached ones
+            series.reserve(end)
+            first_added = max(series.n, offset)
+            if end > series.n:
+                series.values[series.n:end] = numpy.nan
+                series.values[first_added:end, columns] = values[first_added - offset:]
+            added = series.time(first_added, end)
+            removed = series.time(end, series.n)
+            series.n = end
+
+            if self.history is not None:
+                series.drop_before(start - self.history)
+
+            changed = pandas.DatetimeIndex(start + changed * interval)
+            instrument.count('forecast_cache.changed', len(changed))
+            instrument.count('forecast_cache.added', len(added))
+            return ForecastDelta(key, start, changed, added, removed)
+
+    def frame(self, key, start=None, end=None):
+        """
+        Cached series of key (history and last forecast), as a dataframe indexed by UTC time
+
+        Parameters:
+        -----------
+            start, end: optional period (end included), eg the window of a ForecastDelta
+        """
+        with self._lock:
+            series = self._series[key]
+            first, last = 0, series.n
+            if start is not None:
+                first = int(min(max(numpy.ceil((pandas.Timestamp(start) - series.start) / series.interval), 0),
+                                series.n))
+            if end is not None:
+                last = int(min(max((pandas.Timestamp(end) - series.start) // series.interval + 1, first), series.n))
+            return pandas.DataFrame(series.values[first:last].copy(), index=series.time(first, last),
+                                    columns=[str(p) for p in series.parameters])
+
+    def clear(self, key=None):
+        """ forget cached forecasts (all, or only key) """
+        with self._lock:
+            if key is None:
+                self._series.clear()
+            else:
+                self._series.pop(key, None)
@@ -5,11 +5,17 @@ Created on Wed Apr 24 14:29:15 2013
 @author: lepse
 """
 
+import hashlib
+import json
+import os
+
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from math import exp
 
+from weatherdata import instrument
+
 def parse(yr, doy, hr):
     """ Convert the 'An', 'Jour' and 'hhmm' variables of the meteo dataframe in a datetime object (%Y-%m-%d %H:%M:%S format)
     """
@@ -18,6 +24,113 @@ def parse(yr, doy, hr):
     delta = timedelta(days=jour, hours=heure)
     return dt + delta
 
+def to_datetime(yr, doy, hr):
+    """ Vectorized version of parse: convert arrays of 'An', 'Jour' and 'hhmm' in a pandas.DatetimeIndex
+    """
+    an = np.asarray(yr).astype(int)
+    jour = np.asarray(doy).astype(int)
+    heure = (np.asarray(hr) // 100).astype(int)
+    dt = (an - 1970).astype('datetime64[Y]').astype('datetime64[h]')
+    return pd.DatetimeIndex(dt + (jour - 1) * 24 + heure)
+
+def read_meteo(data_file, sep=';'):
+    """ Parse an echap-style meteo file (see Weather) in a dataframe indexed by datetime
+    """
+    data = pd.read_csv(data_file, sep=sep,
+                       usecols=['An','Jour','hhmm','PAR','Tair','HR','Vent','Pluie'])
+    datetime_index = to_datetime(data['An'], data['Jour'], data['hhmm'])
+    data = data.drop(columns=['An','Jour','hhmm'])
+    data.insert(0, 'datetime', datetime_index)
+
+    data.index = data.datetime
+    data = data.rename(columns={'PAR':'PPFD',
+                         'Tair':'temperature_air',
+                         'HR':'relative_humidity',
+                         'Vent':'wind_speed',
+                         'Pluie':'rain'})
+    return data
+
+def cache_directory(data_file, cache=True):
+    """ Directory of the binary cache of data_file: a sidecar directory if cache is True,
+    or a sub-directory of cache (a path) specific to data_file
+    """
+    if cache is True:
+        return data_file + '.cache'
+    name = os.path.basename(data_file) + '-' + hashlib.sha1(os.path.abspath(data_file).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(cache, name)
+
+def _sha1(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def _write_meta(cache_dir, meta):
+    path = os.path.join(cache_dir, 'meta.json')
+    suffix = '.%d.tmp' % os.getpid()
+    with open(path + suffix, 'w') as f:
+        json.dump(meta, f)
+    os.replace(path + suffix, path)
+
+def save_cache(data, data_file, cache_dir, sep=';'):
+    """ Save parsed meteo data in cache_dir: one .npy file per column, and a meta.json file
+    identifying the source file
+    """
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+    stat = os.stat(data_file)
+    suffix = '.%d.tmp' % os.getpid()
+    columns = [c for c in data.columns if c != 'datetime']
+    for i, column in enumerate(columns):
+        path = os.path.join(cache_dir, 'column%d.npy' % i)
+        with open(path + suffix, 'wb') as f:
+            np.save(f, data[column].values)
+        os.replace(path + suffix, path)
+    path = os.path.join(cache_dir, 'datetime.npy')
+    with open(path + suffix, 'wb') as f:
+        np.save(f, data.index.values)
+    os.replace(path + suffix, path)
+    meta = {'mtime': stat.st_mtime, 'size': stat.st_size, 'sha1': _sha1(data_file),
+            'sep': sep, 'columns': columns}
+    _write_meta(cache_dir, meta)
+
+def load_cache(data_file, cache_dir, sep=';'):
+    """ Load (memory-map) meteo data cached in cache_dir, or return None if there is no valid cache
+    """
+    path = os.path.join(cache_dir, 'meta.json')
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(data_file)
+    try:
+        with open(path) as f:
+            meta = json.load(f)
+        if meta['sep'] != sep:
+            return None
+        same = (meta['mtime'], meta['size']) == (stat.st_mtime, stat.st_size)
+        if not same and (meta['size'] != stat.st_size or meta['sha1'] != _sha1(data_file)):
+            return None
+    except (IOError, ValueError, KeyError, TypeError):
+        # truncated or corrupt meta.json
+        return None
+    if not same:
+        # same content (eg touched file): record the new mtime, so that it is not hashed again
+        meta['mtime'] = stat.st_mtime
+        try:
+            _write_meta(cache_dir, meta)
+        except (IOError, OSError):
+            pass
+    try:
+        index = pd.DatetimeIndex(np.load(os.path.join(cache_dir, 'datetime.npy')), name='datetime')
+        # copy on write memory maps: pages are shared between processes until modified
+        columns = {c: np.load(os.path.join(cache_dir, 'column%d.npy' % i), mmap_mode='c')
+                   for i, c in enumerate(meta['columns'])}
+    except (IOError, ValueError, KeyError):
+        return None
+    data = pd.DataFrame(columns, index=index, copy=False)
+    data.insert(0, 'datetime', index)
+    return data
+
 class Weather(object):
     """ Class compliying echap local_microclimate model protocol (meteo_reader).
         expected variables of the data_file are:
@@ -30,20 +143,34 @@ class Weather(object):
             - 'HR': Humidity of air (kPa)
             - 'Vent' : Wind speed (m.s-1)
     """
-    def __init__(self, data_file='', sep = ';'):
+    def __init__(self, data_file='', sep = ';', cache=False):
+        """ Read data_file
+
+        If cache is True (sidecar directory data_file + '.cache') or a directory, the parsed data are
+        saved there in a binary format on first read, and later reloaded (memory-mapped) instead of
+        parsing the file again, as long as the file is unchanged (same mtime and size, or same sha1).
+        Processes reading the same file then share one page-cached copy of the data.
+        """
         if data_file is '':
             self.data = None
         else:
-            data = pd.read_csv(data_file, parse_dates={'datetime':['An','Jour','hhmm']},
-                               date_parser=parse, sep=sep,
-                               usecols=['An','Jour','hhmm','PAR','Tair','HR','Vent','Pluie'])
-
-            data.index = data.datetime
-            data = data.rename(columns={'PAR':'PPFD',
-                                 'Tair':'temperature_air',
-                                 'HR':'relative_humidity',
-                                 'Vent':'wind_speed',
-                                 'Pluie':'rain'})
+            data = None
+            if cache:
+                cache_dir = cache_directory(data_file, cache)
+                with instrument.timer('weather.cache_load'):
+                    data = load_cache(data_file, cache_dir, sep)
+                instrument.count('weather.cache_misses' if data is None else 'weather.cache_hits')
+            if data is None:
+                with instrument.timer('weather.read'):
+                    data = read_meteo(data_file, sep)
+                if cache:
+                    # the cache is an optimisation: data are returned even if it can not be written
+                    try:
+                        with instrument.timer('weather.cache_save'):
+                            save_cache(data, data_file, cache_dir, sep)
+                    except (IOError, OSError):
+                        instrument.count('weather.cache_errors')
+            instrument.count('weather.rows', len(data))
             self.data = data
 
     def get_weather(self, timestep, t_deb):
@@ -63,9 +190,8 @@ class Weather(object):
         - `globalclimate` (dataframe)
             Pandas dataframe with hourly meteo for the time step from t_deb
         """    
-        data = self.data
-
-        globalclimate = data.truncate(before = t_deb, after = self.next_date((timestep - 1), t_deb))
+        starts, stops = self.window_bounds(timestep, t_deb, 1)
+        globalclimate = self.data.iloc[starts[0]:stops[0]]
         mean_globalclimate = globalclimate.mean()
         return mean_globalclimate, globalclimate
         
@@ -80,8 +206,44 @@ class Weather(object):
     def split_weather(self, time_step, t_deb, n_steps):
         
         """ return an generator iterating over sub-part of the meteo data, each corresponding to one time-step"""
-        tstep = [t_deb + i * timedelta(hours=time_step) for i in range(n_steps)]
-        return (self.data.truncate(before = t, after = self.next_date((time_step - 1), t)) for t in tstep)
+        starts, stops = self.window_bounds(time_step, t_deb, n_steps)
+        data = self.data
+        return (data.iloc[start:stop] for start, stop in zip(starts, stops))
+
+    def window_bounds(self, time_step, t_deb, n_steps):
+        """ Integer positions of the time-steps in the meteo data
+
+        Time-step i covers the hours from t_deb + i * time_step to t_deb + (i + 1) * time_step - 1 (included),
+        as data.truncate(before, after) in split_weather.
+
+        :Returns:
+        ---------
+        - `starts`, `stops` (arrays of int)
+            data.iloc[starts[i]:stops[i]] is the data of time-step i
+        """
+        t_deb = pd.Timestamp(t_deb)
+        first = t_deb + np.arange(n_steps) * pd.Timedelta(hours=time_step)
+        last = first + pd.Timedelta(hours=time_step - 1)
+        index = self.data.index
+        return index.searchsorted(first, 'left'), index.searchsorted(last, 'right')
+
+    def window_means(self, time_step, t_deb, n_steps):
+        """ Mean of the numeric variables over each time-step, computed in one grouped reduction
+
+        :Returns:
+        ---------
+        - `means` (dataframe)
+            one row per time-step, indexed by the start date of time-steps (NaN for empty time-steps)
+        """
+        starts, stops = self.window_bounds(time_step, t_deb, n_steps)
+        counts = stops - starts
+        offsets = np.cumsum(counts) - counts
+        positions = np.arange(counts.sum()) - np.repeat(offsets - starts, counts)
+        labels = np.repeat(np.arange(n_steps), counts)
+        means = self.data.iloc[positions].groupby(labels).mean(numeric_only=True)
+        means = means.reindex(np.arange(n_steps))
+        means.index = pd.Timestamp(t_deb) + np.arange(n_steps) * pd.Timedelta(hours=time_step)
+        return means
     
     def str_to_datetime(self, t_deb):
         """ Convert a date in string format into a datetime object
@@ -96,7 +258,19 @@ class Weather(object):
         """
         data = self.data
         global_radiation = self.PPFD_to_global(data['PPFD'])
-        data = data.join(global_radiation)
+        self.data = data.join(global_radiation)
+
+    @property
+    def variables(self):
+        """ Columns of data and derived variables (eg 'vapor_pressure', 'dew_point'), computed lazily and cached
+        (see weatherdata.derived)
+        """
+        from weatherdata.derived import WeatherVariables
+        variables = self.__dict__.get('_variables')
+        if variables is None or variables.data is not self.data:
+            variables = WeatherVariables(self.data)
+            self._variables = variables
+        return variables
         
     def add_vapor_pressure(self, globalclimate):
         """ Add the column 'global_radiation' to the data frame.
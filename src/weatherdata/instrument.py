@@ -0,0 +1,214 @@
+# -*- python -*-
+# -*- coding:utf-8 -*-
+#
+#       Copyright 2020 INRAE-CIRAD
+#       Distributed under the Cecill-C License.
+#       See https://cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+# ==============================================================================
+"""Opt-in instrumentation of weatherdata hot paths (timings and counters)
+
+Instrumentation is disabled by default: instrumented code then only tests a
+module flag. Once enabled, stages record their duration (eg 'ipm.fetch',
+'transport.decode', 'weather.read') and counters are incremented (eg
+'transport.bytes', 'ipm.rows', 'store.misses', 'weather.cache_hits').
+
+    >>> stats = enable()
+    >>> ws.data(parameters=[1002, 3002], station_id=101104, timeStart='2020-06-12', timeEnd='2020-07-03')
+    >>> print(stats)
+    >>> disable()
+
+Hooks receive each record as it happens: hook(kind, name, value), with kind
+'time' (value in seconds) or 'count'.
+
+    >>> add_hook(lambda kind, name, value: print(kind, name, value))
+"""
+
+import functools
+import threading
+import time
+
+_enabled = False
+_stats = None
+_hooks = []
+_lock = threading.Lock()
+
+
+class Stats(object):
+    '''
+    Thread-safe accumulator of stage timings (calls, total and max duration) and counters
+    '''
+
+    def __init__(self):
+        self.timings = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                self.timings[name] = [1, seconds, seconds]
+            else:
+                timing[0] += 1
+                timing[1] += seconds
+                if seconds > timing[2]:
+                    timing[2] = seconds
+
+    def add_count(self, name, n=1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def reset(self):
+        with self._lock:
+            self.timings = {}
+            self.counts = {}
+
+    def report(self):
+        """ dict with timings ({stage: {calls, total, mean, max}}) and counts ({name: value}) """
+        with self._lock:
+            timings = {name: {'calls': t[0], 'total': t[1], 'mean': t[1] / t[0], 'max': t[2]}
+                       for name, t in self.timings.items()}
+            return {'timings': timings, 'counts': dict(self.counts)}
+
+    def to_frame(self):
+        """ timings as a dataframe indexed by stage, sorted by total time """
+        import pandas
+        df = pandas.DataFrame.from_dict(self.report()['timings'], orient='index',
+                                        columns=['calls', 'total', 'mean', 'max'])
+        return df.sort_values('total', ascending=False)
+
+    def __repr__(self):
+        report = self.report()
+        lines = ['%-45s %8d calls %10.4f s (max %.4f s)' % (name, t['calls'], t['total'], t['max'])
+                 for name, t in sorted(report['timings'].items(), key=lambda x: -x[1]['total'])]
+        lines += ['%-45s %14s' % (name, value) for name, value in sorted(report['counts'].items())]
+        return '\n'.join(lines)
+
+
+def _update():
+    global _enabled
+    _enabled = _stats is not None or len(_hooks) > 0
+
+
+def enable(stats=None):
+    """ Enable instrumentation, recording in stats (default a new Stats), and return it """
+    global _stats
+    with _lock:
+        _stats = Stats() if stats is None else stats
+        _update()
+    return _stats
+
+
+def disable():
+    """ Disable instrumentation (stats and hooks) """
+    global _stats, _hooks
+    with _lock:
+        _stats = None
+        _hooks = []
+        _update()
+
+
+def is_enabled():
+    return _enabled
+
+
+def get_stats():
+    """ the Stats recording, None if not enabled """
+    return _stats
+
+
+def add_hook(hook):
+    """ Call hook(kind, name, value) for each record, kind is 'time' or 'count' """
+    global _hooks
+    with _lock:
+        _hooks = _hooks + [hook]
+        _update()
+    return hook
+
+
+def remove_hook(hook):
+    global _hooks
+    with _lock:
+        _hooks = [h for h in _hooks if h is not hook]
+        _update()
+
+
+def record_time(name, seconds):
+    stats = _stats
+    if stats is not None:
+        stats.add_time(name, seconds)
+    for hook in _hooks:
+        hook('time', name, seconds)
+
+
+def count(name, n=1):
+    """ Increment counter name by n, if instrumentation is enabled """
+    if not _enabled:
+        return
+    stats = _stats
+    if stats is not None:
+        stats.add_count(name, n)
+    for hook in _hooks:
+        hook('count', name, n)
+
+
+class _Timer(object):
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record_time(self.name, time.perf_counter() - self.start)
+
+
+class _NoTimer(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_no_timer = _NoTimer()
+
+
+def timer(name):
+    """ Context manager recording the duration of its block as stage name, if instrumentation is enabled
+
+        >>> with timer('weather.read'):
+        ...     data = read_meteo(path)
+    """
+    if not _enabled:
+        return _no_timer
+    return _Timer(name)
+
+
+def _size(value):
+    size = getattr(value, 'size', None)
+    return 1 if size is None else int(size)
+
+
+def instrumented(name, rows=False):
+    """ Decorator recording the duration of calls as stage name, and if rows is True, counting
+    the size of the largest argument (eg number of time steps) in counter name + '.rows'
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwds):
+            if not _enabled:
+                return function(*args, **kwds)
+            with _Timer(name):
+                result = function(*args, **kwds)
+            if rows:
+                count(name + '.rows', max([_size(v) for v in args] + [_size(v) for v in kwds.values()] + [1]))
+            return result
+        return wrapper
+    return decorator
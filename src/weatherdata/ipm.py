@@ -8,10 +8,100 @@
 # ==============================================================================
 
 
+import numpy
 import pandas
 import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from weatherdata.catalogue import get_catalogue
+from weatherdata import instrument
+from weatherdata.container import WeatherTable
+from weatherdata.convert import weather_frame, locations
+from weatherdata.quality import qc_frame, apply_qc
+from weatherdata.singleflight import SingleFlight
+from weatherdata.transport import IPMTransport, get_transport
+
+def to_timestamp(t, timezone="UTC"):
+    """ Convert a date (str, datetime or pandas.Timestamp) to a pandas.Timestamp in timezone
+    """
+    t = pandas.Timestamp(t)
+    if t.tzinfo is None:
+        return t.tz_localize(timezone)
+    return t.tz_convert(timezone)
+
+
+def format_time(t):
+    """ Format a pandas.Timestamp as expected by IPM services (ISO-8601 with time zone)
+    """
+    s = t.strftime('%Y-%m-%dT%H:%M:%S')
+    offset = t.strftime('%z')
+    if offset in ('', '+0000'):
+        return s + 'Z'
+    return s + offset[:-2] + ':' + offset[-2:]
+
+
+def split_period(start, end, chunk, interval=3600):
+    """ Split the period between start and end (included) in consecutive windows
+
+    Parameters:
+    -----------
+        start, end: pandas.Timestamp
+        chunk: (str or pandas.Timedelta) length of windows
+        interval: (int) time step of data (seconds)
+
+    Returns:
+    --------
+        a list of (start, end) tuples, windows do not overlap
+    """
+    step = pandas.Timedelta(seconds=interval)
+    size = pandas.Timedelta(chunk)
+    if size < step:
+        raise ValueError('chunk should be longer than interval')
+    windows = []
+    while start <= end:
+        stop = min(start + size - step, end)
+        windows.append((start, stop))
+        start = stop + step
+    return windows
+
+
+def response_to_frame(response, start, interval=3600):
+    """ Convert a weather data json response to a dataframe indexed by time
+
+    Time steps start at the timeStart of the response (in the time zone of start), and are
+    spaced by its interval. start and interval are only used if the response has none, so that
+    a response starting late or ending early is not shifted onto the requested period.
+
+    If the response holds several locations, the dataframe is indexed by (latitude, longitude, altitude, time)
+    """
+    if response.get('timeStart'):
+        t = _utc(response['timeStart'])
+        start = t if getattr(start, 'tz', None) is None else t.tz_convert(start.tz)
+    interval = response.get('interval') or interval
+    n = max(len(loc['data']) for loc in response['locationWeatherData'])
+    index = pandas.date_range(start, periods=n, freq=pandas.Timedelta(seconds=interval))
+    return weather_frame(response, index)
+
+
+def _utc(t):
+    t = pandas.Timestamp(t)
+    return t.tz_localize('UTC') if t.tzinfo is None else t.tz_convert('UTC')
+
+
+# identical queries running at the same time, in any WeatherDataSource, share one call
+_flights = SingleFlight()
+
+
+def stitch(frames):
+    """ Concatenate dataframes of consecutive periods, dropping duplicated time steps
+    """
+    if len(frames) == 1:
+        return frames[0]
+    df = pandas.concat(frames)
+    df = df[~df.index.duplicated(keep='first')]
+    return df.sort_index()
 
-from agroservices import IPM
 
 class WeatherDataSource(object):
     ''' 
@@ -22,18 +112,46 @@ class WeatherDataSource(object):
     ..doctest::
         >>> ws = WeatherDataSource(name='Finnish Meteorological Institute measured data')
         >>> ws.station_ids()
+        >>> ws.nearest_stations(latitude=60.2, longitude=24.9, k=3)
         >>> ws.parameters()
         >>> ws.endpoint()
         >>> ws.check_forecast_endpoint()
         >>> ws.data(parameters=[1002,3002], station_id=101104, timeStart='2020-06-12',timeEnd='2020-07-03',timezone="UTC", altitude=70,longitude=14.3711,latitude=67.2828, ViewDataFrame=True)
+        >>> ws.data(parameters=[1002,3002], station_id=101104, timeStart='2018-01-01',timeEnd='2020-07-03', chunk='60D', max_workers=4)
+        >>> ws.stations_data([101104, 101533], parameters=[1002,3002], timeStart='2020-06-12',timeEnd='2020-07-03')
     '''
-    def __init__(self, name):
+    # seconds waited before sending again a failed request, doubled at each attempt
+    retry_backoff = 0.5
+    # identical concurrent queries (same client, endpoint, station, parameters and period) share one call
+    coalesce = True
+
+    def __init__(self, name, catalogue=None, store=None, forecast_cache=None):
         '''
         WeatherDataSource parameters to access at one weather data source of IPM 
+
+        catalogue: WeatherResourceCatalogue used for metadata lookups
+                   (default to the catalogue shared by the process)
+        store: optional WeatherStore. Historical data are then served from the store,
+               and only the periods not yet stored are downloaded
+        forecast_cache: optional ForecastCache. Forecasts are then merged in the cache,
+                        that keeps past hours as history (see update_forecast)
+
+        IPM services are called with the transport shared by the process (see transport.get_transport),
+        unless another client is assigned to ipm.
         '''
-        self.ipm = IPM()
+        self._ipm = None
         self.name = name
-        
+        self.catalogue = get_catalogue() if catalogue is None else catalogue
+        self.store = store
+        self.forecast_cache = forecast_cache
+
+    @property
+    def ipm(self):
+        return get_transport() if self._ipm is None else self._ipm
+
+    @ipm.setter
+    def ipm(self, client):
+        self._ipm = client
 
     def station_ids(self):
         ''' 
@@ -46,27 +164,41 @@ class WeatherDataSource(object):
         --------
             a dataframe containing name, id and coordinate of station available for weather resource'''
 
-        rep = self.ipm.get_weatherdatasource()  
+        return self.catalogue.stations(self.name).copy()
 
-        values = {item['name']:item['spatial']['geoJSON']for item in rep}
+    def nearest_stations(self, latitude, longitude, k=1):
+        """
+        Find the stations closest to one or many locations
 
-        station_ids = dict()
-        coord = dict()
+        Parameters:
+        -----------
+            latitude: (double or array) WGS84 Decimal degrees
+            longitude: (double or array) WGS84 Decimal degrees
+            k: (int) number of stations returned per location
 
-        for names in values:
-            if 'features' in values[names]:
-                station_ids[names]=[values[names]['features'][item]['properties'] for item in range(len(values[names]['features']))]
-                coord[names]=[values[names]['features'][item]['geometry'] for item in range(len(values[names]['features']))]
-            else:
-                station_ids[names]= 'no stations for this ressources'
-                coord[names]= 'no stations for this ressources'
+        Returns:
+        --------
+            a dataframe with position of the location (point), rank, id, name
+            and distance (km) of the k nearest stations of each location
+        """
+        return self.catalogue.station_index(self.name).nearest(latitude, longitude, k)
+
+    def stations_within(self, latitude, longitude, radius):
+        """
+        Find the stations located at less than radius (km) of one or many locations
 
-        df_station_ids = pandas.DataFrame(station_ids[self.name])
-        df_coord = pandas.DataFrame(coord[self.name])
-        df = [df_station_ids,df_coord]
-        data = pandas.concat(df,axis=1)
-        data = data[["name","id","coordinates"]]
-        return data
+        Parameters:
+        -----------
+            latitude: (double or array) WGS84 Decimal degrees
+            longitude: (double or array) WGS84 Decimal degrees
+            radius: (double) distance in km
+
+        Returns:
+        --------
+            a dataframe with position of the location (point), rank, id, name
+            and distance (km) of the stations, sorted by location and distance
+        """
+        return self.catalogue.station_index(self.name).within(latitude, longitude, radius)
 
     def parameters(self):
         """
@@ -79,14 +211,7 @@ class WeatherDataSource(object):
         --------
             a dictionnary containing common and optional parameters
         """
-        rep = self.ipm.get_weatherdatasource()
-
-        values = {item['name']:item['parameters']for item in rep}
-         
-        if self.name in values:
-           parameters = values[self.name]
-
-        return parameters
+        return self.catalogue.parameters(self.name)
 
     def endpoint(self):
         """
@@ -99,12 +224,7 @@ class WeatherDataSource(object):
         --------
             a endpoint (str) used in get_data function
         """
-        endpoints = self.ipm.weatheradapter_service()
-
-        if self.name in endpoints:
-            endpoint = endpoints[self.name]
-        
-        return endpoint    
+        return self.catalogue.endpoint(self.name)
 
     def check_forecast_endpoint(self):
         """
@@ -117,16 +237,180 @@ class WeatherDataSource(object):
         --------
             Boolean value True if endpoint is a forecast endpoint either False
         """
-        forcast_endpoints=self.ipm.weatheradapter_service(forecast=True).values()
-        
-        forcast=None
-        
-        if self.endpoint() in forcast_endpoints:
-            forcast=True
-        else:
-            forcast=False
+        return self.catalogue.is_forecast(self.name)
+
+    def _query_key(self, endpoint, parameters, station_id, start, end, interval):
+        """ identifies a historical query, whatever the order of parameters and the time zone of start and end """
+        return (id(self.ipm), endpoint, str(station_id), tuple(sorted(int(p) for p in parameters)),
+                format_time(_utc(start)), format_time(_utc(end)), int(interval))
+
+    def _get_weatheradapter(self, endpoint, parameters, station_id, start, end, interval, retries, stream=False):
+        """
+        Query historical data between start and end, retrying on failure
+
+        Identical concurrent queries share one call (and the same response)
+        """
+        if not self.coalesce:
+            return self._call_weatheradapter(endpoint, parameters, station_id, start, end, interval, retries, stream)
+        key = ('weatheradapter', stream) + self._query_key(endpoint, parameters, station_id, start, end, interval)
+        response, shared = _flights.do(key, lambda: self._call_weatheradapter(endpoint, parameters, station_id,
+                                                                               start, end, interval, retries, stream))
+        return response
+
+    def _query_frame(self, endpoint, parameters, station_id, start, end, interval, retries, stream=False):
+        """
+        Query historical data between start and end, and convert it to a dataframe
+
+        Identical concurrent queries share one call and one conversion.
+
+        Returns:
+        --------
+            the response and a dataframe with columns in the order of parameters
+        """
+        def query():
+            response = self._get_weatheradapter(endpoint, parameters, station_id, start, end, interval, retries,
+                                                stream)
+            with instrument.timer('ipm.frame'):
+                frame = response_to_frame(response, start, interval)
+            instrument.count('ipm.rows', len(frame))
+            return response, frame
+
+        if not self.coalesce:
+            return query()
+        key = ('frame',) + self._query_key(endpoint, parameters, station_id, start, end, interval)
+        (response, frame), shared = _flights.do(key, query)
+        # the call may have been made for another time zone or order of parameters
+        if isinstance(frame.index, pandas.MultiIndex):
+            if str(frame.index.get_level_values('time').tz) != str(start.tz):
+                frame = frame.tz_convert(start.tz, level='time')
+        elif str(frame.index.tz) != str(start.tz):
+            frame = frame.tz_convert(start.tz)
+        columns = [str(p) for p in parameters]
+        if list(frame.columns) != columns:
+            frame = frame[columns]
+        elif shared:
+            frame = frame.copy()
+        return response, frame
+
+    def _call_weatheradapter(self, endpoint, parameters, station_id, start, end, interval, retries, stream=False):
+        ipm = self.ipm
+        query = dict(endpoint=endpoint, credentials=None, weatherStationId=station_id,
+                     timeStart=format_time(start), timeEnd=format_time(end), interval=interval,
+                     parameters=parameters)
+        instrument.count('ipm.requests')
+        with instrument.timer('ipm.fetch'):
+            if isinstance(ipm, IPMTransport):
+                # the transport retries failed calls itself, and can parse responses while they are received
+                return ipm.get_weatheradapter(retries=retries, stream=stream, **query)
+            for attempt in range(retries + 1):
+                try:
+                    return ipm.get_weatheradapter(**query)
+                except Exception:
+                    if attempt == retries:
+                        raise
+                    instrument.count('ipm.retries')
+                    time.sleep(self.retry_backoff * 2 ** attempt)
+
+    def _get_forecast(self, endpoint, point, retries):
+        """
+        Query the forecast at point, a (latitude, longitude, altitude) tuple, retrying on failure
+        """
+        if self.coalesce:
+            key = ('forecast', id(self.ipm), endpoint, tuple(point))
+            response, shared = _flights.do(key, lambda: self._call_forecast(endpoint, point, retries))
+            return response
+        return self._call_forecast(endpoint, point, retries)
+
+    def _call_forecast(self, endpoint, point, retries):
+        ipm = self.ipm
+        query = dict(endpoint=endpoint, latitude=point[0], longitude=point[1], altitude=point[2])
+        instrument.count('ipm.requests')
+        with instrument.timer('ipm.forecast'):
+            if isinstance(ipm, IPMTransport):
+                return ipm.get_weatheradapter_forecast(retries=retries, **query)
+            for attempt in range(retries + 1):
+                try:
+                    return ipm.get_weatheradapter_forecast(**query)
+                except Exception:
+                    if attempt == retries:
+                        raise
+                    instrument.count('ipm.retries')
+                    time.sleep(self.retry_backoff * 2 ** attempt)
+
+    def _fetch_all(self, endpoint, parameters, queries, interval, max_workers, retries, stream=False):
+        """
+        Send historical queries, given as (station_id, start, end) tuples, on a bounded thread pool
+
+        Returns the responses in the order of queries
+        """
+        def fetch(query):
+            return self._get_weatheradapter(endpoint, parameters, query[0], query[1], query[2], interval, retries,
+                                            stream)
 
-        return forcast 
+        return self._map(fetch, queries, max_workers)
+
+    def _map(self, function, queries, max_workers):
+        """ list of function(query) for queries, computed on a bounded thread pool """
+        if len(queries) <= 1:
+            return [function(query) for query in queries]
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(queries))) as executor:
+            return list(executor.map(function, queries))
+
+    def _station_frames(self, endpoint, parameters, station_ids, start, end, chunk, max_workers, retries,
+                        qc=None, max_gap=None, stream=False):
+        """
+        Get historical data of stations between start and end as a list of dataframes (one per station)
+
+        If the source has a store, only the periods missing from the store are downloaded.
+        Raw values are stored, the QC policy (see quality.apply_qc) is applied to the returned
+        dataframes with the QC of downloaded values (stored values are considered valid).
+        """
+        interval = 3600
+        windows = dict()
+        for station_id in station_ids:
+            if self.store is None:
+                missing = [(start, end)]
+            else:
+                with instrument.timer('store.missing'):
+                    missing = self.store.missing(self.name, station_id, parameters, start, end, interval)
+                instrument.count('store.misses' if missing else 'store.hits')
+            windows[station_id] = []
+            for period in missing:
+                if chunk is None:
+                    windows[station_id].append(period)
+                else:
+                    windows[station_id].extend(split_period(period[0], period[1], chunk, interval))
+
+        queries = [(station_id, w[0], w[1]) for station_id in station_ids for w in windows[station_id]]
+        results = self._map(lambda q: self._query_frame(endpoint, parameters, q[0], q[1], q[2], interval, retries,
+                                                        stream), queries, max_workers)
+        frames = [frame for response, frame in results]
+        if qc is not None:
+            masks = [qc_frame(response, frame) for response, frame in results]
+
+        result = []
+        i = 0
+        for station_id in station_ids:
+            n = len(windows[station_id])
+            fetched = frames[i:i + n]
+            if self.store is None:
+                df = stitch(fetched)
+            else:
+                if fetched:
+                    with instrument.timer('store.write'):
+                        self.store.write(self.name, station_id, stitch(fetched))
+                with instrument.timer('store.read'):
+                    df = self.store.read(self.name, station_id, parameters, start, end).tz_convert(start.tz)
+            if qc is not None:
+                if n > 0:
+                    mask = stitch(masks[i:i + n]).reindex(index=df.index, columns=df.columns, fill_value=False)
+                else:
+                    mask = numpy.zeros(df.shape, dtype=bool)
+                with instrument.timer('ipm.qc'):
+                    df = apply_qc(df, mask, qc, max_gap)
+            i += n
+            result.append(df)
+        return result
 
     def data(
         self,
@@ -138,7 +422,14 @@ class WeatherDataSource(object):
         altitude=70,
         longitude=14.3711,
         latitude=67.2828,
-        ViewDataFrame=True):
+        ViewDataFrame=True,
+        chunk=None,
+        max_workers=4,
+        retries=2,
+        qc=None,
+        max_gap=None,
+        stream=False,
+        container=False):
         """
         Get weather data from weatherdataressource
 
@@ -146,8 +437,26 @@ class WeatherDataSource(object):
         -----------
             parameters: list of parameters of weatherdata 
             station_id: (int) station id of weather station 
-            daterange:  a pandas.date_range(start date, end date, freq='H', timezone(tz))
-                        https://pandas.pydata.org/pandas-docs/stable/reference/api/pandas.date_range.html
+            timeStart: (str) start date, eg '2020-06-12' or '2020-06-12T10:00:00'
+            timeEnd: (str) end date (included)
+            timezone: time zone of timeStart and timeEnd, and of the returned dataframe index
+
+            Only for historical data:
+            ------------------------
+            chunk: (str or pandas.Timedelta) if given, eg '30D', the date range is split
+                   in windows of this length, downloaded concurrently and stitched together
+            max_workers: (int) maximum number of windows downloaded at the same time
+            retries: (int) number of times a failed request (or window) is sent again
+            If the source has a store, only the periods that are not yet stored are downloaded.
+            stream: if True, responses are parsed while they are received, in float arrays
+                    (see convert.load_weather), which keeps memory low for long hourly periods.
+                    Only used with the IPMTransport client.
+
+            qc: QC policy applied to values that failed quality control (see quality.apply_qc):
+                None (values are kept), 'nan', 'drop' or 'interpolate'
+            max_gap: (int) for qc='interpolate', gaps longer than max_gap time steps are left NaN
+            container: if True (and ViewDataFrame), return a container.WeatherTable, holding
+                       the values with their units and the location, instead of a dataframe
             
             Only for forcast:
             ----------------
@@ -157,82 +466,187 @@ class WeatherDataSource(object):
         
         Returns:
         --------
-            return a dataframe (ViewDataFrame=True) or json format (ViewDataFrame=False) 
+            return a dataframe (ViewDataFrame=True) or json format (ViewDataFrame=False),
+            that is a list of json responses (one per window) if chunk is given.
+            The dataframe is indexed by time, or by (latitude, longitude, altitude, time)
+            if the response holds several locations
         """
         forcast=self.check_forecast_endpoint()
+        endpoint = self.endpoint()
 
         if forcast==False:
-            
-            daterange= pandas.date_range(timeStart,timeEnd,freq='H',tz=timezone)
+            start = to_timestamp(timeStart, timezone)
+            end = to_timestamp(timeEnd, timezone)
 
-            timeStart = daterange[0].strftime('%Y-%m-%dT%H:%M:%S')
-            timeEnd = daterange[-1].strftime('%Y-%m-%dT%H:%M:%S')
-            if daterange.tz._tzname == 'UTC':
-                timeStart +='Z'
-                timeEnd += 'Z'
-            else:
-                decstr = daterange[0].strftime('%z')
-                decstr = decstr[:-2] + ':' + decstr[-2:]
-                timeStart += decstr
-                timeEnd += decstr
-        
-            interval = pandas.Timedelta(daterange.freq).seconds
-
-            response=self.ipm.get_weatheradapter(
-                endpoint=self.endpoint(),
-                credentials=None,
-                weatherStationId=station_id, 
-                timeStart=timeStart, 
-                timeEnd=timeEnd, 
-                interval=interval, 
-                parameters=parameters
-                )
-            
             if ViewDataFrame ==True:
-                data = {str(var): vals for var, vals in zip(response['weatherParameters'], zip(*response['locationWeatherData'][0]['data']))}
-                df = pandas.DataFrame(data)
-                df.index = daterange
-                # TODO : get all what is needed for intantiating a WeatherData object (meta, units, ...) and retrun it
+                df = self._station_frames(endpoint, parameters, [station_id], start, end, chunk, max_workers, retries,
+                                          qc, max_gap, stream)[0]
+                if container:
+                    return self._table(df, self._station_location(station_id))
                 return df
+
+            interval = 3600
+            if chunk is None:
+                windows = [(start, end)]
             else:
-                return response
+                windows = split_period(start, end, chunk, interval)
+            responses = self._fetch_all(endpoint, parameters, [(station_id, w[0], w[1]) for w in windows],
+                                        interval, max_workers, retries, stream)
+            if chunk is None:
+                return responses[0]
+            else:
+                return responses
 
         if forcast==True:
-            response = self.ipm.get_weatheradapter_forecast(
-                endpoint=self.endpoint(), 
-                altitude= altitude,
-                latitude=latitude,
-                longitude=longitude
-                )
-
-            daterange= pandas.date_range(
-                response['timeStart'],
-                response['timeEnd'],
-                freq='H',tz='UTC')
-            
-            timeStart = daterange[0].strftime('%Y-%m-%dT%H:%M:%S')
-            timeEnd = daterange[-1].strftime('%Y-%m-%dT%H:%M:%S')
-            if daterange.tz._tzname == 'UTC':
-                timeStart +='Z'
-                timeEnd += 'Z'
-            else:
-                decstr = daterange[0].strftime('%z')
-                decstr = decstr[:-2] + ':' + decstr[-2:]
-                timeStart += decstr
-                timeEnd += decstr
-        
-            interval = pandas.Timedelta(daterange.freq).seconds
+            if self.forecast_cache is not None:
+                response, delta = self._update_forecast(endpoint, latitude, longitude, altitude, retries)
+                if ViewDataFrame ==True:
+                    df = self.forecast_cache.frame(delta.key)
+                    if qc is not None:
+                        forecast = response_to_frame(response, delta.issued, response.get('interval', 3600))
+                        mask = qc_frame(response, forecast).reindex(index=df.index, columns=df.columns, fill_value=False)
+                        df = apply_qc(df, mask, qc, max_gap)
+                    if container:
+                        return self._table(df, dict(latitude=latitude, longitude=longitude, altitude=altitude))
+                    return df
+                return response
+
+            response = self._get_forecast(endpoint, (latitude, longitude, altitude), retries)
 
             if ViewDataFrame ==True:
-                data = {str(var): vals for var, vals in zip(response['weatherParameters'], zip(*response['locationWeatherData'][0]['data']))}
-                df = pandas.DataFrame(data)
-                df.index = daterange
-                # TODO : get all what is needed for intantiating a WeatherData object (meta, units, ...) and retrun it
+                start = to_timestamp(response['timeStart'], 'UTC')
+                with instrument.timer('ipm.frame'):
+                    df = response_to_frame(response, start, response.get('interval', 3600))
+                instrument.count('ipm.rows', len(df))
+                if qc is not None:
+                    df = apply_qc(df, qc_frame(response, df), qc, max_gap)
+                if container:
+                    return self._table(df, locations(response)[0])
                 return df
             else:
                 return response
 
-    
+    def _station_location(self, station_id):
+        """ latitude, longitude (and altitude) of a station, as given by the catalogue """
+        stations = self.catalogue.stations(self.name)
+        found = stations[stations['id'].astype(str) == str(station_id)]
+        if len(found) == 0:
+            return {}
+        coordinates = list(found['coordinates'].iloc[0])
+        location = dict(longitude=coordinates[0], latitude=coordinates[1])
+        if len(coordinates) > 2:
+            location['altitude'] = coordinates[2]
+        return location
+
+    @staticmethod
+    def _table(df, location):
+        if isinstance(df.index, pandas.MultiIndex):
+            raise ValueError('a WeatherTable holds one location, use container=False')
+        return WeatherTable.from_frame(df, location)
+
+    def stations_data(
+        self,
+        station_ids,
+        parameters=[1002,3002],
+        timeStart='2020-06-12',
+        timeEnd='2020-07-03',
+        timezone="UTC",
+        chunk=None,
+        max_workers=8,
+        retries=2,
+        qc=None,
+        max_gap=None,
+        stream=False):
+        """
+        Get weather data of several stations of weatherdataressource at once
+
+        Requests are sent concurrently, catalogue and endpoint lookups are done once.
+
+        Parameters:
+        -----------
+            station_ids: list of station ids
+            parameters: list of parameters of weatherdata
+            timeStart: (str) start date, eg '2020-06-12' or '2020-06-12T10:00:00'
+            timeEnd: (str) end date (included)
+            timezone: time zone of timeStart and timeEnd, and of the returned dataframe index
+            chunk: (str or pandas.Timedelta) if given, the date range of each station is split
+                   in windows of this length (see data)
+            max_workers: (int) maximum number of requests sent at the same time
+            retries: (int) number of times a failed request is sent again
+            qc, max_gap: QC policy (see data)
+            stream: parse responses while they are received (see data)
+
+        Returns:
+        --------
+            a dataframe indexed by (station, time)
+        """
+        if self.check_forecast_endpoint():
+            raise ValueError(self.name + ' is a forecast resource, use data with a location')
+        start = to_timestamp(timeStart, timezone)
+        end = to_timestamp(timeEnd, timezone)
+        frames = self._station_frames(self.endpoint(), parameters, station_ids, start, end, chunk, max_workers, retries,
+                                      qc, max_gap, stream)
+        for station_id, frame in zip(station_ids, frames):
+            if isinstance(frame.index, pandas.MultiIndex):
+                raise ValueError('the data of station %s hold several locations, use data for this station'
+                                 % station_id)
+        df = pandas.concat(frames, keys=list(station_ids), names=['station', 'time'])
+        return df
+
+    def _update_forecast(self, endpoint, latitude, longitude, altitude, retries):
+        key = self.forecast_cache.key(endpoint, latitude, longitude, altitude)
+        response = self._get_forecast(endpoint, (latitude, longitude, altitude), retries)
+        return response, self.forecast_cache.update(key, response)
+
+    def update_forecast(self, latitude, longitude, altitude=None, retries=2):
+        """
+        Get the forecast at a location and merge it in forecast_cache
+
+        Only the time steps that are new or whose values changed are written in the cache,
+        and the hours before the start of the forecast are kept as history.
+
+        Parameters:
+        -----------
+            latitude, longitude: (double) WGS84 Decimal degrees
+            altitude: (double) only for Met Norway Locationforecast
+            retries: (int) number of times a failed request is sent again
+
+        Returns:
+        --------
+            a ForecastDelta with the changed, added and removed time steps, so that models
+            can recompute only delta.window(). The merged series is forecast_cache.frame(delta.key)
+        """
+        if not self.check_forecast_endpoint():
+            raise ValueError(self.name + ' is not a forecast resource, use data')
+        if self.forecast_cache is None:
+            raise ValueError('update_forecast needs a forecast_cache')
+        return self._update_forecast(self.endpoint(), latitude, longitude, altitude, retries)[1]
+
+    def forecasts(self, coordinates, concurrency=16, retries=2, return_exceptions=False):
+        """
+        Get forecasts at many locations at once (eg a grid of field centroids)
+
+        Requests are sent concurrently, see forecast.iter_forecasts for an asyncio interface
+        yielding responses as they arrive.
+
+        Parameters:
+        -----------
+            coordinates: array of (latitude, longitude) or (latitude, longitude, altitude) rows,
+                         or a dataframe with latitude, longitude (and altitude) columns
+            concurrency: (int) maximum number of requests sent at the same time
+            retries: (int) number of times a failed request is sent again
+            return_exceptions: if True, failed locations are skipped instead of raising
+
+        Returns:
+        --------
+            a dataframe indexed by (latitude, longitude, altitude, time)
+        """
+        from weatherdata.forecast import forecasts
+        if not self.check_forecast_endpoint():
+            raise ValueError(self.name + ' is not a forecast resource, use stations_data')
+        return forecasts(self, coordinates, concurrency, retries, return_exceptions)
+
+
 # TODO : this class should inheritate from a more generic Wheather DataHub
 class WeatherDataHub(object):
     """
@@ -246,11 +660,12 @@ class WeatherDataHub(object):
 
     """
 
-    def __init__(self):
+    def __init__(self, catalogue=None):
         """
-            Give an access to IPM interface from agroservice
+            Give an access to IPM interface (with the transport shared by the process)
         """
-        self.ipm = IPM()
+        self.ipm = get_transport()
+        self.catalogue = get_catalogue() if catalogue is None else catalogue
 
     def list_resources(self):
         """
@@ -263,8 +678,7 @@ class WeatherDataHub(object):
         ---------
             dictionnary with name and description of available weatherdatasource on IPM service
         """
-        rep = self.ipm.get_weatherdatasource()
-        return {item['name']:item['description'] for item in rep}
+        return self.catalogue.descriptions()
         
     def get_ressource(self, name):
         """
@@ -276,9 +690,7 @@ class WeatherDataHub(object):
         --------
             run weatherdatasource with the name of resource
         """
-        rep = self.ipm.get_weatherdatasource()
-        keys = [item['name'] for item in rep]
-        if name in keys:
-            return WeatherDataSource(name)
+        if name in self.catalogue.names():
+            return WeatherDataSource(name, catalogue=self.catalogue)
         else:
             raise NotImplementedError()
@@ -1,5 +1,9 @@
 """ Short meteorological models """
 
+import numpy as np
+
+from weatherdata.instrument import instrumented
+
 def temp_par(self, Tair, PAR):
     """ Return an estimation of air temperature near the leaf
     
@@ -18,29 +22,100 @@ def temp_par(self, Tair, PAR):
     Tair_leaf = Tair + (PAR / 300)
     return Tair_leaf
     
+@instrumented('mini_models.leaf_wetness_rapilly', rows=True)
 def leaf_wetness_rapilly(rain_intensity=0., relative_humidity=0., PPFD=0.):
     """ Compute leaf wetness as in Rapilly et Jolivet, 1976 as a 
         function of rain or relative humidity and PAR.
     
     Parameters
     ----------
-    rain_intensity: float
+    rain_intensity: float or array
         Rain (in mm.h-1)
-    relative_humidity: float
+    relative_humidity: float or array
         Relative humidity of the air around the leaf (in %)
-    PPFD: float
+    PPFD: float or array
         Photosynthetically active radiation around the leaf (in nm)
     
     Returns
     -------
-    wet: True or False
+    wet: True or False, or an array of bool if any input is an array (or a pandas.Series)
         True if the leaf is wet
     """
-    if rain_intensity>0. or (relative_humidity >= 85. and PPFD < 644.):
-        return True
-    else:
-        return False
+    wet = np.logical_or(np.greater(rain_intensity, 0.),
+                        np.logical_and(np.greater_equal(relative_humidity, 85.), np.less(PPFD, 644.)))
+    if np.ndim(wet) == 0:
+        return bool(wet)
+    return np.asarray(wet)
+
+@instrumented('mini_models.wetness_duration', rows=True)
+def wetness_duration(wet, time_step=1.):
+    """ Duration of the current wet period at each time step.
+    
+    Parameters
+    ----------
+    wet: array of bool
+        Leaf wetness at each time step (eg output of leaf_wetness_rapilly)
+    time_step: float
+        Duration of a time step (in hours)
+    
+    Returns
+    -------
+    duration: array of float
+        Duration of consecutive wetness up to and including each time step (in hours),
+        0 when the leaf is dry
+    """
+    wet = np.asarray(wet, dtype=bool)
+    steps = np.arange(1, len(wet) + 1)
+    last_dry = np.maximum.accumulate(np.where(wet, 0, steps))
+    return np.where(wet, steps - last_dry, 0) * time_step
+
+# Constants of the energy balance of Pedro & Gillespie (1981)
+# Leaf emissivity
+_E = 0.95
+# Stefan- Boltzmann constant (in W.m-2.degrees Kelvin-4)
+_S = 5.6704*10**-8
+# Atmospheric pressure (in mbar)
+_P = 1013.
+# Latent heat of vaporization of water (in J.kg-1)
+_L = 2260*10**3
+# Specific heat of the air (in J.kg-1.degrees celsius-1)
+_CP = 1006.
+
+def _calculate_hc(wind_speed=0.):
+    """ Convective heat transfer coefficient (in W.m-2.degrees celsius-1).
+    
+    ..TODO:: take into account leaf geometry and wind direction to calculate D
+    """
+    # Width of the leaf in wind direction (in cm):
+    D = 10.
+    return 40*(wind_speed/D)**0.5
+
+def _calculate_hw(hc=0.):
+    """ Water vapour transfer coefficient (in W.m-2).
+    """
+    return hc*1.07*_L/_CP
+
+def _calculate_psat(T):
+    """ Saturation water vapour pressure at temperature T (in mbar).
+    """
+    return 611.*10**(7.5*T/(237.2+T))
+
+def _calculate_slope(T):
+    """ Slope of the saturation vapour pressure curve at T (in mbar.degrees celsius-1).
+    """
+    return (2.50389*10**6) * (10**(7.5*T/(237.5+T))) / ((237.3+T)**2)
+
+def _calculate_balance(temperature_leaf=0., temperature_air=0., net_radiation=0., 
+                       hc=0., hw=0., esa=0., e=0.):
+    """ Energy balance on the leaf surface (0 at leaf temperature).
+    """
+    Tm = (temperature_leaf + temperature_air)/2
+    s = _calculate_slope(Tm)
+    return (temperature_leaf - temperature_air - 
+           ((net_radiation - _E*_S*(temperature_air+273)**4)-(0.622/_P)*2.*hw*(esa-e)) /
+           (4*_E*_S*(Tm+273)**3 + 2*hc + (0.622/_P)*2*hw*s))
 
+@instrumented('mini_models.leaf_wetness_pedro_gillepsie', rows=True)
 def leaf_wetness_pedro_gillepsie(leaf_geometry=None, rain_intensity=0., temperature_air=0., 
                                  wind_speed=0., wind_direction=(0.,0.,0.), 
                                  relative_humidity=0., net_radiation=0.):
@@ -54,6 +129,8 @@ def leaf_wetness_pedro_gillepsie(leaf_geometry=None, rain_intensity=0., temperat
     
     link: http://www.sciencedirect.com/science/article/pii/0002157181900819
 
+    See leaf_wetness_pedro_gillepsie_batch for whole series of time steps or leaves.
+
     Parameters
     ----------
     leaf_geometry: OpenAlea plantgl shape
@@ -76,119 +153,105 @@ def leaf_wetness_pedro_gillepsie(leaf_geometry=None, rain_intensity=0., temperat
     True or False:
         True if leaf is wet
     """
+    from scipy.optimize import fsolve
+
+    # TODO : take into account leaf geometry and wind direction to calculate hc
+    hc = _calculate_hc(wind_speed)
+    hw = _calculate_hw(hc)
+    esa = _calculate_psat(temperature_air)
+    e = esa*relative_humidity/100.
+    temperature_leaf = fsolve(_calculate_balance, temperature_air,
+                              args=(temperature_air, net_radiation, hc, hw, esa, e))[0]
     
-    def calculate_hc(leaf_geometry=None, wind_speed=0., wind_direction=(0.,0.,0.)):
-        """ Calculate the convective heat transfer coefficient.
-        
-        Returns
-        -------
-        hc: float
-            Convective heat transfer coefficient (in W.m-2.degrees celsius-1)
-            
-        ..TODO:: take into account leaf geometry and wind direction to calculate D
-        """
-        # Width of the leaf in wind direction (in cm):
-        D = 10.
-        # TODO : take into account leaf geometry and wind direction to calculate D
-        return 40*(wind_speed/D)**0.5
-        
-    def calculate_hw(hc=0.):
-        """ Calculate the water vapour transfer coefficient.
-        
-        Parameters
-        ----------
-        hc: float
-            Convective heat transfer coefficient (in W.m-2.degrees celsius-1)
-        
-        Returns
-        -------
-        hw: float
-            Water vapour transfer coefficient (in W.m-2)
-        """
-        # Latent heat of vaporization of water (in J.kg-1)
-        L = 2260*10**3
-        # Specific heat of the air (in J.kg-1.degrees celsius-1)
-        Cp = 1006
-        return hc*1.07*L/Cp
-    
-    def calculate_psat(T):
-        """ Calculate the saturation water vapour pressure at temperature T.
-        
-        Returns
-        -------
-        es: float
-            Saturation water vapour pressure (in mbar)
-        """
-        return 611.*10**(7.5*T/(237.2+T));
-    
-    def calculate_p(es=0., relative_humidity=0.):
-        """ Calculate the ambient water vapour pressure.
-        
-        Returns
-        -------
-        e: float
-            Ambient vapour pressure (in mbar)
-        """
-        return es*relative_humidity/100.
-    
-    def calculate_slope(T):
-        """ Calculate slope of the saturation vapour pressure curve at T.
-        
-        Returns
-        -------
-        s: float
-            Slope of the saturation vapour pressure curve at T (in mbar.degrees celsius-1)
-        """
-        return (2.50389*10**6) * (10**(7.5*T/(237.5+T))) / ((237.3+T)**2)  
-    
-    def calculate_balance(temperature_leaf=0., temperature_air=0., net_radiation=0., 
-                          hc=0., hw=0., esa=0., e=0.):
-        """ Calculate the energy balance on the leaf surface.
-        
-        Returns
-        -------
-        balance: float
-            Energy balance on the leaf surface
-        """
-        # Leaf emissivity
-        E = 0.95
-        # Stefan- Boltzmann constant (in W.m-2.degrees Kelvin-4)
-        S = 5.6704*10**-8
-        # Atmospheric pressure (in mbar)
-        P = 1013
-        Tm = (temperature_leaf + temperature_air)/2
-        s = calculate_slope(Tm)
-        return (temperature_leaf - temperature_air - 
-               ((net_radiation - E*S*(temperature_air+273)**4)-(0.622/P)*2.*hw*(esa-e)) /
-               (4*E*S*(Tm+273)**3 + 2*hc + (0.622/P)*2*hw*s))
-    
-    def find_temp_leaf(temperature_air=0., net_radiation=0., hc=0., hw=0., esa=0., e=0.):
-        """ Run an optimization process on the function 'calculate_balance' to find 'temperature_leaf'
-        
-        Returns
-        -------
-        temperature_leaf: float
-            Temperature of the surface of the leaf (in degrees celsius)
-        """
-        from scipy.optimize import fsolve
-        return fsolve(calculate_balance, temperature_air, args=(net_radiation, hc, hw, esa, e))
-    
-    hc = calculate_hc(leaf_geometry, wind_speed, wind_direction);
-    hw = calculate_hw(hc);
-    esa = calculate_psat(temperature_air);
-    e = calculate_p(esa, relative_humidity);
-    temperature_leaf = find_temp_leaf(temperature_air, net_radiation, hc, hw, esa, e);
-    
-    print(temperature_leaf)
-    esl = calculate_psat(temperature_leaf);
-    P = 1013
-    LE = -(0.622/P)*2*hw*(esl-e);
+    esl = _calculate_psat(temperature_leaf)
+    LE = -(0.622/_P)*2*hw*(esl-e)
 
     if LE > 0 or rain_intensity>0:
         return True
     else:
         return False
+
+@instrumented('mini_models.leaf_temperature_pedro_gillepsie', rows=True)
+def leaf_temperature_pedro_gillepsie(temperature_air=0., wind_speed=0., relative_humidity=0.,
+                                     net_radiation=0., max_iter=20, tol=1e-6):
+    """ Solve the energy balance of Pedro & Gillespie (1981) for leaf temperature,
+    for whole arrays of time steps and/or leaves at once.
+
+    Uses Newton iterations with the analytic derivative of the balance, starting
+    at air temperature. Converged values are not updated anymore.
+
+    Parameters
+    ----------
+    temperature_air: float or array
+        Temperature of the air around the leaf (in degrees celsius)
+    wind_speed: float or array
+        Wind speed at leaf height (in m.s-1)
+    relative_humidity: float or array
+        Relative humidity around the leaf (in %)
+    net_radiation: float or array
+        Net radiation perceived by the leaf (in W.m-2)
+    max_iter: int
+        Maximum number of Newton iterations
+    tol: float
+        Convergence threshold on leaf temperature (in degrees celsius)
+
+    Returns
+    -------
+    temperature_leaf: array
+        Temperature of the surface of the leaf (in degrees celsius), broadcast over inputs
+    """
+    Ta, ws, rh, Rn = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in
+                                           (temperature_air, wind_speed, relative_humidity, net_radiation)])
+    hc = _calculate_hc(ws)
+    hw = _calculate_hw(hc)
+    esa = _calculate_psat(Ta)
+    e = esa*rh/100.
+    k = (0.622/_P)*2*hw
+    # numerator of the balance does not depend on leaf temperature
+    A = (Rn - _E*_S*(Ta+273)**4) - k*(esa-e)
+
+    Tl = Ta.copy()
+    active = np.ones(Tl.shape, dtype=bool)
+    for _ in range(max_iter):
+        Tm = (Tl + Ta)/2
+        s = _calculate_slope(Tm)
+        B = 4*_E*_S*(Tm+273)**3 + 2*hc + k*s
+        # d(slope)/dT and d(B)/d(Tl) = d(B)/d(Tm) / 2
+        ds = s*(np.log(10)*7.5*237.5/(237.5+Tm)**2 - 2/(237.3+Tm))
+        dB = (12*_E*_S*(Tm+273)**2 + k*ds)/2
+        f = Tl - Ta - A/B
+        df = 1 + A*dB/B**2
+        delta = np.where(active, f/df, 0.)
+        Tl = Tl - delta
+        active &= np.abs(delta) > tol
+        if not active.any():
+            break
+    return Tl
+
+@instrumented('mini_models.leaf_wetness_pedro_gillepsie_batch', rows=True)
+def leaf_wetness_pedro_gillepsie_batch(rain_intensity=0., temperature_air=0., wind_speed=0.,
+                                       relative_humidity=0., net_radiation=0.):
+    """ Vectorized version of leaf_wetness_pedro_gillepsie, for whole arrays of
+    time steps and/or leaves (inputs are broadcast together).
+
+    Returns
+    -------
+    temperature_leaf: array
+        Temperature of the surface of the leaf (in degrees celsius)
+    wet: array of bool
+        True if leaf is wet (rain or dew deposition)
+    """
+    rain, Ta, ws, rh, Rn = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in
+                                                 (rain_intensity, temperature_air, wind_speed,
+                                                  relative_humidity, net_radiation)])
+    temperature_leaf = leaf_temperature_pedro_gillepsie(Ta, ws, rh, Rn)
+    hw = _calculate_hw(_calculate_hc(ws))
+    e = _calculate_psat(Ta)*rh/100.
+    LE = -(0.622/_P)*2*hw*(_calculate_psat(temperature_leaf)-e)
+    wet = (LE > 0) | (rain > 0)
+    return temperature_leaf, wet
         
+@instrumented('mini_models.wind_speed_on_leaf', rows=True)
 def wind_speed_on_leaf(wind_speed=0., leaf_height=0., canopy_height=0., lai=0., lc=0.2, cd=0.3,
                        is_in_rows = True, row_direction=(1,0,0), wind_direction=(1,0,0), param_reduc=0.5):
                        
@@ -205,11 +268,16 @@ def wind_speed_on_leaf(wind_speed=0., leaf_height=0., canopy_height=0., lai=0.,
    
     link : http://onlinelibrary.wiley.com/doi/10.1046/j.1365-3040.2003.01035.x/abstract
 
+    All arguments but is_in_rows may be arrays, and are broadcast together (directions
+    along their last axis). For instance, for n leaves and m time steps,
+    wind_speed_on_leaf(wind_speed[:, None], leaf_height[None, :], canopy_height, lai,
+    wind_direction=wind_direction[:, None, :]) returns an array of shape (m, n).
+
     Parameters
     ----------
-    wind_speed: float
+    wind_speed: float or array
         Wind speed (in m.s-1)
-    leaf_height: float
+    leaf_height: float or array
         Leaf height in the canopy (in m)
     canopy_heigth: float
         Height of the highest leaf (in m)
@@ -221,27 +289,37 @@ def wind_speed_on_leaf(wind_speed=0., leaf_height=0., canopy_height=0., lai=0.,
         Leaf drag coefficient (dimensionless)
     is_in_rows: True or False
         Indicate if there are rows between plants
-    row_direction: tuple(x,y,z)
+    row_direction: tuple(x,y,z) or array of shape (..., 3)
         Direction of vine rows
-    wind_direction: tuple(x,y,z)
+    wind_direction: tuple(x,y,z) or array of shape (..., 3)
         Wind direction   
     param_reduc: float
         Maximal reduction of eta for winds parallels to row direction
         
     Returns
     -------
-    wind_speed_on_leaf: float
+    wind_speed_on_leaf: float or array
         Wind speed on the given leaf
     """
-    from math import exp
-    from openalea.plantgl import all as pgl
-    
     eta = canopy_height * ( (cd*lai/canopy_height)/(2*lc**2) )**(1./3)
+    relative_height = np.divide(leaf_height, canopy_height) - 1
     
     if is_in_rows:
-        angle = degrees(pgl.angle(row_direction, wind_direction))
+        angle = angle_between(row_direction, wind_direction)
         reduction = param_reduc * (1-angle/90)
-        return wind_speed * exp(max(0., eta-reduction)*((leaf_height/canopy_height)-1))
+        speed = np.multiply(wind_speed, np.exp(np.maximum(0., eta-reduction)*relative_height))
     else:
-        return wind_speed * exp(eta*((leaf_height/canopy_height)-1))
-    
\ No newline at end of file
+        speed = np.multiply(wind_speed, np.exp(eta*relative_height))
+    if np.ndim(speed) == 0:
+        return float(speed)
+    return speed
+
+def angle_between(u, v):
+    """ Angle between vectors u and v (in degrees, between 0 and 180).
+
+    u and v are arrays of shape (..., 3), broadcast together.
+    """
+    u = np.asarray(u, dtype=float)
+    v = np.asarray(v, dtype=float)
+    cos = np.sum(u*v, axis=-1) / (np.linalg.norm(u, axis=-1) * np.linalg.norm(v, axis=-1))
+    return np.degrees(np.arccos(np.clip(cos, -1., 1.)))
@@ -0,0 +1,200 @@
+# -*- python -*-
+# -*- coding:utf-8 -*-
+#
+#       Copyright 2020 INRAE-CIRAD
+#       Distributed under the Cecill-C License.
+#       See https://cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+# ==============================================================================
+"""Quality control (QC) of weather data: masks, cleaning policies and summaries"""
+
+import numpy
+import pandas
+
+POLICIES = ('nan', 'drop', 'interpolate')
+
+
+def qc_codes(response, location=0):
+    """ QC codes of a weather data response, aligned with its values
+
+    QC codes are bitmaps of failed tests (0: all tests passed, negative: not tested).
+    They are read from the 'qc' of the location, either one code per value (rows of codes)
+    or one code per parameter, else from the 'QC' of the response (one code per parameter).
+
+    Parameters:
+    -----------
+        response: weather data (json) as returned by IPM weather adapters
+        location: (int) index of the location in locationWeatherData
+
+    Returns:
+    --------
+        an int array of shape (time steps, parameters)
+    """
+    loc = response['locationWeatherData'][location]
+    shape = (len(loc['data']), len(response['weatherParameters']))
+    qc = loc.get('qc')
+    if qc is None:
+        qc = response.get('QC', response.get('qc'))
+    if qc is None:
+        return numpy.zeros(shape, dtype=int)
+    if len(qc) > 0 and isinstance(qc[0], (list, tuple, numpy.ndarray)):
+        codes = numpy.zeros(shape, dtype=int)
+        for i, row in enumerate(qc[:shape[0]]):
+            row = [0 if v is None else v for v in row[:shape[1]]]
+            codes[i, :len(row)] = row
+        return codes
+    qc = numpy.array([0 if v is None else v for v in qc], dtype=int)
+    return numpy.broadcast_to(qc[:shape[1]], shape)
+
+
+def qc_mask(response, location=None, tests=None):
+    """ Mask of the values of a weather data response that failed QC
+
+    Parameters:
+    -----------
+        response: weather data (json) as returned by IPM weather adapters
+        location: (int) index of the location in locationWeatherData.
+                  If None, masks of all locations are stacked as in convert.weather_frame
+        tests: (int) bitmap of the tests to consider (default all)
+
+    Returns:
+    --------
+        a bool array of shape (time steps, parameters), True for values that failed
+    """
+    if location is None:
+        nloc = len(response['locationWeatherData'])
+        codes = numpy.concatenate([qc_codes(response, i) for i in range(nloc)])
+    else:
+        codes = qc_codes(response, location)
+    failed = codes > 0
+    if tests is not None:
+        failed &= (codes & tests) != 0
+    return failed
+
+
+def qc_frame(response, frame, tests=None):
+    """ Mask of the values of a weather data response that failed QC, as a bool dataframe
+    with the index of frame, the dataframe built from the same response by convert.weather_frame,
+    and parameter ids (str) as columns
+    """
+    location = 0 if len(response['locationWeatherData']) == 1 else None
+    return pandas.DataFrame(qc_mask(response, location, tests), index=frame.index,
+                            columns=[str(p) for p in response['weatherParameters']])
+
+
+def _series_codes(index):
+    """ codes identifying the series (eg stations) of a (..., time) MultiIndex, else None """
+    if not isinstance(index, pandas.MultiIndex):
+        return None
+    return pandas.MultiIndex.from_arrays([index.get_level_values(i)
+                                          for i in range(index.nlevels - 1)]).factorize()[0]
+
+
+def _gaps(missing):
+    """ positions of the last valid value before and first valid value after each element, per column """
+    n = len(missing)
+    steps = numpy.arange(n)[:, None]
+    before = numpy.maximum.accumulate(numpy.where(missing, -1, steps), axis=0)
+    after = numpy.minimum.accumulate(numpy.where(missing, n, steps)[::-1], axis=0)[::-1]
+    return before, after
+
+
+def interpolate_gaps(values, max_gap=None, series=None):
+    """ Linear interpolation of the gaps (runs of NaN) of a 2-D array, along its first axis
+
+    Parameters:
+    -----------
+        values: 2-D float array (time steps, columns)
+        max_gap: (int) only gaps of at most max_gap time steps are filled (default all)
+        series: optional codes of series (eg stations) stacked in values, gaps are not
+                interpolated across series
+
+    Returns:
+    --------
+        a new array, leading, trailing and longer gaps are left NaN
+    """
+    values = numpy.array(values, dtype=float)
+    if values.ndim == 1:
+        return interpolate_gaps(values[:, None], max_gap, series)[:, 0]
+    missing = numpy.isnan(values)
+    if not missing.any():
+        return values
+    n = len(values)
+    before, after = _gaps(missing)
+    fill = missing & (before >= 0) & (after < n)
+    if max_gap is not None:
+        fill &= (after - before - 1) <= max_gap
+    if series is not None:
+        series = numpy.asarray(series)
+        fill &= series[numpy.clip(before, 0, n - 1)] == series[numpy.clip(after, 0, n - 1)]
+    rows, cols = numpy.nonzero(fill)
+    b, a = before[rows, cols], after[rows, cols]
+    weight = (rows - b) / (a - b)
+    values[rows, cols] = values[b, cols] + weight * (values[a, cols] - values[b, cols])
+    return values
+
+
+def apply_qc(df, mask, policy='nan', max_gap=None):
+    """
+    Clean the values that failed QC, for all columns at once
+
+    Parameters:
+    -----------
+        df: a dataframe of weather data, indexed by time (or by (..., time) for several series)
+        mask: bool dataframe (or array) aligned with df, True for values that failed QC
+        policy: 'nan' (failed values are set to NaN), 'drop' (time steps with a failed value
+                are dropped) or 'interpolate' (failed and missing values are interpolated
+                in time, see max_gap)
+        max_gap: (int) for 'interpolate', gaps longer than max_gap time steps are left NaN
+
+    Returns:
+    --------
+        a new dataframe
+    """
+    if policy not in POLICIES:
+        raise ValueError('unknown QC policy: ' + str(policy) + ', should be one of ' + str(POLICIES))
+    mask = numpy.asarray(mask, dtype=bool)
+    if mask.shape != df.shape:
+        raise ValueError('QC mask should have the shape of the data')
+    if policy == 'drop':
+        return df[~mask.any(axis=1)]
+    values = df.values.astype(float)
+    values[mask] = numpy.nan
+    if policy == 'interpolate':
+        values = interpolate_gaps(values, max_gap, _series_codes(df.index))
+    return pandas.DataFrame(values, index=df.index, columns=df.columns, copy=False)
+
+
+def quality_summary(df, mask=None):
+    """
+    Quality summary of each column of weather data
+
+    Parameters:
+    -----------
+        df: a dataframe of weather data indexed by time
+        mask: optional bool dataframe (or array) aligned with df, True for values that failed QC
+
+    Returns:
+    --------
+        a dataframe indexed by column, with the number of time steps, of valid, missing (NaN)
+        and failed values, the fraction of valid values and the longest run of
+        missing or failed values (in time steps)
+    """
+    values = df.values.astype(float)
+    missing = numpy.isnan(values)
+    failed = numpy.zeros_like(missing) if mask is None else numpy.asarray(mask, dtype=bool) & ~missing
+    bad = missing | failed
+    n = len(values)
+    if n > 0:
+        before, after = _gaps(bad)
+        longest = numpy.where(bad, after - before - 1, 0).max(axis=0)
+    else:
+        longest = numpy.zeros(values.shape[1], dtype=int)
+    valid = n - bad.sum(axis=0)
+    return pandas.DataFrame({'count': n,
+                             'valid': valid,
+                             'missing': missing.sum(axis=0),
+                             'failed': failed.sum(axis=0),
+                             'valid_fraction': valid / n if n > 0 else numpy.nan,
+                             'longest_gap': longest},
+                            index=df.columns)
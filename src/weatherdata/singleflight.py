@@ -0,0 +1,79 @@
+# -*- python -*-
+# -*- coding:utf-8 -*-
+#
+#       Copyright 2020 INRAE-CIRAD
+#       Distributed under the Cecill-C License.
+#       See https://cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+# ==============================================================================
+"""Coalescing of identical concurrent calls (single flight)"""
+
+import threading
+
+from weatherdata import instrument
+
+
+class _Call(object):
+    __slots__ = ('done', 'result', 'error', 'followers')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight(object):
+    '''
+    Run at most one call per key at a time: threads asking for a key that is
+    already being computed wait for that call and share its result (or error).
+    Results are not kept once the call is over.
+
+    ..doctest::
+        >>> flight = SingleFlight()
+        >>> response, shared = flight.do(('fmi', 101104, (1002, 3002)), lambda: fetch(...))
+    '''
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function):
+        """
+        Call function(), or wait for the running call with the same key
+
+        Returns:
+        --------
+            (result, shared) where shared is True if the result was (or is being) returned
+            to other threads, that should then not modify it in place
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                call.followers += 1
+        if not leader:
+            instrument.count('singleflight.shared')
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = function()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                shared = call.followers > 0
+            call.done.set()
+        return call.result, shared
+
+    def in_flight(self):
+        """ number of running calls """
+        with self._lock:
+            return len(self._calls)
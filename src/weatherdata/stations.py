@@ -0,0 +1,148 @@
+# -*- python -*-
+# -*- coding:utf-8 -*-
+#
+#       Copyright 2020 INRAE-CIRAD
+#       Distributed under the Cecill-C License.
+#       See https://cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+# ==============================================================================
+"""Spatial index over the weather stations of a resource"""
+
+import numpy
+import pandas
+
+# Mean earth radius (km)
+EARTH_RADIUS = 6371.0
+
+
+def to_xyz(latitude, longitude):
+    """ Convert WGS84 decimal degrees to points on the unit sphere
+    """
+    lat = numpy.radians(numpy.asarray(latitude, dtype=float))
+    lon = numpy.radians(numpy.asarray(longitude, dtype=float))
+    cos_lat = numpy.cos(lat)
+    return numpy.stack([cos_lat * numpy.cos(lon), cos_lat * numpy.sin(lon), numpy.sin(lat)], axis=-1)
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """ Great circle distance (km) between points given in WGS84 decimal degrees
+    """
+    lat1, lon1, lat2, lon2 = [numpy.radians(numpy.asarray(x, dtype=float)) for x in (lat1, lon1, lat2, lon2)]
+    a = numpy.sin((lat2 - lat1) / 2) ** 2 + numpy.cos(lat1) * numpy.cos(lat2) * numpy.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * numpy.arcsin(numpy.sqrt(numpy.clip(a, 0, 1)))
+
+
+def _chord_to_km(chord):
+    return 2 * EARTH_RADIUS * numpy.arcsin(numpy.clip(chord / 2., 0, 1))
+
+
+def _km_to_chord(distance):
+    return 2 * numpy.sin(numpy.minimum(distance / EARTH_RADIUS, numpy.pi) / 2.)
+
+
+class StationIndex(object):
+    '''
+    KD-tree of weather stations, queried with great circle (haversine) distances
+
+    Stations are stored as points on the unit sphere, so that the euclidean
+    (chord) distance used by the tree is a monotonic function of the great
+    circle distance: nearest neighbours and radius queries are exact.
+
+    ..doctest::
+        >>> index = StationIndex(ws.station_ids())
+        >>> index.nearest(latitude=[60.2, 61.5], longitude=[24.9, 23.7], k=2)
+        >>> index.within(latitude=60.2, longitude=24.9, radius=50)
+    '''
+
+    def __init__(self, stations):
+        '''
+        Parameters:
+        -----------
+            stations: a dataframe with name, id and coordinates ([longitude, latitude]) columns,
+                      as returned by WeatherDataSource.station_ids()
+        '''
+        from scipy.spatial import cKDTree
+
+        coords = numpy.array([[float(c) for c in xy[:2]] for xy in stations['coordinates']], dtype=float).reshape(-1, 2)
+        self.ids = numpy.asarray(stations['id'])
+        self.names = numpy.asarray(stations['name'])
+        self.longitude = coords[:, 0]
+        self.latitude = coords[:, 1]
+        self._tree = cKDTree(to_xyz(self.latitude, self.longitude)) if len(coords) else None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def query(self, latitude, longitude, k=1):
+        """
+        Find the k nearest stations of each point
+
+        Parameters:
+        -----------
+            latitude, longitude: (float or array) WGS84 decimal degrees of the points
+            k: (int) number of stations per point
+
+        Returns:
+        --------
+            distance (km) and position of the stations in the index, as two arrays of shape (n points, k)
+        """
+        if self._tree is None:
+            raise ValueError('no stations for this ressource')
+        k = min(k, len(self))
+        xyz = to_xyz(latitude, longitude).reshape(-1, 3)
+        chord, pos = self._tree.query(xyz, k=k)
+        return _chord_to_km(chord).reshape(len(xyz), k), pos.reshape(len(xyz), k)
+
+    def _frame(self, point, rank, pos, distance):
+        return pandas.DataFrame({'point': point,
+                                 'rank': rank,
+                                 'id': self.ids[pos],
+                                 'name': self.names[pos],
+                                 'distance': distance},
+                                columns=['point', 'rank', 'id', 'name', 'distance'])
+
+    def nearest(self, latitude, longitude, k=1):
+        """
+        Find the k nearest stations of each point
+
+        Parameters:
+        -----------
+            latitude, longitude: (float or array) WGS84 decimal degrees of the points
+            k: (int) number of stations per point
+
+        Returns:
+        --------
+            a dataframe with one row per (point, station): position of the point in input arrays,
+            rank of the station, station id, station name and distance (km)
+        """
+        distance, pos = self.query(latitude, longitude, k)
+        n, k = pos.shape
+        return self._frame(numpy.repeat(numpy.arange(n), k), numpy.tile(numpy.arange(k), n),
+                           pos.ravel(), distance.ravel())
+
+    def within(self, latitude, longitude, radius):
+        """
+        Find the stations located at less than radius of each point
+
+        Parameters:
+        -----------
+            latitude, longitude: (float or array) WGS84 decimal degrees of the points
+            radius: (float) distance (km)
+
+        Returns:
+        --------
+            a dataframe with one row per (point, station), sorted by point and distance,
+            with the same columns as nearest
+        """
+        if self._tree is None:
+            raise ValueError('no stations for this ressource')
+        xyz = to_xyz(latitude, longitude).reshape(-1, 3)
+        found = self._tree.query_ball_point(xyz, r=_km_to_chord(radius))
+        counts = numpy.fromiter((len(f) for f in found), dtype=int, count=len(found))
+        point = numpy.repeat(numpy.arange(len(found)), counts)
+        pos = numpy.fromiter((p for f in found for p in f), dtype=int, count=counts.sum())
+        distance = _chord_to_km(numpy.linalg.norm(xyz[point] - self._tree.data[pos], axis=1))
+        order = numpy.lexsort((distance, point))
+        point, pos, distance = point[order], pos[order], distance[order]
+        starts = numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        return self._frame(point, numpy.arange(len(point)) - starts, pos, distance)
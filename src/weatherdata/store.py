@@ -0,0 +1,137 @@
+# -*- python -*-
+# -*- coding:utf-8 -*-
+#
+#       Copyright 2020 INRAE-CIRAD
+#       Distributed under the Cecill-C License.
+#       See https://cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+# ==============================================================================
+"""Local on-disk store of downloaded weather data"""
+
+import os
+import re
+import threading
+
+import pandas
+
+
+def _slug(name):
+    return re.sub(r'[^0-9A-Za-z.-]+', '_', str(name)).strip('_')
+
+
+def contiguous_periods(index, interval=3600):
+    """ Group a sorted DatetimeIndex in runs of consecutive time steps
+
+    Returns:
+    --------
+        a list of (start, end) tuples (end included)
+    """
+    if len(index) == 0:
+        return []
+    step = pandas.Timedelta(seconds=interval)
+    breaks = (index[1:] - index[:-1]) != step
+    starts = [index[0]] + list(index[1:][breaks])
+    ends = list(index[:-1][breaks]) + [index[-1]]
+    return list(zip(starts, ends))
+
+
+class WeatherStore(object):
+    '''
+    Columnar store (one parquet file per resource, station and parameter) of
+    downloaded weather data, used to download only what is not yet known.
+
+    Time steps are stored in UTC. A time step is known as soon as it has been
+    downloaded, even if the service returned no value for it (NaN).
+    Parquet files need pyarrow (or fastparquet) to be installed.
+
+    ..doctest::
+        >>> store = WeatherStore('~/.weatherdata')
+        >>> ws = WeatherDataSource(name='Finnish Meteorological Institute measured data', store=store)
+        >>> ws.data(parameters=[1002,3002], station_id=101104, timeStart='2020-06-12',timeEnd='2020-07-03')
+        >>> store.read(ws.name, 101104, [1002, 3002])
+    '''
+
+    def __init__(self, root):
+        '''
+        Parameters:
+        -----------
+            root: (str) directory of the store, created if needed
+        '''
+        self.root = os.path.expanduser(root)
+        self._lock = threading.RLock()
+
+    def path(self, resource, station_id, parameter):
+        """ parquet file of a (resource, station, parameter) serie
+        """
+        return os.path.join(self.root, _slug(resource), _slug(station_id), _slug(parameter) + '.parquet')
+
+    def _read_serie(self, resource, station_id, parameter):
+        path = self.path(resource, station_id, parameter)
+        if not os.path.exists(path):
+            return None
+        return pandas.read_parquet(path)[str(parameter)]
+
+    def read(self, resource, station_id, parameters, start=None, end=None):
+        """
+        Read stored data
+
+        Parameters:
+        -----------
+            resource: name of weatherdatasource
+            station_id: id of the station
+            parameters: list of parameters
+            start, end: (pandas.Timestamp) optional period (end included)
+
+        Returns:
+        --------
+            a dataframe (one column per parameter) indexed by UTC time
+        """
+        with self._lock:
+            series = [self._read_serie(resource, station_id, p) for p in parameters]
+        series = [s for s in series if s is not None]
+        if len(series) == 0:
+            df = pandas.DataFrame(columns=[str(p) for p in parameters], dtype=float,
+                                  index=pandas.DatetimeIndex([], tz='UTC'))
+        else:
+            df = pandas.concat(series, axis=1).reindex(columns=[str(p) for p in parameters])
+        return df.loc[start:end]
+
+    def write(self, resource, station_id, df):
+        """
+        Merge a dataframe (one column per parameter, indexed by time) into the store.
+        Downloaded values replace stored ones at the same time steps.
+        """
+        if isinstance(df.index, pandas.MultiIndex):
+            raise ValueError('data of several locations (index %s) can not be stored for one station'
+                             % list(df.index.names))
+        df = df.tz_convert('UTC') if df.index.tz is not None else df.tz_localize('UTC')
+        with self._lock:
+            for column in df.columns:
+                new = df[column].astype(float)
+                old = self._read_serie(resource, station_id, column)
+                if old is not None:
+                    new = pandas.concat([old[~old.index.isin(new.index)], new]).sort_index()
+                path = self.path(resource, station_id, column)
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                tmp = path + '.tmp'
+                new.rename(str(column)).to_frame().to_parquet(tmp)
+                os.replace(tmp, path)
+
+    def missing(self, resource, station_id, parameters, start, end, interval=3600):
+        """
+        Find the periods not yet stored for at least one of parameters
+
+        Returns:
+        --------
+            a list of (start, end) tuples, in the time zone of start
+        """
+        grid = pandas.date_range(start, end, freq=pandas.Timedelta(seconds=interval))
+        known = pandas.DatetimeIndex([], tz='UTC')
+        with self._lock:
+            for p in parameters:
+                serie = self._read_serie(resource, station_id, p)
+                index = pandas.DatetimeIndex([], tz='UTC') if serie is None else serie.index
+                known = index if p == parameters[0] else known.intersection(index)
+        missing = grid[~grid.tz_convert('UTC').isin(known)]
+        return contiguous_periods(missing, interval)
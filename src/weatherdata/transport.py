@@ -0,0 +1,177 @@
+# -*- python -*-
+# -*- coding:utf-8 -*-
+#
+#       Copyright 2020 INRAE-CIRAD
+#       Distributed under the Cecill-C License.
+#       See https://cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+# ==============================================================================
+"""Shared HTTP transport for the IPM weather services"""
+
+import json
+import threading
+import time
+
+from weatherdata import instrument
+
+IPM_URL = 'https://platform.ipmdecisions.net/api/wx/'
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class IPMTransport(object):
+    '''
+    HTTP client of the IPM weather services, with the weather methods of
+    agroservices.IPM (get_weatherdatasource, get_weatheradapter,
+    get_weatheradapter_forecast).
+
+    One transport is meant to be shared by all weather data sources of the
+    process (see get_transport): connections are kept alive in a pool and
+    reused between calls and threads. Calls have a (connect, read) timeout,
+    and failed connections or 429/5xx answers are retried with exponential
+    backoff. Responses are requested gzip-compressed.
+    Needs the requests package (installed with agroservices).
+
+    ..doctest::
+        >>> transport = IPMTransport(timeout=(5, 120), retries=5)
+        >>> set_transport(transport)
+        >>> transport.get_weatherdatasource()
+    '''
+
+    def __init__(self, url=IPM_URL, timeout=(10, 60), retries=3, backoff=0.5, pool_size=16):
+        '''
+        Parameters:
+        -----------
+            url: (str) base url of the IPM weather service
+            timeout: (float or (connect, read) tuple) default timeout of calls, in seconds
+            retries: (int) default number of times a failed call is sent again
+            backoff: (float) retry i (from 0) is sent after backoff * 2 ** i seconds
+            pool_size: (int) maximum number of connections kept alive per host
+        '''
+        self.url = url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self._session = None
+        self._lock = threading.Lock()
+
+    def session(self):
+        """ the requests.Session of the transport (created on first call) """
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                session.headers.update({'Accept': 'application/json', 'Accept-Encoding': 'gzip, deflate'})
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._session = session
+        return self._session
+
+    def request(self, method, url, timeout=None, retries=None, stream=False, **kwds):
+        """
+        Send a request and decode its json answer, retrying on connection errors,
+        timeouts and 429/5xx answers
+
+        Parameters:
+        -----------
+            method: 'GET' or 'POST'
+            url: (str) url of the request
+            timeout, retries: override the defaults of the transport for this call
+            stream: if True, the answer is parsed while it is received (see convert.load_weather)
+            kwds: passed to requests.Session.request (eg params, data)
+        """
+        import requests
+        session = self.session()
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            instrument.count('transport.requests')
+            try:
+                with instrument.timer('transport.request'):
+                    response = session.request(method, url, timeout=timeout, stream=stream, **kwds)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUS or attempt == retries:
+                    break
+                response.close()
+            instrument.count('transport.retries')
+            time.sleep(self.backoff * 2 ** attempt)
+        try:
+            response.raise_for_status()
+            if stream:
+                from weatherdata.convert import load_weather
+                response.raw.decode_content = True
+                with instrument.timer('transport.decode'):
+                    data = load_weather(response.raw)
+                instrument.count('transport.bytes', response.raw.tell())
+                return data
+            with instrument.timer('transport.decode'):
+                data = response.json()
+            instrument.count('transport.bytes', response.raw.tell())
+            return data
+        finally:
+            response.close()
+
+    def close(self):
+        """ close the pooled connections """
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+
+    # ------------------------------------------------- agroservices.IPM api
+
+    def get_weatherdatasource(self, timeout=None, retries=None):
+        """ list of weather resources (json) """
+        return self.request('GET', self.url + 'rest/weatherdatasource', timeout=timeout, retries=retries)
+
+    def get_weatheradapter(self, endpoint, credentials=None, weatherStationId=None, timeStart=None, timeEnd=None,
+                           interval=3600, parameters=None, timeout=None, retries=None, stream=False):
+        """ historical weather data (json) of a station from a weather adapter endpoint """
+        params = {'weatherStationId': weatherStationId, 'timeStart': timeStart, 'timeEnd': timeEnd,
+                  'interval': interval}
+        if parameters is not None:
+            params['parameters'] = ','.join(str(p) for p in parameters)
+        if credentials:
+            params['credentials'] = json.dumps(credentials)
+            return self.request('POST', endpoint, data=params, timeout=timeout, retries=retries, stream=stream)
+        return self.request('GET', endpoint, params=params, timeout=timeout, retries=retries, stream=stream)
+
+    def get_weatheradapter_forecast(self, endpoint, altitude=None, latitude=None, longitude=None,
+                                    timeout=None, retries=None):
+        """ weather forecast (json) at a location from a forecast endpoint """
+        params = {'latitude': latitude, 'longitude': longitude}
+        if altitude is not None:
+            params['altitude'] = altitude
+        return self.request('GET', endpoint, params=params, timeout=timeout, retries=retries)
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    """The transport shared by all IPM calls of the process"""
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = IPMTransport()
+    return _transport
+
+
+def set_transport(transport):
+    """
+    Replace the shared transport, eg to change its timeout or retries
+
+        >>> set_transport(IPMTransport(timeout=(5, 300), retries=5))
+    """
+    global _transport
+    with _transport_lock:
+        _transport = transport
+    return transport
@@ -1,17 +1,38 @@
 """WeatherData class for handling weatherdata"""
 
+import importlib
+import threading
 
-wrappers = {'ipm_decision': 'openalea.weatherdata.wrapper.ipm_decision',
-            'echap': 'openalea.weatherdata.wrapper.echap'}
+# name: module of wrappers, imported on first use
+wrappers = {'ipm_decision': 'weatherdata.wrapper.ipm_decision',
+            'echap': 'weatherdata.wrapper.echap'}
 
-# for wrapper in wrappers:
-#     try:
-#         eval('import ' + wrappers[wrapper] + ' as ' + wrapper)
-#     except ImportError:
-#         print('wrapper not found' + wrapper)
-#         continue
+_loaded = {}
+_lock = threading.Lock()
 
-import openalea.weatherdata.wrapper.ipm_decision as ipm_decision
+
+def register_wrapper(name, module):
+    """ Register a wrapper, ie a module (or its import path) with a get_data function """
+    with _lock:
+        if isinstance(module, str):
+            wrappers[name] = module
+            _loaded.pop(name, None)
+        else:
+            wrappers[name] = module.__name__
+            _loaded[name] = module
+
+
+def get_wrapper(name):
+    """ The module of wrapper name, imported on first call """
+    if name not in wrappers:
+        raise ValueError('unknown source: ' + name)
+    with _lock:
+        if name not in _loaded:
+            try:
+                _loaded[name] = importlib.import_module(wrappers[name])
+            except ImportError as e:
+                raise ImportError('wrapper not found: ' + name + ' (' + str(e) + ')')
+        return _loaded[name]
 
 
 class WeatherData(object):
@@ -20,9 +41,9 @@ class WeatherData(object):
         if name not in wrappers:
             raise ValueError('unknown source: ' + name)
         self.name = name
-        self._get_data = eval(name + '.get_data')
+
+    def _get_data(self, *args, **kwds):
+        return get_wrapper(self.name).get_data(*args, **kwds)
 
     def get_data(self, station_id, daterange, label):
         self.data, self.meta_vars, self.meta = self._get_data(station_id, daterange, label)
-
-
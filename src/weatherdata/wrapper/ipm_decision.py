@@ -1,4 +1,7 @@
 from weatherdata.data import  ipm_getdata_request, ipm_get_weatherparameter
+from weatherdata.convert import weather_frame, locations
+from weatherdata.quality import qc_frame, apply_qc
+from weatherdata import instrument
 import pandas
 
 
@@ -7,22 +10,28 @@ def get_station_list():
     pass
 
 
-def get_data(station_id, daterange=pandas.date_range('2020-03-06T10:00:00', '2020-03-15T06:00:00', freq='H', tz='UTC'), label='id'):
+def get_data(station_id, daterange=pandas.date_range('2020-03-06T10:00:00', '2020-03-15T06:00:00', freq='h', tz='UTC'), label='id', qc=None, max_gap=None):
 
     #TODO build resquest for querying data source (datestart....)
     timeStart = daterange[0]
     timeEnd = daterange[-1]
     interval = pandas.Timedelta(daterange.freq).seconds
-    response = ipm_getdata_request(weatherStationid=station_id, timeStart=timeStart, timeEnd=timeEnd, interval=interval)
-    data = {str(var):vals for var, vals in zip(response['weatherParameters'], zip(*response['locationWeatherData'][0]['data']))}
-    df = pandas.DataFrame(data)
-    df.index = daterange
+    with instrument.timer('ipm_decision.request'):
+        response = ipm_getdata_request(weatherStationid=station_id, timeStart=timeStart, timeEnd=timeEnd, interval=interval)
+    with instrument.timer('ipm_decision.frame'):
+        df = weather_frame(response, index=daterange)
+    instrument.count('ipm_decision.rows', len(df))
+    if qc is not None:
+        df = apply_qc(df, qc_frame(response, df), qc, max_gap)
     # get associated meta
     parameters = ipm_get_weatherparameter()
     meta_vars = {str(item['id']) : item for item in parameters if str(item['id']) in df.columns}
     if label is not 'id':
         df.rename({k:v[label] for k,v in meta_vars.items()}, axis='columns', inplace=True)
-    return df, meta_vars, {k: response['locationWeatherData'][0][k] for k in ('latitude', 'longitude', 'altitude')}
+    meta = locations(response)
+    if len(meta) == 1:
+        meta = meta[0]
+    return df, meta_vars, meta
 
 
     timeStart = daterange[0].strftime('%Y-%m-%dT%H:%M:%S%z')
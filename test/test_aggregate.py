@@ -0,0 +1,77 @@
+import numpy
+import pandas
+
+from weatherdata.aggregate import aggregate, parameter_reducer
+
+
+def hourly(n=72, tz='UTC'):
+    rng = numpy.random.RandomState(0)
+    index = pandas.date_range('2020-06-01', periods=n, freq='h', tz=tz)
+    return pandas.DataFrame({'1002': rng.uniform(5, 25, n), '1003': rng.uniform(5, 25, n),
+                             '1004': rng.uniform(5, 25, n), '2001': rng.choice([0., 0.5, 2.], n),
+                             '4001': rng.uniform(0, 360, n)}, index=index)
+
+
+def test_parameter_reducer():
+    assert parameter_reducer(1002) == 'mean'
+    assert parameter_reducer('1003') == 'min'
+    assert parameter_reducer(1004) == 'max'
+    assert parameter_reducer(2001) == 'sum'
+    assert parameter_reducer(3101) == 'sum'
+    assert parameter_reducer(4001) == 'circmean'
+    assert parameter_reducer('Precipitation') == 'sum'
+    assert parameter_reducer('unknown') == 'mean'
+
+
+def test_daily():
+    df = hourly()
+    daily = aggregate(df)
+    assert list(daily.columns) == list(df.columns)
+    assert len(daily) == 3
+    expected = df.resample('D').agg({'1002': 'mean', '1003': 'min', '1004': 'max', '2001': 'sum'})
+    pandas.testing.assert_frame_equal(daily[expected.columns], expected, check_freq=False)
+    assert ((daily['4001'] >= 0) & (daily['4001'] < 360)).all()
+
+
+def test_circular_mean():
+    index = pandas.date_range('2020-06-01', periods=2, freq='h')
+    df = pandas.DataFrame({'4001': [350., 10.]}, index=index)
+    numpy.testing.assert_allclose(aggregate(df)['4001'].values % 360, [0.], atol=1e-9)
+
+
+def test_missing_values():
+    df = hourly()
+    df.loc[df.index[24:48], '2001'] = numpy.nan
+    daily = aggregate(df)
+    assert numpy.isnan(daily['2001'].iloc[1])
+    assert not numpy.isnan(daily['2001'].iloc[0])
+
+
+def test_timezone():
+    df = hourly()
+    daily = aggregate(df, timezone='Europe/Oslo')
+    assert str(daily.index.tz) == 'Europe/Oslo'
+    # first local day starts at 02:00 local (00:00 UTC)
+    assert len(daily) == 4
+    local = df.tz_convert('Europe/Oslo')
+    first = local[local.index.normalize() == daily.index[1]]
+    assert len(first) == 24
+    numpy.testing.assert_allclose(daily['1004'].iloc[1], first['1004'].max())
+    numpy.testing.assert_allclose(daily['2001'].iloc[1], first['2001'].sum())
+
+
+def test_stations():
+    a, b = hourly(), hourly() + 1
+    df = pandas.concat({101104: a, 101533: b}, names=['station', 'time'])
+    daily = aggregate(df)
+    assert daily.index.names == ['station', 'time']
+    assert len(daily) == 6
+    pandas.testing.assert_frame_equal(daily.loc[101104], aggregate(a).rename_axis('time'), check_freq=False)
+    numpy.testing.assert_allclose(daily.loc[101533, '2001'].values, aggregate(b)['2001'].values)
+
+
+def test_reducers():
+    df = hourly()
+    daily = aggregate(df, freq='6h', reducers={'1002': 'max'})
+    assert len(daily) == 12
+    numpy.testing.assert_allclose(daily['1002'].values, df['1002'].resample('6h').max().values)
@@ -0,0 +1,77 @@
+import json
+import time
+
+from weatherdata.catalogue import WeatherResourceCatalogue
+from weatherdata.data import ipm_get_weatherdatasource
+from weatherdata.ipm import WeatherDataHub, WeatherDataSource
+
+
+class CountingIPM(object):
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.fail = fail
+
+    def get_weatherdatasource(self):
+        self.calls += 1
+        if self.fail:
+            raise IOError('service unavailable')
+        return ipm_get_weatherdatasource()
+
+
+def test_fetch_once():
+    ipm = CountingIPM()
+    cat = WeatherResourceCatalogue(ipm=ipm, ttl=None)
+    hub = WeatherDataHub(catalogue=cat)
+    assert 'Finnish Meteorological Institute measured data' in hub.list_resources()
+    ws = hub.get_ressource('Finnish Meteorological Institute measured data')
+    assert ws.endpoint() == 'https://ipmdecisions.nibio.no/weather/rest/weatheradapter/fmi/'
+    assert not ws.check_forecast_endpoint()
+    assert ws.parameters()['common'] == [1002, 3002, 2001, 4003]
+    stations = ws.station_ids()
+    assert list(stations.columns) == ['name', 'id', 'coordinates']
+    assert len(stations) == 208
+    assert WeatherDataSource('Met Norway Locationforecast', catalogue=cat).check_forecast_endpoint()
+    assert ipm.calls == 1
+
+
+def test_ttl():
+    ipm = CountingIPM()
+    cat = WeatherResourceCatalogue(ipm=ipm, ttl=0)
+    cat.names()
+    cat._fetched -= 1
+    cat.names()
+    assert ipm.calls == 2
+
+
+def test_fallback_and_persistence(tmp_path):
+    path = str(tmp_path / 'resources.json')
+    cat = WeatherResourceCatalogue(ipm=CountingIPM(fail=True), path=path)
+    assert len(cat.names()) == 4
+    assert cat.source == 'bundled'
+
+    WeatherResourceCatalogue(ipm=CountingIPM(), path=path).names()
+    ipm = CountingIPM()
+    cat = WeatherResourceCatalogue(ipm=ipm, path=path)
+    assert len(cat.stations('Landbruksmeteorologisk tjeneste')) == 92
+    assert cat.source == 'disk'
+    assert ipm.calls == 0
+
+
+def test_outage(tmp_path):
+    path = str(tmp_path / 'resources.json')
+    fetched = time.time() - 7200
+    with open(path, 'w') as f:
+        json.dump({'fetched': fetched, 'resources': ipm_get_weatherdatasource()}, f)
+
+    # the persisted list is too old, and the service is down
+    ipm = CountingIPM(fail=True)
+    cat = WeatherResourceCatalogue(ipm=ipm, path=path)
+    for i in range(5):
+        assert cat.endpoint('Finnish Meteorological Institute measured data')
+    assert cat.source == 'disk'
+    assert ipm.calls == 1
+    assert cat._fetched == fetched
+
+    cat._retry_at -= cat.retry_delay
+    cat.names()
+    assert ipm.calls == 2
@@ -0,0 +1,52 @@
+import numpy
+import pandas
+
+from weatherdata.container import WeatherTable
+from weatherdata.convert import weather_frame
+from weatherdata.data import ipm_getdata_request
+
+from test_forecast import FakeForecast
+from test_forecast import get_source as get_forecast_source
+from test_ipm import FakeIPM, get_source
+
+
+def test_from_response():
+    response = ipm_getdata_request()
+    table = WeatherTable.from_response(response, dtype='float32')
+    assert len(table) == 213
+    assert table.dtype == numpy.float32
+    assert table.parameters == [1001, 3001, 2001, 4002]
+    assert table.units[1001] == 'Celcius'
+    assert table.location == {'latitude': 67.2828, 'longitude': 14.3711, 'altitude': 70.0}
+    assert str(table.time.tz) == 'UTC'
+    df = table.to_frame()
+    numpy.testing.assert_allclose(df.values, weather_frame(response).values, rtol=1e-6)
+    assert table.to_frame(label='name').columns[0] == 'Instantaneous temperature at 2m'
+
+
+def test_sel():
+    table = WeatherTable.from_response(ipm_getdata_request())
+    sub = table.sel(parameters=[3001, 2001], start='2020-03-07', end='2020-03-07T23:00')
+    assert len(sub) == 24 and sub.parameters == [3001, 2001]
+    assert numpy.shares_memory(sub.values, table.values)
+    assert sub[2001][0] == table[2001][14]
+    scattered = table.sel(parameters=[4002, 1001])
+    assert not numpy.shares_memory(scattered.values, table.values)
+    assert (scattered[1001] == table[1001]).all()
+
+
+def test_data_container():
+    ws = get_source(FakeIPM())
+    df = ws.data(parameters=[1002, 3002], station_id=101104, timeStart='2020-06-12', timeEnd='2020-06-13')
+    table = ws.data(parameters=[1002, 3002], station_id=101104, timeStart='2020-06-12', timeEnd='2020-06-13',
+                    container=True)
+    assert isinstance(table, WeatherTable)
+    assert table.parameters == [1002, 3002]
+    assert table.units[1002] == 'Celcius'
+    assert set(table.location) == {'latitude', 'longitude'}
+    pandas.testing.assert_frame_equal(table.to_frame(), df, check_freq=False)
+
+    ws = get_forecast_source(FakeForecast(delay=0))
+    table = ws.data(latitude=61., longitude=10., altitude=10., container=True)
+    assert table.location == {'latitude': 61., 'longitude': 10., 'altitude': 10.}
+    assert len(table) == 48
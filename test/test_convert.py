@@ -0,0 +1,69 @@
+import numpy
+import pandas
+
+from weatherdata.convert import weather_frame, weather_values
+from weatherdata.data import ipm_getdata_request
+
+
+def test_weather_frame():
+    response = ipm_getdata_request()
+    df = weather_frame(response)
+    data = {str(var): vals for var, vals in zip(response['weatherParameters'], zip(*response['locationWeatherData'][0]['data']))}
+    pandas.testing.assert_frame_equal(df, pandas.DataFrame(data))
+
+
+def test_missing_values():
+    response = {'weatherParameters': [1001, 2001],
+                'locationWeatherData': [{'data': [[1.0, None], [None, 0.2], [3.0]]}]}
+    values = weather_values(response)
+    assert values.shape == (3, 2)
+    assert numpy.isnan(values[[0, 1, 2], [1, 0, 1]]).all()
+    assert values[1, 1] == 0.2
+    response['locationWeatherData'][0]['data'][2].append(1.)
+    assert numpy.isnan(weather_values(response)[1, 0])
+
+
+def test_no_copy():
+    response = {'weatherParameters': [1001, 2001],
+                'locationWeatherData': [{'data': [[1.0, 0.0], [2.0, 0.2]]}]}
+    df = weather_frame(response)
+    assert numpy.shares_memory(df.values, df['2001'].values)
+
+
+def test_locations():
+    response = ipm_getdata_request()
+    first = response['locationWeatherData'][0]
+    second = dict(first, latitude=60.1, longitude=24.9, altitude=10., data=first['data'][:100])
+    response['locationWeatherData'].append(second)
+    index = pandas.date_range(response['timeStart'], periods=213, freq='h')
+    df = weather_frame(response, index)
+    assert df.index.names == ['latitude', 'longitude', 'altitude', 'time']
+    assert len(df) == 313
+    assert list(df.index.droplevel('time').unique()) == [(67.2828, 14.3711, 70.), (60.1, 24.9, 10.)]
+    one = df.xs((60.1, 24.9, 10.), level=('latitude', 'longitude', 'altitude'))
+    pandas.testing.assert_frame_equal(one, weather_frame(response, index[:100], location=1),
+                                  check_names=False, check_freq=False)
+
+
+def test_load_weather():
+    import io
+    import json
+    from weatherdata.convert import load_weather
+
+    expected = ipm_getdata_request()
+    response = ipm_getdata_request(stream=True)
+    assert response['weatherParameters'] == expected['weatherParameters']
+    assert response['locationWeatherData'][0]['latitude'] == 67.2828
+    data = response['locationWeatherData'][0]['data']
+    assert isinstance(data, numpy.ndarray) and data.shape == (213, 4)
+    pandas.testing.assert_frame_equal(weather_frame(response), weather_frame(expected))
+
+    # small chunks, bytes, nulls, ragged rows and unknown size
+    text = json.dumps({'weatherParameters': [1, 2], 'QC': [0, 0], 'locationWeatherData': [
+        {'latitude': 1., 'data': [[1.5, None], [2., 3.], [4.]] * 500},
+        {'latitude': 2., 'data': []}]})
+    response = load_weather(io.BytesIO(text.encode('utf-8')), chunk_size=7)
+    values = response['locationWeatherData'][0]['data']
+    assert values.shape == (1500, 2)
+    assert numpy.isnan(values[0, 1]) and numpy.isnan(values[2, 1]) and values[1, 1] == 3.
+    assert response['locationWeatherData'][1]['data'].shape == (0, 2)
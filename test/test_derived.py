@@ -0,0 +1,61 @@
+import numpy
+import pandas
+
+from weatherdata import derived
+from weatherdata.derived import WeatherVariables, register
+from weatherdata.global_weather import Weather
+
+
+def weather_frame(n=48):
+    rng = numpy.random.RandomState(0)
+    index = pandas.date_range('2000-01-01', periods=n, freq='h')
+    return pandas.DataFrame({'PPFD': rng.uniform(0, 1500, n), 'temperature_air': rng.uniform(-5, 30, n),
+                             'relative_humidity': rng.uniform(40, 100, n), 'wind_speed': rng.uniform(0, 5, n),
+                             'rain': rng.choice([0., 1.], n)}, index=index)
+
+
+def test_derived_values():
+    weather = Weather()
+    weather.data = weather_frame()
+    variables = weather.variables
+    mean_vp, climate = weather.add_vapor_pressure(weather.data)
+    pandas.testing.assert_series_equal(variables['vapor_pressure'], climate['vapor_pressure'])
+    pandas.testing.assert_series_equal(variables['global_radiation'], weather.PPFD_to_global(weather.data['PPFD']))
+    numpy.testing.assert_allclose(variables['dew_point'][variables['relative_humidity'] > 99.99],
+                                  variables['temperature_air'][variables['relative_humidity'] > 99.99])
+    assert (variables['dew_point'] <= variables['temperature_air']).all()
+    assert variables['leaf_wetness'].dtype == bool
+    assert 'vapor_pressure_deficit' in variables.available()
+
+
+def test_cache():
+    calls = []
+
+    @register('test_double_temperature', ['temperature_air'])
+    def double(temperature_air):
+        calls.append(1)
+        return 2 * temperature_air
+
+    try:
+        data = weather_frame()
+        variables = WeatherVariables(data)
+        first = variables['test_double_temperature']
+        variables['test_double_temperature']
+        assert len(calls) == 1
+        data['rain'] = 0.
+        variables['test_double_temperature']
+        assert len(calls) == 1
+        data['temperature_air'] = 1.
+        assert (variables['test_double_temperature'] == 2.).all()
+        assert len(calls) == 2
+        assert (first != 2.).any()
+    finally:
+        derived._registry.pop('test_double_temperature')
+
+
+def test_add_global_radiation():
+    weather = Weather()
+    weather.data = weather_frame()
+    weather.add_global_radiation()
+    assert 'global_radiation' in weather.data.columns
+    assert weather.variables['global_radiation'] is not None
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+
+import numpy
+import pandas
+import pytest
+
+from weatherdata.catalogue import WeatherResourceCatalogue
+from weatherdata.forecast import forecast_frame, iter_forecasts
+from weatherdata.ipm import WeatherDataSource
+
+from test_ipm import FakeIPM
+
+
+class FakeForecast(FakeIPM):
+    """Forecast adapter answering 48 hours of latitude and longitude after a delay
+
+    If gate is given, calls wait (at most 5 s) until gate calls have been running at the same time.
+    If events ({latitude: threading.Event}) are given, calls at a latitude wait (at most 5 s) for its event.
+    """
+
+    def __init__(self, delay=0.05, fail=(), gate=None, events=None):
+        FakeIPM.__init__(self)
+        self.delay = delay
+        self.fail = set(fail)
+        self.gate = gate
+        self.events = events or {}
+        self.running = 0
+        self.max_running = 0
+        self.changed = threading.Condition(self.lock)
+
+    def get_weatheradapter_forecast(self, endpoint, altitude, latitude, longitude):
+        with self.lock:
+            self.calls.append((latitude, longitude))
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            self.changed.notify_all()
+            if self.gate is not None:
+                self.changed.wait_for(lambda: self.max_running >= self.gate, timeout=5)
+        try:
+            if latitude in self.events:
+                self.events[latitude].wait(timeout=5)
+            time.sleep(self.delay * (1 + (latitude % 3)))
+            if latitude in self.fail:
+                raise IOError('timeout')
+            rows = [[latitude, longitude] for _ in range(48)]
+            return {'timeStart': '2020-06-12T00:00:00Z', 'timeEnd': '2020-06-13T23:00:00Z', 'interval': 3600,
+                    'weatherParameters': [1001, 3001],
+                    'locationWeatherData': [{'latitude': latitude, 'longitude': longitude, 'altitude': altitude,
+                                             'data': rows}]}
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+def get_source(ipm):
+    ws = WeatherDataSource('Met Norway Locationforecast', catalogue=WeatherResourceCatalogue(ipm=ipm))
+    ws.ipm = ipm
+    ws.retry_backoff = 0
+    return ws
+
+
+def grid(n):
+    return numpy.column_stack([numpy.arange(n, dtype=float), numpy.arange(n) + 100., numpy.full(n, 10.)])
+
+
+def test_forecasts():
+    ipm = FakeForecast(delay=0.01, gate=10)
+    ws = get_source(ipm)
+    coordinates = grid(40)
+    df = ws.forecasts(coordinates, concurrency=10)
+    # 10 requests in flight at most, and at once
+    assert ipm.max_running == 10
+    assert len(ipm.calls) == 40
+    assert df.index.names == ['latitude', 'longitude', 'altitude', 'time']
+    assert list(df.columns) == ['1001', '3001']
+    assert len(df) == 40 * 48
+    numpy.testing.assert_array_equal(df['1001'].values, df.index.get_level_values('latitude'))
+    assert (df.index.get_level_values('latitude')[::48] == coordinates[:, 0]).all()
+
+
+def test_iter_forecasts():
+    # each location answers once the previous one (in release order) has been yielded
+    release = [3, 0, 5, 1, 2, 4]
+    ipm = FakeForecast(delay=0, fail=[4.], events={float(i): threading.Event() for i in range(6)})
+    ws = get_source(ipm)
+
+    async def collect():
+        results = []
+        ipm.events[float(release[0])].set()
+        async for item in iter_forecasts(ws, grid(6)[:, :2], concurrency=6, retries=1, return_exceptions=True):
+            results.append(item)
+            if len(results) < len(release):
+                ipm.events[float(release[len(results)])].set()
+        return results
+
+    results = asyncio.run(collect())
+    # yielded as they complete
+    assert [i for i, _ in results] == release
+    assert isinstance(dict(results)[4], IOError)
+    df = forecast_frame([r for _, r in sorted(results, key=lambda x: x[0])])
+    assert len(df) == 5 * 48
+    assert df.index.get_level_values('altitude').isna().all()
+
+    with pytest.raises(IOError):
+        ws.forecasts(grid(6), concurrency=3, retries=0)
+
+
+def test_naive_time_start():
+    response = FakeForecast(delay=0).get_weatheradapter_forecast('forecast', 10., 60., 24.)
+    response['timeStart'] = '2020-06-12T00:00:00'
+    df = forecast_frame([response])
+    assert df.index.get_level_values('time')[0] == pandas.Timestamp('2020-06-12', tz='UTC')
+
+
+def test_not_forecast():
+    ws = WeatherDataSource('Finnish Meteorological Institute measured data',
+                           catalogue=WeatherResourceCatalogue(ipm=FakeIPM()))
+    with pytest.raises(ValueError):
+        ws.forecasts(grid(2))
@@ -0,0 +1,137 @@
+import numpy
+import pandas
+import pytest
+
+from weatherdata.catalogue import WeatherResourceCatalogue
+from weatherdata.forecast_cache import ForecastCache
+from weatherdata.ipm import WeatherDataSource
+
+from test_ipm import FakeIPM
+
+
+def forecast(start, n=48, offset=0., changed=()):
+    """ response of a forecast issued at start: temperature is the hour since 2020-06-12, plus offset
+    on changed hours (hours since start) """
+    start = pandas.Timestamp(start, tz='UTC')
+    hours = (start - pandas.Timestamp('2020-06-12', tz='UTC')) // pandas.Timedelta('1h') + numpy.arange(n)
+    temperature = hours.astype(float)
+    temperature[list(changed)] += offset
+    rows = [[t, 0.] for t in temperature]
+    return {'timeStart': start.strftime('%Y-%m-%dT%H:%M:%SZ'), 'interval': 3600,
+            'weatherParameters': [1001, 2001],
+            'locationWeatherData': [{'latitude': 67.28, 'longitude': 14.37, 'altitude': 70., 'data': rows}]}
+
+
+def test_first_forecast():
+    cache = ForecastCache()
+    key = cache.key('forecast', 67.28, 14.37, 70)
+    delta = cache.update(key, forecast('2020-06-12'))
+    assert len(delta.added) == 48
+    assert len(delta.changed) == 0
+    assert delta.window() == (pandas.Timestamp('2020-06-12', tz='UTC'), pandas.Timestamp('2020-06-13T23:00', tz='UTC'))
+    df = cache.frame(key)
+    assert df.shape == (48, 2)
+    assert list(df.columns) == ['1001', '2001']
+    assert df['1001'].iloc[5] == 5
+
+
+def test_refresh():
+    cache = ForecastCache()
+    key = cache.key('forecast', 67.28, 14.37, 70)
+    cache.update(key, forecast('2020-06-12'))
+    # issued 6 hours later, with 3 hours changed
+    delta = cache.update(key, forecast('2020-06-12T06:00', offset=1, changed=[0, 1, 10]))
+    assert list(delta.changed.hour) == [6, 7, 16]
+    assert len(delta.added) == 6
+    assert delta.added[0] == pandas.Timestamp('2020-06-14', tz='UTC')
+    assert len(delta.removed) == 0
+    assert delta.window() == (pandas.Timestamp('2020-06-12T06:00', tz='UTC'),
+                              pandas.Timestamp('2020-06-14T05:00', tz='UTC'))
+    df = cache.frame(key)
+    # past hours are kept
+    assert df.index[0] == pandas.Timestamp('2020-06-12', tz='UTC')
+    assert len(df) == 54
+    numpy.testing.assert_array_equal(df['1001'].values[:6], numpy.arange(6))
+    assert df['1001'].iloc[6] == 7
+    assert df['1001'].iloc[8] == 8
+    assert df['1001'].iloc[-1] == 53
+
+    # same forecast again: nothing changed
+    delta = cache.update(key, forecast('2020-06-12T06:00', offset=1, changed=[0, 1, 10]))
+    assert not delta
+    assert delta.window() is None
+
+    # shorter horizon
+    delta = cache.update(key, forecast('2020-06-12T06:00', n=24, offset=1, changed=[0, 1, 10]))
+    assert len(delta.removed) == 24
+    assert len(cache.frame(key)) == 30
+
+
+def test_window_frame():
+    cache = ForecastCache()
+    key = cache.key('forecast', 67.28, 14.37, 70)
+    cache.update(key, forecast('2020-06-12'))
+    delta = cache.update(key, forecast('2020-06-12T12:00', offset=2, changed=[3, 4]))
+    df = cache.frame(key, *delta.window())
+    assert df.index[0] == pandas.Timestamp('2020-06-12T15:00', tz='UTC')
+    assert df.index[-1] == pandas.Timestamp('2020-06-14T11:00', tz='UTC')
+
+
+def test_history():
+    cache = ForecastCache(history='12h')
+    key = cache.key('forecast', 67.28, 14.37, 70)
+    for h in range(0, 48, 6):
+        cache.update(key, forecast(pandas.Timestamp('2020-06-12') + pandas.Timedelta(hours=h)))
+    df = cache.frame(key)
+    assert df.index[0] == pandas.Timestamp('2020-06-13T06:00', tz='UTC')
+    assert df.index[-1] == pandas.Timestamp('2020-06-15T17:00', tz='UTC')
+    numpy.testing.assert_array_equal(df['1001'].values, numpy.arange(30, 90))
+
+
+def test_off_grid():
+    cache = ForecastCache()
+    key = cache.key('forecast', 67.28, 14.37, 70)
+    cache.update(key, forecast('2020-06-12T06:00'))
+    # earlier forecast: the cached series starts again
+    delta = cache.update(key, forecast('2020-06-12'))
+    assert len(delta.added) == 48
+    assert cache.frame(key).index[0] == pandas.Timestamp('2020-06-12', tz='UTC')
+
+
+def test_locations():
+    cache = ForecastCache()
+    key = cache.key('forecast', 67.28, 14.37, 70)
+    response = forecast('2020-06-12')
+    response['locationWeatherData'].append(dict(response['locationWeatherData'][0], latitude=60.))
+    with pytest.raises(ValueError):
+        cache.update(key, response)
+    response['locationWeatherData'] = []
+    with pytest.raises(ValueError):
+        cache.update(key, response)
+    assert key not in cache
+
+
+class FakeForecast(FakeIPM):
+
+    def __init__(self):
+        FakeIPM.__init__(self)
+        self.start = pandas.Timestamp('2020-06-12')
+
+    def get_weatheradapter_forecast(self, endpoint, altitude, latitude, longitude):
+        self.calls.append((latitude, longitude))
+        return forecast(self.start)
+
+
+def test_source():
+    ipm = FakeForecast()
+    ws = WeatherDataSource('Met Norway Locationforecast', catalogue=WeatherResourceCatalogue(ipm=ipm),
+                           forecast_cache=ForecastCache())
+    ws.ipm = ipm
+    delta = ws.update_forecast(latitude=67.28, longitude=14.37, altitude=70)
+    assert len(delta.added) == 48
+    ipm.start += pandas.Timedelta('3h')
+    df = ws.data(latitude=67.28, longitude=14.37, altitude=70)
+    assert len(df) == 51
+    assert df.index[0] == pandas.Timestamp('2020-06-12', tz='UTC')
+    with pytest.raises(ValueError):
+        WeatherDataSource('Met Norway Locationforecast', catalogue=ws.catalogue).update_forecast(67.28, 14.37)
@@ -0,0 +1,105 @@
+import numpy
+import pandas
+
+from weatherdata.data import write_meteo_example as write_meteo
+from weatherdata.global_weather import Weather, parse, to_datetime
+
+
+def test_to_datetime():
+    yr = numpy.array([2000, 2000, 2001, 2004])
+    doy = numpy.array([1, 60, 365, 366])
+    hr = numpy.array([0, 1230, 2300, 100])
+    expected = [parse(*x) for x in zip(yr, doy, hr)]
+    assert list(to_datetime(yr, doy, hr)) == expected
+
+
+def test_weather(tmp_path):
+    path = str(tmp_path / 'meteo.csv')
+    time = write_meteo(path)
+    weather = Weather(path)
+    assert (weather.data.index == time).all()
+    assert weather.data.index.name == 'datetime'
+    assert list(weather.data.columns) == ['datetime', 'PPFD', 'temperature_air', 'relative_humidity',
+                                          'wind_speed', 'rain']
+
+
+def test_split_weather(tmp_path):
+    from datetime import datetime, timedelta
+    path = str(tmp_path / 'meteo.csv')
+    write_meteo(path)
+    weather = Weather(path)
+    weather.data = weather.data.drop(weather.data.index[30:41])
+    t_deb = datetime(2000, 1, 1, 5)
+    steps = list(weather.split_weather(6, t_deb, 20))
+    assert len(steps) == 20
+    for i, step in enumerate(steps):
+        t = t_deb + i * timedelta(hours=6)
+        pandas.testing.assert_frame_equal(step, weather.data.truncate(before=t, after=t + timedelta(hours=5)))
+
+    mean, climate = weather.get_weather(6, t_deb)
+    pandas.testing.assert_frame_equal(climate, steps[0])
+
+    means = weather.window_means(6, t_deb, 20)
+    assert len(means) == 20 and means.index[1] == datetime(2000, 1, 1, 11)
+    expected = pandas.DataFrame([s.mean(numeric_only=True) for s in steps])
+    numpy.testing.assert_allclose(means.values, expected.values)
+    assert numpy.isnan(means.iloc[5]).all()
+
+
+def test_cache(tmp_path):
+    import os
+    path = str(tmp_path / 'meteo.csv')
+    write_meteo(path)
+    expected = Weather(path).data
+    first = Weather(path, cache=True).data
+    assert os.path.exists(path + '.cache/meta.json')
+    cached = Weather(path, cache=True).data
+    pandas.testing.assert_frame_equal(first, expected)
+    pandas.testing.assert_frame_equal(cached, expected)
+    assert isinstance(cached['rain'].values.base, numpy.memmap)
+
+    # modified source file: cache is rebuilt
+    with open(path, 'a') as f:
+        f.write('2001;1;0;0;0;0;0;0\n')
+    assert len(Weather(path, cache=True).data) == len(expected) + 1
+
+    cache_dir = str(tmp_path / 'cache')
+    Weather(path, cache=cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+
+
+def test_cache_touched(tmp_path, monkeypatch):
+    import os
+    from weatherdata import global_weather
+    path = str(tmp_path / 'meteo.csv')
+    write_meteo(path)
+    Weather(path, cache=True)
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+
+    hashes = []
+    sha1 = global_weather._sha1
+    monkeypatch.setattr(global_weather, '_sha1', lambda p: hashes.append(p) or sha1(p))
+    # same content: the cache is reused, and the file is hashed only once
+    for _ in range(3):
+        assert isinstance(Weather(path, cache=True).data['rain'].values.base, numpy.memmap)
+    assert len(hashes) == 1
+
+
+def test_cache_errors(tmp_path):
+    import os
+    path = str(tmp_path / 'meteo.csv')
+    write_meteo(path)
+    expected = Weather(path).data
+
+    # the cache can not be written (here, a file is in the way): data are still returned
+    blocked = str(tmp_path / 'blocked')
+    open(blocked, 'w').close()
+    pandas.testing.assert_frame_equal(Weather(path, cache=blocked).data, expected)
+
+    # corrupt meta.json: the cache is rebuilt
+    Weather(path, cache=True)
+    with open(path + '.cache/meta.json', 'w') as f:
+        f.write('{"mtime": 1')
+    pandas.testing.assert_frame_equal(Weather(path, cache=True).data, expected)
+    assert isinstance(Weather(path, cache=True).data['rain'].values.base, numpy.memmap)
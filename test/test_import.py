@@ -0,0 +1,60 @@
+import json
+import os
+import subprocess
+import sys
+
+import pandas
+
+import weatherdata
+
+HEAVY = ('pandas', 'numpy', 'scipy', 'requests', 'agroservices', 'pkg_resources')
+
+SCRIPT = """
+import json, sys, time
+t = time.perf_counter()
+import weatherdata
+from weatherdata.weather_data import WeatherData
+WeatherData('ipm_decision')
+elapsed = time.perf_counter() - t
+print(json.dumps({'elapsed': elapsed, 'modules': sorted(sys.modules)}))
+"""
+
+
+def run_isolated(script):
+    src = os.path.dirname(os.path.dirname(os.path.abspath(weatherdata.__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([src, os.environ.get('PYTHONPATH', '')]))
+    out = subprocess.check_output([sys.executable, '-c', script], env=env)
+    return json.loads(out.decode().strip().splitlines()[-1])
+
+
+def test_import_is_lazy():
+    result = run_isolated(SCRIPT)
+    modules = set(result['modules'])
+    loaded = [m for m in HEAVY if m in modules]
+    assert loaded == [], 'import weatherdata loads ' + ', '.join(loaded)
+    assert 'weatherdata.ipm' not in modules
+    assert 'weatherdata.wrapper.ipm_decision' not in modules
+    # generous bound, the import itself takes a few milliseconds
+    assert result['elapsed'] < 0.5
+
+
+def test_lazy_attributes():
+    assert isinstance(weatherdata.__version__, str)
+    assert weatherdata.WeatherDataSource is weatherdata.ipm.WeatherDataSource
+    assert 'WeatherDataSource' in dir(weatherdata)
+
+
+def test_wrapper_registry():
+    from weatherdata import weather_data
+    wrapper = weather_data.get_wrapper('ipm_decision')
+    assert wrapper.__name__ == 'weatherdata.wrapper.ipm_decision'
+    assert weather_data.get_wrapper('ipm_decision') is wrapper
+    wd = weather_data.WeatherData('ipm_decision')
+    wd.get_data(5, pandas.date_range('2020-03-06T10:00:00', '2020-03-15T06:00:00', freq='h', tz='UTC'), 'id')
+    assert list(wd.data.columns) == ['1001', '3001', '2001', '4002']
+    try:
+        weather_data.get_wrapper('unknown')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('unknown wrapper')
@@ -0,0 +1,98 @@
+import numpy
+import pytest
+
+from weatherdata import instrument
+from weatherdata.data import write_meteo_example as write_meteo
+from weatherdata.global_weather import Weather
+from weatherdata.mini_models import leaf_wetness_pedro_gillepsie_batch
+from weatherdata.store import WeatherStore
+
+from test_forecast import FakeForecast
+from test_forecast import get_source as get_forecast_source
+from test_ipm import FakeIPM, get_source
+
+
+def test_disabled():
+    instrument.disable()
+    assert not instrument.is_enabled()
+    assert instrument.get_stats() is None
+    with instrument.timer('test'):
+        instrument.count('test')
+    assert instrument.get_stats() is None
+
+
+def test_data_stats(tmp_path):
+    stats = instrument.enable()
+    try:
+        ws = get_source(FakeIPM(failures=1))
+        df = ws.data(parameters=[1002, 3002], timeStart='2020-01-01', timeEnd='2020-01-10T23:00', chunk='3D')
+        report = stats.report()
+        assert report['counts']['ipm.requests'] == 4
+        assert report['counts']['ipm.retries'] == 1
+        assert report['counts']['ipm.rows'] == len(df)
+        assert report['timings']['ipm.fetch']['calls'] == 4
+        assert report['timings']['ipm.frame']['calls'] == 4
+        assert report['counts']['catalogue.hits'] > 0
+
+        stats.reset()
+        ws.store = WeatherStore(str(tmp_path / 'store'))
+        ws.data(parameters=[1002], timeStart='2020-01-01', timeEnd='2020-01-02')
+        ws.data(parameters=[1002], timeStart='2020-01-01', timeEnd='2020-01-02')
+        assert stats.counts['store.misses'] == 1 and stats.counts['store.hits'] == 1
+        assert list(stats.to_frame().columns) == ['calls', 'total', 'mean', 'max']
+    finally:
+        instrument.disable()
+
+
+def test_forecast_stats():
+    stats = instrument.enable()
+    try:
+        ipm = FakeForecast(delay=0, fail=[60.])
+        ws = get_forecast_source(ipm)
+        df = ws.data(latitude=61., longitude=10., altitude=10.)
+        assert stats.counts['ipm.requests'] == 1
+        assert stats.counts['ipm.rows'] == len(df) == 48
+        assert stats.timings['ipm.forecast'][0] == 1
+        assert stats.timings['ipm.frame'][0] == 1
+
+        stats.reset()
+        with pytest.raises(IOError):
+            ws.data(latitude=60., longitude=10., altitude=10., retries=1)
+        assert stats.counts['ipm.retries'] == 1
+    finally:
+        instrument.disable()
+
+
+def test_weather_and_models(tmp_path):
+    path = str(tmp_path / 'meteo.csv')
+    write_meteo(path)
+    stats = instrument.enable()
+    try:
+        Weather(path, cache=True)
+        Weather(path, cache=True)
+        assert stats.counts['weather.cache_misses'] == 1 and stats.counts['weather.cache_hits'] == 1
+        assert stats.counts['weather.rows'] == 2 * 365 * 24
+        assert stats.timings['weather.read'][0] == 1
+
+        n = 100
+        leaf_wetness_pedro_gillepsie_batch(rain_intensity=numpy.zeros(n), temperature_air=numpy.full(n, 15.),
+                                           wind_speed=numpy.ones(n), relative_humidity=numpy.full(n, 90.),
+                                           net_radiation=numpy.zeros(n))
+        assert stats.counts['mini_models.leaf_wetness_pedro_gillepsie_batch.rows'] == n
+        assert 'mini_models.leaf_temperature_pedro_gillepsie' in stats.timings
+    finally:
+        instrument.disable()
+
+
+def test_hook():
+    events = []
+    hook = instrument.add_hook(lambda kind, name, value: events.append((kind, name, value)))
+    try:
+        assert instrument.is_enabled() and instrument.get_stats() is None
+        with instrument.timer('stage'):
+            instrument.count('items', 3)
+        assert events[0] == ('count', 'items', 3)
+        assert events[1][:2] == ('time', 'stage')
+    finally:
+        instrument.remove_hook(hook)
+    assert not instrument.is_enabled()
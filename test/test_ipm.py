@@ -0,0 +1,119 @@
+import threading
+
+import pandas
+import pytest
+
+from weatherdata.catalogue import WeatherResourceCatalogue
+from weatherdata.data import ipm_get_weatherdatasource
+from weatherdata.ipm import WeatherDataSource, split_period, to_timestamp
+
+
+def hours_since_epoch(t):
+    return (t - pandas.Timestamp(0, tz='UTC')) // pandas.Timedelta('1h')
+
+
+class FakeIPM(object):
+    """Historical weather adapter returning, for each hour, its timestamp (in hours) and the station id"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def get_weatherdatasource(self):
+        return ipm_get_weatherdatasource()
+
+    def get_weatheradapter(self, endpoint, credentials, weatherStationId, timeStart, timeEnd, interval, parameters):
+        with self.lock:
+            self.calls.append((weatherStationId, timeStart, timeEnd))
+            if self.failures > 0:
+                self.failures -= 1
+                raise IOError('timeout')
+        hours = pandas.date_range(timeStart, timeEnd, freq=pandas.Timedelta(seconds=interval))
+        rows = [[hours_since_epoch(t), float(weatherStationId)] for t in hours]
+        return {'timeStart': timeStart, 'timeEnd': timeEnd, 'interval': interval,
+                'weatherParameters': parameters,
+                'locationWeatherData': [{'longitude': 24., 'latitude': 60., 'altitude': 10., 'data': rows}]}
+
+
+def get_source(ipm):
+    cat = WeatherResourceCatalogue(ipm=ipm)
+    ws = WeatherDataSource('Finnish Meteorological Institute measured data', catalogue=cat)
+    ws.ipm = ipm
+    ws.retry_backoff = 0
+    return ws
+
+
+def test_split_period():
+    start, end = to_timestamp('2020-01-01'), to_timestamp('2020-01-10T23:00')
+    windows = split_period(start, end, '3D')
+    assert len(windows) == 4
+    assert windows[0] == (start, to_timestamp('2020-01-03T23:00'))
+    assert windows[-1] == (to_timestamp('2020-01-10'), end)
+
+
+def test_data():
+    ipm = FakeIPM()
+    ws = get_source(ipm)
+    df = ws.data(parameters=[1002, 3002], timeStart='2020-06-12', timeEnd='2020-07-03')
+    assert list(df.columns) == ['1002', '3002']
+    assert len(df) == 21 * 24 + 1
+    assert str(df.index.tz) == 'UTC'
+    assert ipm.calls == [(101104, '2020-06-12T00:00:00Z', '2020-07-03T00:00:00Z')]
+
+
+def test_chunked_data():
+    ws = get_source(FakeIPM())
+    expected = ws.data(timeStart='2019-01-01', timeEnd='2020-07-03T12:00')
+    ipm = FakeIPM(failures=3)
+    ws = get_source(ipm)
+    df = ws.data(timeStart='2019-01-01', timeEnd='2020-07-03T12:00', chunk='30D', max_workers=4, retries=3)
+    assert len(ipm.calls) == 19 + 3
+    pandas.testing.assert_frame_equal(df, expected, check_freq=False)
+    assert df.index.is_unique and df.index.is_monotonic_increasing
+    assert (df['1002'].values == hours_since_epoch(df.index)).all()
+
+
+def test_stations_data():
+    ipm = FakeIPM(failures=2)
+    ws = get_source(ipm)
+    df = ws.stations_data([101104, 101533, 101185], timeStart='2020-01-01', timeEnd='2020-02-15', chunk='20D')
+    assert len(ipm.calls) == 3 * 3 + 2
+    assert df.index.names == ['station', 'time']
+    assert list(df.index.get_level_values('station').unique()) == [101104, 101533, 101185]
+    one = df.loc[101533]
+    assert len(one) == 45 * 24 + 1
+    assert (one['3002'] == 101533).all()
+    pandas.testing.assert_frame_equal(one, ws.data(station_id=101533, timeStart='2020-01-01', timeEnd='2020-02-15'),
+                                      check_freq=False, check_names=False)
+
+
+class GridIPM(FakeIPM):
+    """Historical weather adapter answering the data of two locations"""
+
+    def get_weatheradapter(self, **kwds):
+        response = FakeIPM.get_weatheradapter(self, **kwds)
+        location = dict(response['locationWeatherData'][0], latitude=61.)
+        response['locationWeatherData'].append(location)
+        return response
+
+
+def test_stations_data_locations():
+    ws = get_source(GridIPM())
+    with pytest.raises(ValueError):
+        ws.stations_data([101104, 101533], timeStart='2020-01-01', timeEnd='2020-01-02')
+    response = ws.data(station_id=101104, timeStart='2020-01-01', timeEnd='2020-01-02', ViewDataFrame=False)
+    assert len(response['locationWeatherData']) == 2
+
+
+def test_data_locations():
+    ws = get_source(GridIPM())
+    for chunk in (None, '1D'):
+        df = ws.data(parameters=[1002, 3002], station_id=101104, timeStart='2020-01-01',
+                     timeEnd='2020-01-02T23:00', timezone='Europe/Helsinki', chunk=chunk)
+        assert df.index.names == ['latitude', 'longitude', 'altitude', 'time']
+        assert len(df) == 2 * 48
+        assert list(df.index.get_level_values('latitude').unique()) == [60., 61.]
+        times = df.index.get_level_values('time')
+        assert str(times.tz) == 'Europe/Helsinki'
+        assert (df['1002'].values == hours_since_epoch(times)).all()
@@ -0,0 +1,86 @@
+import numpy
+import pandas
+
+from weatherdata.mini_models import leaf_wetness_rapilly, wetness_duration
+
+
+def test_leaf_wetness_rapilly():
+    assert leaf_wetness_rapilly(0.2, 50., 1000.) is True
+    assert leaf_wetness_rapilly(0., 90., 1000.) is False
+    assert leaf_wetness_rapilly(0., 90., 100.) is True
+
+    rng = numpy.random.RandomState(0)
+    rain = rng.choice([0., 0.5], 1000, p=[0.8, 0.2])
+    rh = pandas.Series(rng.uniform(60, 100, 1000))
+    ppfd = rng.uniform(0, 1500, 1000)
+    wet = leaf_wetness_rapilly(rain, rh, ppfd)
+    assert isinstance(wet, numpy.ndarray) and wet.dtype == bool
+    assert list(wet) == [leaf_wetness_rapilly(*x) for x in zip(rain, rh, ppfd)]
+
+
+def test_wetness_duration():
+    wet = [False, True, True, False, True, True, True, False, False, True]
+    numpy.testing.assert_array_equal(wetness_duration(wet), [0, 1, 2, 0, 1, 2, 3, 0, 0, 1])
+    numpy.testing.assert_array_equal(wetness_duration(wet, time_step=0.5)[:3], [0, 0.5, 1])
+    assert len(wetness_duration([])) == 0
+
+
+def weather_sample(n=300):
+    rng = numpy.random.RandomState(1)
+    return dict(rain_intensity=rng.choice([0., 1.], n, p=[0.9, 0.1]),
+                temperature_air=rng.uniform(-5, 30, n),
+                wind_speed=rng.uniform(0, 8, n),
+                relative_humidity=rng.uniform(40, 100, n),
+                net_radiation=rng.uniform(-100, 600, n))
+
+
+def test_leaf_temperature_pedro_gillepsie():
+    from scipy.optimize import fsolve
+    from weatherdata.mini_models import (leaf_temperature_pedro_gillepsie, _calculate_balance, _calculate_hc,
+                                         _calculate_hw, _calculate_psat)
+    w = weather_sample()
+    tl = leaf_temperature_pedro_gillepsie(w['temperature_air'], w['wind_speed'], w['relative_humidity'],
+                                          w['net_radiation'])
+    for i in range(0, 300, 30):
+        ta, ws, rh, rn = [w[k][i] for k in ('temperature_air', 'wind_speed', 'relative_humidity', 'net_radiation')]
+        hc = _calculate_hc(ws)
+        hw = _calculate_hw(hc)
+        esa = _calculate_psat(ta)
+        expected = fsolve(_calculate_balance, ta, args=(ta, rn, hc, hw, esa, esa * rh / 100.))[0]
+        assert abs(tl[i] - expected) < 1e-6
+    # broadcasting over leaves x time steps
+    tl2 = leaf_temperature_pedro_gillepsie(w['temperature_air'], w['wind_speed'][:5, None],
+                                           w['relative_humidity'], w['net_radiation'])
+    assert tl2.shape == (5, 300)
+
+
+def test_leaf_wetness_pedro_gillepsie_batch():
+    from weatherdata.mini_models import leaf_wetness_pedro_gillepsie, leaf_wetness_pedro_gillepsie_batch
+    w = weather_sample(100)
+    tl, wet = leaf_wetness_pedro_gillepsie_batch(**w)
+    expected = [leaf_wetness_pedro_gillepsie(**{k: v[i] for k, v in w.items()}) for i in range(100)]
+    assert list(wet) == expected
+    assert wet.any() and not wet.all()
+
+
+def test_wind_speed_on_leaf():
+    from math import exp
+    from weatherdata.mini_models import wind_speed_on_leaf, angle_between
+
+    assert abs(angle_between((1, 0, 0), (0, 2, 0)) - 90) < 1e-12
+    assert abs(angle_between((1, 0, 0), (-1, 1, 0)) - 135) < 1e-12
+
+    eta = 1. * ((0.3 * 3. / 1.) / (2 * 0.2 ** 2)) ** (1. / 3)
+    expected = 4. * exp(max(0., eta - 0.5 * (1 - 90. / 90)) * (0.5 - 1))
+    assert abs(wind_speed_on_leaf(4., 0.5, 1., 3., wind_direction=(0, 1, 0)) - expected) < 1e-12
+    assert abs(wind_speed_on_leaf(4., 0.5, 1., 3., is_in_rows=False) - 4. * exp(eta * (0.5 - 1))) < 1e-12
+
+    heights = numpy.linspace(0.1, 1., 1000)
+    speeds = numpy.array([2., 4., 6.])
+    directions = numpy.array([[1, 0, 0], [0, 1, 0], [1, 1, 0]], dtype=float)
+    canopy = wind_speed_on_leaf(speeds[:, None], heights[None, :], 1., 3., wind_direction=directions[:, None, :])
+    assert canopy.shape == (3, 1000)
+    for i in range(3):
+        for j in (0, 500, 999):
+            assert abs(canopy[i, j] - wind_speed_on_leaf(speeds[i], heights[j], 1., 3.,
+                                                         wind_direction=tuple(directions[i]))) < 1e-12
@@ -0,0 +1,103 @@
+import json
+
+import numpy
+import pandas
+
+from weatherdata.convert import weather_frame
+from weatherdata.data import ipm_getdata_request
+from weatherdata.quality import apply_qc, interpolate_gaps, qc_codes, qc_frame, qc_mask, quality_summary
+
+from test_ipm import FakeIPM, get_source
+
+
+def test_qc_codes():
+    response = ipm_getdata_request()
+    codes = qc_codes(response)
+    assert codes.shape == (len(response['locationWeatherData'][0]['data']), 4)
+    assert (codes == [0, 5, 0, -1]).all()
+    mask = qc_mask(response)
+    assert mask[:, 1].all() and not mask[:, [0, 2, 3]].any()
+    assert not qc_mask(response, tests=2).any()
+
+    response['locationWeatherData'][0]['qc'] = [[0, 1, 0, 0], [4, None, 0, 0]]
+    mask = qc_mask(response, 0)
+    assert mask[0].tolist() == [False, True, False, False]
+    assert mask[1].tolist() == [True, False, False, False]
+    assert not mask[2:].any()
+
+
+def test_apply_qc():
+    index = pandas.date_range('2020-01-01', periods=8, freq='h')
+    df = pandas.DataFrame({'a': numpy.arange(8.), 'b': numpy.arange(8.) * 2}, index=index)
+    mask = numpy.zeros(df.shape, dtype=bool)
+    mask[[2, 3], 0] = True
+    mask[[5], 1] = True
+
+    nan = apply_qc(df, mask, 'nan')
+    assert nan['a'].isna().sum() == 2 and nan['b'].isna().sum() == 1
+    assert not df.isna().any().any()
+
+    assert list(apply_qc(df, mask, 'drop').index) == list(index[[0, 1, 4, 6, 7]])
+
+    filled = apply_qc(df, mask, 'interpolate')
+    pandas.testing.assert_frame_equal(filled, df)
+    limited = apply_qc(df, mask, 'interpolate', max_gap=1)
+    assert limited['a'].isna().sum() == 2
+    assert limited['b'].iloc[5] == 10.
+
+
+def test_interpolate_gaps():
+    values = numpy.array([numpy.nan, 1., numpy.nan, numpy.nan, 4., numpy.nan])
+    numpy.testing.assert_array_equal(interpolate_gaps(values), [numpy.nan, 1., 2., 3., 4., numpy.nan])
+    # no interpolation across series
+    values = numpy.array([0., numpy.nan, 2., 3., numpy.nan, 5.])
+    filled = interpolate_gaps(values, series=[0, 0, 0, 0, 1, 1])
+    assert filled[1] == 1. and numpy.isnan(filled[4])
+
+
+def test_quality_summary():
+    index = pandas.date_range('2020-01-01', periods=6, freq='h')
+    df = pandas.DataFrame({'a': [1., numpy.nan, numpy.nan, 4., 5., 6.], 'b': [1., 2., 3., 4., 5., 6.]}, index=index)
+    mask = numpy.zeros(df.shape, dtype=bool)
+    mask[3, 0] = True
+    mask[[0, 5], 1] = True
+    summary = quality_summary(df, mask)
+    assert summary.loc['a', ['valid', 'missing', 'failed', 'longest_gap']].tolist() == [3, 2, 1, 3]
+    assert summary.loc['b', ['valid', 'missing', 'failed', 'longest_gap']].tolist() == [4, 0, 2, 1]
+    assert summary.loc['b', 'valid_fraction'] == 4 / 6.
+
+
+def test_qc_frame_locations():
+    response = json.loads(json.dumps(ipm_getdata_request()))
+    response['locationWeatherData'].append(dict(response['locationWeatherData'][0], latitude=60.))
+    response['locationWeatherData'][1]['qc'] = [0, 0, 0, 1]
+    df = weather_frame(response)
+    mask = qc_frame(response, df)
+    n = len(response['locationWeatherData'][0]['data'])
+    assert mask.shape == df.shape
+    assert mask['3001'].iloc[:n].all() and not mask['3001'].iloc[n:].any()
+    assert mask['4002'].iloc[n:].all()
+
+
+class QCFakeIPM(FakeIPM):
+    """ flags the values of the second parameter at even hours """
+
+    def get_weatheradapter(self, **kwds):
+        response = FakeIPM.get_weatheradapter(self, **kwds)
+        rows = response['locationWeatherData'][0]['data']
+        response['locationWeatherData'][0]['qc'] = [[0, 1 - row[0] % 2] for row in rows]
+        return response
+
+
+def test_data_qc():
+    ws = get_source(QCFakeIPM())
+    raw = ws.data(parameters=[1002, 3002], timeStart='2020-06-12', timeEnd='2020-06-13')
+    nan = ws.data(parameters=[1002, 3002], timeStart='2020-06-12', timeEnd='2020-06-13', qc='nan', chunk='6h')
+    even = (raw['1002'] % 2 == 0).values
+    assert nan['3002'][even].isna().all() and not nan['3002'][~even].isna().any()
+    assert not nan['1002'].isna().any()
+    filled = ws.data(parameters=[1002, 3002], timeStart='2020-06-12', timeEnd='2020-06-13', qc='interpolate')
+    assert filled['3002'].iloc[1:-1].notna().all()
+    stations = ws.stations_data([101104, 101533], parameters=[1002, 3002], timeStart='2020-06-12',
+                                timeEnd='2020-06-13', qc='drop')
+    assert len(stations) == 2 * (~even).sum()
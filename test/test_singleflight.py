@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+from weatherdata.singleflight import SingleFlight
+
+from test_ipm import FakeIPM, get_source
+
+
+class SlowIPM(FakeIPM):
+    def get_weatheradapter(self, **kwds):
+        time.sleep(0.2)
+        return FakeIPM.get_weatheradapter(self, **kwds)
+
+
+def run_threads(function, n):
+    results = [None] * n
+    barrier = threading.Barrier(n)
+
+    def run(i):
+        barrier.wait()
+        results[i] = function(i)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_single_flight():
+    flight = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return {'value': 1}
+
+    results = run_threads(lambda i: flight.do('key', slow), 10)
+    assert len(calls) == 1
+    assert all(r[0] is results[0][0] and r[1] for r in results)
+    assert flight.in_flight() == 0
+    # results are not kept
+    flight.do('key', slow)
+    assert len(calls) == 2
+
+    def fail():
+        time.sleep(0.1)
+        raise IOError('timeout')
+
+    errors = run_threads(lambda i: pytest.raises(IOError, flight.do, 'key', fail), 5)
+    assert all(e is not None for e in errors)
+    assert flight.in_flight() == 0
+
+
+def test_coalesced_data():
+    ipm = SlowIPM()
+    ws = get_source(ipm)
+    queries = [dict(parameters=[1002, 3002], timeStart='2020-06-12', timeEnd='2020-06-13', timezone='UTC'),
+               dict(parameters=[3002, 1002], timeStart='2020-06-12', timeEnd='2020-06-13', timezone='UTC'),
+               dict(parameters=[1002, 3002], timeStart='2020-06-12T02:00', timeEnd='2020-06-13T02:00',
+                    timezone='Europe/Oslo')]
+    results = run_threads(lambda i: ws.data(**queries[i % 3]), 12)
+    assert len(ipm.calls) == 1
+    for i, df in enumerate(results):
+        assert list(df.columns) == [str(p) for p in queries[i % 3]['parameters']]
+        assert str(df.index.tz) == queries[i % 3]['timezone']
+        assert (df['1002'].values == results[0]['1002'].values).all()
+    assert len(set(id(df) for df in results)) == 12
+
+    ws.coalesce = False
+    run_threads(lambda i: ws.data(**queries[0]), 3)
+    assert len(ipm.calls) == 4
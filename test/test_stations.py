@@ -0,0 +1,47 @@
+import numpy
+
+from weatherdata.catalogue import WeatherResourceCatalogue
+from weatherdata.data import ipm_get_weatherdatasource
+from weatherdata.ipm import WeatherDataSource
+from weatherdata.stations import haversine
+
+
+class BundledIPM(object):
+    def get_weatherdatasource(self):
+        return ipm_get_weatherdatasource()
+
+
+def get_source():
+    cat = WeatherResourceCatalogue(ipm=BundledIPM())
+    return WeatherDataSource('Finnish Meteorological Institute measured data', catalogue=cat)
+
+
+def brute_force(stations, lat, lon):
+    coords = numpy.array([[float(c) for c in xy] for xy in stations['coordinates']])
+    return haversine(lat[:, None], lon[:, None], coords[None, :, 1], coords[None, :, 0])
+
+
+def test_nearest():
+    ws = get_source()
+    rng = numpy.random.RandomState(0)
+    lat = rng.uniform(60, 68, 500)
+    lon = rng.uniform(21, 30, 500)
+    dist = brute_force(ws.station_ids(), lat, lon)
+
+    nearest = ws.nearest_stations(lat, lon, k=3)
+    assert len(nearest) == 1500
+    numpy.testing.assert_allclose(nearest['distance'].values.reshape(500, 3),
+                                  numpy.sort(dist, axis=1)[:, :3])
+    first = nearest[nearest['rank'] == 0]
+    assert (first['id'].values == ws.station_ids()['id'].values[dist.argmin(axis=1)]).all()
+
+
+def test_within():
+    ws = get_source()
+    lat = numpy.array([60.2, 65.0, 0.])
+    lon = numpy.array([24.9, 26.0, 0.])
+    dist = brute_force(ws.station_ids(), lat, lon)
+    found = ws.stations_within(lat, lon, radius=60)
+    assert (found.groupby('point').size().reindex(range(3), fill_value=0).values == (dist <= 60).sum(axis=1)).all()
+    assert (found['distance'] <= 60).all()
+    assert found.groupby('point')['distance'].apply(lambda d: d.is_monotonic_increasing).all()
@@ -0,0 +1,76 @@
+import pandas
+import pytest
+
+from weatherdata.ipm import to_timestamp
+from weatherdata.store import WeatherStore, contiguous_periods
+
+from test_ipm import FakeIPM, get_source, hours_since_epoch
+
+
+def test_contiguous_periods():
+    index = pandas.date_range('2020-01-01', periods=10, freq='h', tz='UTC').delete([3, 4, 8])
+    periods = contiguous_periods(index)
+    assert [(len(pandas.date_range(s, e, freq='h'))) for s, e in periods] == [3, 3, 1]
+
+
+def test_store(tmp_path):
+    store = WeatherStore(str(tmp_path))
+    ipm = FakeIPM()
+    ws = get_source(ipm)
+    ws.store = store
+    first = ws.data(parameters=[1002, 3002], timeStart='2020-06-10', timeEnd='2020-06-20')
+    assert len(ipm.calls) == 1
+
+    # only the missing days are downloaded
+    df = ws.data(parameters=[1002, 3002], timeStart='2020-06-05', timeEnd='2020-06-25')
+    assert ipm.calls[1:] == [(101104, '2020-06-05T00:00:00Z', '2020-06-09T23:00:00Z'),
+                             (101104, '2020-06-20T01:00:00Z', '2020-06-25T00:00:00Z')]
+    assert len(df) == 20 * 24 + 1
+    pandas.testing.assert_frame_equal(df.loc[first.index], first, check_freq=False)
+
+    # nothing downloaded for a stored period, even in another time zone
+    df = ws.data(parameters=[3002, 1002], timeStart='2020-06-12', timeEnd='2020-06-14', timezone='Europe/Helsinki')
+    assert len(ipm.calls) == 3
+    assert str(df.index.tz) == 'Europe/Helsinki'
+    assert df.index[0] == to_timestamp('2020-06-12', 'Europe/Helsinki')
+
+    # a new parameter triggers a download of the whole period
+    ws.data(parameters=[1002, 2001], timeStart='2020-06-12', timeEnd='2020-06-14')
+    assert len(ipm.calls) == 4
+    assert len(store.read(ws.name, 101104, [1002, 3002, 2001])) == 20 * 24 + 1
+
+
+class LateIPM(FakeIPM):
+    """Historical weather adapter whose first response starts 3 hours late"""
+
+    def get_weatheradapter(self, **kwds):
+        response = FakeIPM.get_weatheradapter(self, **kwds)
+        if len(self.calls) == 1:
+            start = to_timestamp(response['timeStart']) + pandas.Timedelta('3h')
+            response['timeStart'] = start.strftime('%Y-%m-%dT%H:%M:%SZ')
+            response['locationWeatherData'][0]['data'] = response['locationWeatherData'][0]['data'][3:]
+        return response
+
+
+def test_late_response(tmp_path):
+    ipm = LateIPM()
+    ws = get_source(ipm)
+    ws.store = WeatherStore(str(tmp_path))
+    df = ws.data(parameters=[1002, 3002], timeStart='2020-06-10', timeEnd='2020-06-12')
+    # values are not shifted onto the requested period
+    assert df.index[0] == to_timestamp('2020-06-10T03:00')
+    assert (df['1002'].values == hours_since_epoch(df.index)).all()
+
+    # the missing hours are downloaded again
+    df = ws.data(parameters=[1002, 3002], timeStart='2020-06-10', timeEnd='2020-06-12')
+    assert ipm.calls[1][1:] == ('2020-06-10T00:00:00Z', '2020-06-10T02:00:00Z')
+    assert len(df) == 2 * 24 + 1
+    assert (df['1002'].values == hours_since_epoch(df.index)).all()
+
+
+def test_write_locations(tmp_path):
+    ws = get_source(FakeIPM())
+    df = ws.data(parameters=[1002, 3002], timeStart='2020-06-10', timeEnd='2020-06-11')
+    df = pandas.concat([df, df], keys=[1, 2], names=['location', 'time'])
+    with pytest.raises(ValueError):
+        WeatherStore(str(tmp_path)).write(ws.name, 101104, df)
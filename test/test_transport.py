@@ -0,0 +1,129 @@
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas
+import pytest
+
+from weatherdata import transport
+from weatherdata.catalogue import WeatherResourceCatalogue
+from weatherdata.data import ipm_get_weatherdatasource, ipm_getdata_request
+from weatherdata.ipm import WeatherDataSource
+from weatherdata.transport import IPMTransport, get_transport, set_transport
+
+requests = pytest.importorskip('requests')
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        with self.server.lock:
+            self.server.queries.append((url.path, parse_qs(url.query)))
+            fail = self.server.failures > 0 and url.path == '/flaky'
+            if fail:
+                self.server.failures -= 1
+        if fail:
+            body, status = b'{}', 503
+        elif url.path == '/rest/weatherdatasource':
+            body, status = json.dumps(ipm_get_weatherdatasource()).encode(), 200
+        else:
+            body, status = json.dumps(ipm_getdata_request()).encode(), 200
+        headers = {'Content-Type': 'application/json'}
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            headers['Content-Encoding'] = 'gzip'
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.lock = threading.Lock()
+    httpd.connections = 0
+    httpd.failures = 0
+    httpd.queries = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def url(server, path=''):
+    return 'http://127.0.0.1:%d/%s' % (server.server_address[1], path)
+
+
+def test_keep_alive_gzip(server):
+    client = IPMTransport(url=url(server), backoff=0)
+    for _ in range(10):
+        response = client.get_weatheradapter(url(server, 'fmi'), weatherStationId=101104,
+                                             timeStart='2020-06-12T00:00:00Z', timeEnd='2020-06-13T00:00:00Z',
+                                             interval=3600, parameters=[1002, 3002])
+        assert response['weatherParameters'] == [1001, 3001, 2001, 4002]
+    assert server.connections == 1
+    path, query = server.queries[-1]
+    assert path == '/fmi'
+    assert query['parameters'] == ['1002,3002'] and query['weatherStationId'] == ['101104']
+    streamed = client.get_weatheradapter(url(server, 'fmi'), weatherStationId=1, parameters=[1], stream=True)
+    assert streamed['locationWeatherData'][0]['data'].shape == (len(response['locationWeatherData'][0]['data']), 4)
+    client.close()
+
+
+def test_retries(server):
+    client = IPMTransport(url=url(server), backoff=0, retries=2)
+    server.failures = 2
+    assert client.get_weatheradapter_forecast(url(server, 'flaky'), latitude=60., longitude=24.)
+    server.failures = 3
+    with pytest.raises(requests.HTTPError):
+        client.get_weatheradapter_forecast(url(server, 'flaky'), latitude=60., longitude=24.)
+    server.failures = 1
+    with pytest.raises(requests.HTTPError):
+        client.get_weatheradapter_forecast(url(server, 'flaky'), latitude=60., longitude=24., retries=0)
+
+
+def test_shared_transport(server):
+    previous = transport._transport
+    try:
+        shared = set_transport(IPMTransport(url=url(server), backoff=0))
+        catalogue = WeatherResourceCatalogue()
+        sources = [WeatherDataSource('Finnish Meteorological Institute measured data', catalogue=catalogue)
+                   for _ in range(200)]
+        assert all(ws.ipm is shared for ws in sources)
+        assert shared._session is None
+        assert get_transport() is shared
+        catalogue.refresh()
+        assert catalogue.source == 'ipm'
+        assert server.queries[-1][0] == '/rest/weatherdatasource'
+    finally:
+        set_transport(previous)
+
+
+def test_stream_data(server):
+    client = IPMTransport(url=url(server), backoff=0)
+    ws = WeatherDataSource('Finnish Meteorological Institute measured data',
+                           catalogue=WeatherResourceCatalogue(ipm=client))
+    ws.ipm = client
+    ws.endpoint = lambda: url(server, 'fmi')
+    query = dict(parameters=[1001, 3001, 2001, 4002], timeStart='2020-06-12', timeEnd='2020-06-13')
+    df = ws.data(**query)
+    streamed = ws.data(stream=True, **query)
+    pandas.testing.assert_frame_equal(streamed, df)
+    response = ws.data(stream=True, ViewDataFrame=False, **query)
+    assert response['locationWeatherData'][0]['data'].shape == (len(df), 4)